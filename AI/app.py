@@ -40,14 +40,13 @@ def ai_pipeline(AI_service, frame_data: List[FrameData]) -> List[DeviceDetection
     processed_results.append(
         result_json
         )
-    # post_process(processed_results)
-    threading.Thread(target=post_process, args=(processed_results,), daemon=True).start() # Run post_process in a separate thread
+    post_process(processed_results)  # Violations are uploaded in the background by the shared uploader
     return result_json.post_frame
 
 def process_one_url(url_input: str, stream_name):
     """Continuously capture frames, process them, and broadcast results."""
     global urls_camera, sleep
-    AI_service = AI_Service() 
+    AI_service = AI_Service(camera_id=url_input)
     while True:
         if urls_camera:
             input_data = get_frame_from_url(url_input)
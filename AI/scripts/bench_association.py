@@ -0,0 +1,118 @@
+"""Microbenchmark of the vehicle-object association.
+
+Compares the vectorized ``associate_vehicles`` with the per-pair Python loop it
+replaced, on synthetic frames with 10, 100 and 1000 objects, and checks that both
+give the same assignments:
+
+    python scripts/bench_association.py [--objects 10 100 1000] [--repeat 200] [--output bench_association.json]
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from typing import Dict, List, Tuple
+import numpy as np
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from src.modules.association import associate_vehicles
+from src.utils import calculate_cip, calculate_hhb, validate_object
+
+
+def synthetic_frame(n_objects: int, seed: int = 0, width: int = 1920, height: int = 1080) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Tracked vehicle boxes, their IDs and all detections of a crowded frame.
+
+    A quarter of the objects are vehicles, each with a rider head and a plate at the
+    expected place, the rest are helmets, no-helmets and plates placed at random.
+    """
+    rng = np.random.default_rng(seed)
+    n_vehicles = max(1, n_objects // 4)
+    x1 = rng.uniform(0, width - 120, n_vehicles)
+    y1 = rng.uniform(0, height - 240, n_vehicles)
+    w = rng.uniform(60, 120, n_vehicles)
+    h = rng.uniform(120, 240, n_vehicles)
+    vehicles = np.stack([x1, y1, x1 + w, y1 + h], axis=1)
+
+    rows = [np.column_stack([vehicles, rng.uniform(0.3, 1, n_vehicles), np.zeros(n_vehicles)])]
+    # Head at the top and plate at the bottom of each vehicle
+    head = np.stack([x1 + 0.3 * w, y1 + 0.02 * h, x1 + 0.7 * w, y1 + 0.22 * h], axis=1)
+    plate = np.stack([x1 + 0.3 * w, y1 + 0.78 * h, x1 + 0.7 * w, y1 + 0.9 * h], axis=1)
+    rows.append(np.column_stack([head, rng.uniform(0.3, 1, n_vehicles), rng.integers(1, 3, n_vehicles)]))
+    rows.append(np.column_stack([plate, rng.uniform(0.3, 1, n_vehicles), np.full(n_vehicles, 3)]))
+    n_clutter = max(0, n_objects - 3 * n_vehicles)
+    cx, cy = rng.uniform(0, width, n_clutter), rng.uniform(0, height, n_clutter)
+    size = rng.uniform(10, 40, n_clutter)
+    clutter = np.stack([cx - size, cy - size / 2, cx + size, cy + size / 2], axis=1)
+    rows.append(np.column_stack([clutter, rng.uniform(0.3, 1, n_clutter), rng.integers(1, 4, n_clutter)]))
+
+    detections = np.concatenate(rows).astype(np.float32)[:max(n_objects, 3 * n_vehicles)]
+    return vehicles.astype(np.float32), np.arange(1, n_vehicles + 1), detections
+
+
+def loop_association(vehicles: np.ndarray, vehicle_ids: np.ndarray, detections: np.ndarray) -> List[Dict]:
+    """The per-vehicle, per-object loop of the previous implementation"""
+    other_objects = detections[detections[:, 5] != 0]
+    grouped = []
+    for vehicle_id, vehicle in zip(vehicle_ids, vehicles):
+        inside_objects = []
+        for obj in other_objects:
+            class_id = int(obj[5])
+            cip = calculate_cip(vehicle, obj[:4])
+            hhb = calculate_hhb(vehicle, obj[:4])
+            if validate_object(class_id, cip, hhb):
+                inside_objects.append({"class": class_id, "bbox": obj[:4].tolist(), "confidence": float(obj[4])})
+        grouped.append({"vehicle_id": int(vehicle_id), "vehicle_bbox": vehicle[:4].tolist(), "objects": inside_objects})
+    return grouped
+
+
+def time_call(fn, repeat: int) -> float:
+    """Median time of one call in microseconds"""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return float(np.median(times)) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Vehicle-object association microbenchmark")
+    parser.add_argument("--objects", type=int, nargs="+", default=[10, 100, 1000], help="objects per frame")
+    parser.add_argument("--repeat", type=int, default=200)
+    parser.add_argument("--output", help="write the results as JSON")
+    args = parser.parse_args()
+
+    results = []
+    print(f"{'objects':>8}{'vehicles':>10}{'pairs':>7}{'numpy us':>11}{'+dicts us':>11}{'loop us':>12}{'speedup':>9}")
+    for n_objects in args.objects:
+        vehicles, vehicle_ids, detections = synthetic_frame(n_objects)
+        association = associate_vehicles(vehicles, vehicle_ids, detections)
+        grouped = association.to_grouped()
+        reference = loop_association(vehicles, vehicle_ids, detections)
+        same = [[(o["class"], o["bbox"]) for o in g["objects"]] for g in grouped] == \
+               [[(o["class"], o["bbox"]) for o in g["objects"]] for g in reference]
+        if not same:
+            sys.exit(f"Association differs from the loop implementation with {n_objects} objects")
+
+        # The loop is quadratic in Python, keep its run time bounded
+        loop_repeat = max(3, args.repeat // max(1, n_objects // 10))
+        entry = {
+            "objects": n_objects,
+            "vehicles": len(vehicles),
+            "pairs": int(len(association.pair_object)),
+            "numpy_us": time_call(lambda: associate_vehicles(vehicles, vehicle_ids, detections), args.repeat),
+            "numpy_to_grouped_us": time_call(lambda: associate_vehicles(vehicles, vehicle_ids, detections).to_grouped(), args.repeat),
+            "loop_us": time_call(lambda: loop_association(vehicles, vehicle_ids, detections), loop_repeat),
+        }
+        entry["speedup"] = entry["loop_us"] / entry["numpy_us"]
+        results.append(entry)
+        print(f"{entry['objects']:>8}{entry['vehicles']:>10}{entry['pairs']:>7}{entry['numpy_us']:>11.1f}"
+              f"{entry['numpy_to_grouped_us']:>11.1f}{entry['loop_us']:>12.1f}{entry['speedup']:>8.1f}x")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
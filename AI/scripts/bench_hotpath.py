@@ -0,0 +1,169 @@
+"""Microbenchmarks of the per-frame utilities of the AI pipeline.
+
+Times vehicle-object association, drawing, output building, JPEG encoding and plate
+parsing on synthetic detections and frames, so it runs without model weights or a GPU:
+
+    python scripts/bench_hotpath.py [--quick] [--output hotpath.json] [--baseline previous.json]
+
+The JSON report holds the median, p95 and mean time of every case together with the
+library versions and git commit, and ``--baseline`` prints the change of every case
+against an earlier report.
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+from typing import Any, Callable, Dict, List
+import cv2
+import numpy as np
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from src.modules.annotation import visualize_detections
+from src.modules.association import PLATE, associate_vehicles
+from src.utils import compress_frame_to_jpeg, encode_image_to_string, parse_and_validate_plate, process_to_output_json
+from bench_association import synthetic_frame
+
+RESOLUTIONS = {"360p": (640, 360), "720p": (1280, 720), "1080p": (1920, 1080)}
+OBJECT_COUNTS = (10, 100, 1000)
+PLATE_TEXTS = {
+    "two_lines": "59-F1\n123.45",
+    "one_line": "51G12345",
+    "noisy": "5L-F1 ?\n12 3.4S",
+    "garbage": "@@ ##",
+}
+
+
+def synthetic_image(width: int, height: int, seed: int = 0) -> np.ndarray:
+    """Road-like frame: a gradient background with boxes and mild sensor noise"""
+    rng = np.random.default_rng(seed)
+    gradient = np.linspace(60, 160, height, dtype=np.float32)[:, None, None]
+    frame = np.broadcast_to(gradient, (height, width, 3)).copy()
+    for _ in range(40):
+        x, y = int(rng.integers(0, width - 40)), int(rng.integers(0, height - 40))
+        w, h = int(rng.integers(20, width // 8)), int(rng.integers(20, height // 6))
+        cv2.rectangle(frame, (x, y), (x + w, y + h), rng.integers(0, 255, 3).tolist(), -1)
+    frame += rng.normal(0, 4, frame.shape).astype(np.float32)
+    return np.clip(frame, 0, 255).astype(np.uint8)
+
+
+def measure(fn: Callable[[], Any], min_time: float, max_repeat: int) -> Dict[str, float]:
+    """Call ``fn`` until ``min_time`` seconds or ``max_repeat`` calls, times in milliseconds"""
+    fn()  # warm up
+    times = []
+    deadline = time.perf_counter() + min_time
+    while len(times) < max_repeat and (len(times) < 3 or time.perf_counter() < deadline):
+        start = time.perf_counter()
+        fn()
+        times.append((time.perf_counter() - start) * 1000)
+    times = np.asarray(times)
+    return {
+        "median_ms": float(np.median(times)),
+        "p95_ms": float(np.percentile(times, 95)),
+        "mean_ms": float(times.mean()),
+        "iterations": len(times),
+    }
+
+
+def frame_with_plates(n_objects: int, width: int, height: int):
+    """Association of a synthetic frame whose plates have all been read"""
+    vehicles, vehicle_ids, detections = synthetic_frame(n_objects, width=width, height=height)
+    association = associate_vehicles(vehicles, vehicle_ids, detections)
+    for o in np.nonzero(association.object_classes == PLATE)[0]:
+        association.plate_texts[o] = PLATE_TEXTS["two_lines"]
+        association.plate_confs[o] = 0.95
+    return vehicles, vehicle_ids, detections, association
+
+
+def run(min_time: float, max_repeat: int) -> List[Dict[str, Any]]:
+    cases = []
+
+    def add(name: str, size: str, fn: Callable[[], Any]) -> None:
+        stats = measure(fn, min_time, max_repeat)
+        cases.append({"name": name, "size": size, **stats})
+        print(f"{name:<26}{size:<14}{stats['median_ms']:>10.3f}{stats['p95_ms']:>10.3f}{stats['iterations']:>8}")
+
+    print(f"{'case':<26}{'size':<14}{'median ms':>10}{'p95 ms':>10}{'iters':>8}")
+    width, height = RESOLUTIONS["720p"]
+    frame = synthetic_image(width, height)
+    for n_objects in OBJECT_COUNTS:
+        vehicles, vehicle_ids, detections, association = frame_with_plates(n_objects, width, height)
+        size = f"{n_objects}_objects"
+        add("associate_vehicles", size, lambda: associate_vehicles(vehicles, vehicle_ids, detections))
+        add("to_grouped", size, association.to_grouped)
+        add("visualize_detections", size, lambda: visualize_detections(frame, association))
+        add("process_to_output_json", size, lambda: process_to_output_json(association, frame, frame))
+
+    for resolution, (width, height) in RESOLUTIONS.items():
+        image = synthetic_image(width, height)
+        add("compress_frame_to_jpeg", resolution, lambda: compress_frame_to_jpeg(image))
+        add("encode_image_to_string", resolution, lambda: encode_image_to_string(image))
+
+    for kind, text in PLATE_TEXTS.items():
+        add("parse_and_validate_plate", kind, lambda: parse_and_validate_plate(text))
+    return cases
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except OSError:
+        return ""
+
+
+def compare(cases: List[Dict[str, Any]], baseline_path: str) -> None:
+    """Print the median time change of every case against an earlier report"""
+    with open(baseline_path) as f:
+        baseline = {(c["name"], c["size"]): c for c in json.load(f)["cases"]}
+    print(f"\n{'case':<26}{'size':<14}{'before ms':>10}{'after ms':>10}{'change':>9}")
+    for case in cases:
+        before = baseline.get((case["name"], case["size"]))
+        if before is None:
+            continue
+        change = case["median_ms"] / before["median_ms"] - 1 if before["median_ms"] else 0.0
+        print(f"{case['name']:<26}{case['size']:<14}{before['median_ms']:>10.3f}{case['median_ms']:>10.3f}{change:>+9.1%}")
+
+
+def main():
+    # Keep the log of violations found on the synthetic frames out of the timings
+    from loguru import logger
+    logger.remove()
+
+    parser = argparse.ArgumentParser(description="Microbenchmarks of the AI hot-path utilities")
+    parser.add_argument("--min-time", type=float, default=1.0, help="seconds spent on each case")
+    parser.add_argument("--max-repeat", type=int, default=1000, help="maximum calls of each case")
+    parser.add_argument("--quick", action="store_true", help="short run, for smoke testing")
+    parser.add_argument("--output", help="write the report as JSON")
+    parser.add_argument("--baseline", help="earlier JSON report to compare with")
+    args = parser.parse_args()
+    if args.quick:
+        args.min_time, args.max_repeat = 0.1, 20
+
+    cv2.setNumThreads(1)
+    cases = run(args.min_time, args.max_repeat)
+    report = {
+        "commit": git_commit(),
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "environment": {
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "opencv": cv2.__version__,
+            "machine": platform.machine(),
+            "processor": platform.processor(),
+            "cpus": os.cpu_count(),
+        },
+        "cases": cases,
+    }
+    if args.baseline:
+        compare(cases, args.baseline)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,293 @@
+"""Headless end-to-end benchmark of the AI pipeline on recorded clips.
+
+Plays each clip through its own ``AIService`` (motion gate, detection, tracking,
+association, OCR, drawing and output building) and reports per-stage latency
+percentiles, sustained FPS and peak RSS:
+
+    python scripts/bench_pipeline.py clip1.mp4 [clip2.mp4 ...] [--realtime] [--max-frames 1000] \
+        [--config camera.json] [--no-preview] [--no-best-shot] [--keyframe-eval] [--budget budget.json] \
+        [--output report.json]
+
+By default frames are processed as fast as possible. With ``--realtime`` the clip is
+played at its own frame rate like a live camera: frames that arrive while the pipeline
+is busy are dropped and counted. ``--no-preview`` measures a camera nobody watches, whose
+annotated frame is neither drawn nor encoded. ``--no-best-shot`` reads every plate crop
+instead of the improving shots of each track: compare the plate crops sent to OCR and the
+plates of the finalized violations of both runs to check that the gate costs no accuracy.
+
+With ``keyframe_detection`` enabled in the camera config, frames between keyframes only
+get the tracker prediction. ``--keyframe-eval`` also runs the detector on those frames,
+outside the measured time, and reports how many detected vehicles the prediction found
+(IoU >= 0.5) and their mean IoU: the accuracy side of the FPS gained.
+
+A budget file holds the limits the run must stay within, the command exits with
+status 1 when one is exceeded::
+
+    {"fps_min": 15, "peak_rss_mb_max": 3000, "drop_rate_max": 0.05,
+     "stages": {"detect": {"p95_ms": 45}, "total": {"p99_ms": 120}}}
+"""
+import argparse
+import asyncio
+import json
+import os
+import resource
+import sys
+import time
+from typing import Any, Dict, List, Optional
+import cv2
+import numpy as np
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from src.modules.ai_service import AIService
+from src.services.metrics import get_metrics
+from compare_detector_backends import box_iou
+
+STAGES = ("detect", "track", "mapping", "plate", "visualize", "json", "total")
+
+
+def peak_rss_mb() -> float:
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def summarize(samples: Dict[str, List[float]]) -> Dict[str, Dict[str, float]]:
+    """p50, p95, p99 and mean of every stage, in milliseconds"""
+    summary = {}
+    for stage in STAGES:
+        values = np.asarray(samples.get(stage, []), dtype=np.float64) * 1000
+        if len(values) == 0:
+            continue
+        summary[stage] = {
+            "p50_ms": float(np.percentile(values, 50)),
+            "p95_ms": float(np.percentile(values, 95)),
+            "p99_ms": float(np.percentile(values, 99)),
+            "mean_ms": float(values.mean()),
+        }
+    return summary
+
+
+def match_prediction(service: AIService, frame: np.ndarray, iou_threshold: float = 0.5) -> List[float]:
+    """Detect the vehicles of a predicted frame and return the IoU of each one with its
+    predicted box, 0 for the vehicles the prediction missed"""
+    crop, region = service.roi.crop(frame)
+    with service.vehicle_detector.acquire() as detector:
+        results = detector.predict(crop, verbose=False)
+    service.roi.restore(results[0], frame, region)
+    data = results[0].boxes.data
+    data = data.cpu().numpy() if hasattr(data, "cpu") else np.asarray(data)
+    detected = data[data[:, 5] == 0, :4]
+    predicted = service.keyframes.last_prediction.vehicle_boxes
+    if len(detected) == 0 or len(predicted) == 0:
+        return [0.0] * len(detected)
+    iou = box_iou(detected, predicted)
+    matched = []
+    for _ in range(len(detected)):
+        d, p = np.unravel_index(np.argmax(iou), iou.shape)
+        if iou[d, p] < iou_threshold:
+            break
+        matched.append(float(iou[d, p]))
+        iou[d, :] = 0
+        iou[:, p] = 0
+    return matched + [0.0] * (len(detected) - len(matched))
+
+
+def run_clip(path: str, config: Optional[Dict[str, Any]], realtime: bool, max_frames: int, warmup: int,
+             preview: bool = True, best_shot: bool = True, keyframe_eval: bool = False) -> Dict[str, Any]:
+    capture = cv2.VideoCapture(path)
+    if not capture.isOpened():
+        raise FileNotFoundError(f"Cannot open {path}")
+    source_fps = capture.get(cv2.CAP_PROP_FPS) or 25.0
+
+    service = AIService(url=os.path.basename(path))
+    service.preview_enabled = preview
+    if not best_shot:
+        service.best_shot = None
+        service.violation_aggregator.margin = 0.0
+    if config:
+        asyncio.run(service.update_config(config))
+
+    samples: Dict[str, List[float]] = {stage: [] for stage in STAGES}
+    processed = skipped = predicted = dropped = errors = 0
+    frame_index = seen = 0
+    eval_time = 0.0  # detections run by --keyframe-eval, left out of the elapsed time
+    prediction_ious: List[float] = []
+    ocr_plates = get_metrics().ocr_plates
+    ocr_plates_start = ocr_plates.total()
+    plates: Dict[str, Optional[str]] = {}  # finalized violations, vehicle ID -> plate
+    play_start = time.perf_counter()
+    measure_start = None
+
+    while max_frames <= 0 or seen < max_frames + warmup:
+        if realtime:
+            # Skip the frames a live camera would have produced while the pipeline was busy
+            due = int((time.perf_counter() - play_start) * source_fps)
+            while frame_index < due:
+                if not capture.grab():
+                    break
+                frame_index += 1
+                if measure_start is not None:
+                    dropped += 1
+        ok, frame = capture.read()
+        if not ok:
+            break
+        frame_index += 1
+        if realtime:
+            wait = frame_index / source_fps - (time.perf_counter() - play_start)
+            if wait > 0:
+                time.sleep(wait)
+
+        if measure_start is None and seen >= warmup:
+            measure_start = time.perf_counter()
+        seen += 1
+        frame_start = time.perf_counter()
+        predicted_frames = service.keyframes.predicted_frames
+        output = service.skip_static_frame(frame)
+        was_predicted = service.keyframes.predicted_frames > predicted_frames
+        was_skipped = output is not None and not was_predicted
+        if output is None:
+            output = service._process_frame_sync(frame, frame_index)
+        total = time.perf_counter() - frame_start
+        if keyframe_eval and was_predicted and measure_start is not None:
+            eval_start = time.perf_counter()
+            prediction_ious.extend(match_prediction(service, frame))
+            eval_time += time.perf_counter() - eval_start
+
+        if output is not None:
+            for result in output.detected_result:
+                plates.setdefault(result.vehicle_id, result.plate_numbers)
+        if measure_start is None:
+            continue
+        if output is None:
+            errors += 1
+        elif was_skipped:
+            skipped += 1
+        elif was_predicted:
+            predicted += 1
+        else:
+            processed += 1
+            for stage, value in service.last_timings.items():
+                if stage in samples:
+                    samples[stage].append(value)
+            samples["total"].append(total)
+
+    elapsed = time.perf_counter() - measure_start - eval_time if measure_start is not None else 0.0
+    capture.release()
+    for result in service.violation_aggregator.flush():
+        plates.setdefault(result.vehicle_id, result.plate_numbers)
+    handled = processed + skipped + predicted
+    matched = [iou for iou in prediction_ious if iou > 0]
+    keyframes = service.keyframes.get_stats()
+    if keyframe_eval:
+        keyframes["vehicles_checked"] = len(prediction_ious)
+        keyframes["recall"] = len(matched) / len(prediction_ious) if prediction_ious else 1.0
+        keyframes["mean_iou"] = float(np.mean(matched)) if matched else 0.0
+    return {
+        "clip": path,
+        "source_fps": source_fps,
+        "frames_processed": processed,
+        "frames_skipped": skipped,
+        "frames_predicted": predicted,
+        "frames_dropped": dropped,
+        "errors": errors,
+        "drop_rate": dropped / (handled + dropped) if handled + dropped else 0.0,
+        "fps": handled / elapsed if elapsed else 0.0,
+        "stages": summarize(samples),
+        "ocr_plates": int(ocr_plates.total() - ocr_plates_start),
+        "best_shot": service.best_shot.get_stats() if service.best_shot is not None else None,
+        "keyframes": keyframes,
+        "plates": plates,
+        "samples": samples,
+    }
+
+
+def check_budget(report: Dict[str, Any], budget: Dict[str, Any]) -> List[str]:
+    """Limits of the budget exceeded by the run"""
+    failures = []
+    if "fps_min" in budget and report["fps"] < budget["fps_min"]:
+        failures.append(f"fps {report['fps']:.1f} < {budget['fps_min']}")
+    if "peak_rss_mb_max" in budget and report["peak_rss_mb"] > budget["peak_rss_mb_max"]:
+        failures.append(f"peak RSS {report['peak_rss_mb']:.0f} MB > {budget['peak_rss_mb_max']} MB")
+    if "drop_rate_max" in budget and report["drop_rate"] > budget["drop_rate_max"]:
+        failures.append(f"drop rate {report['drop_rate']:.3f} > {budget['drop_rate_max']}")
+    for stage, limits in budget.get("stages", {}).items():
+        measured = report["stages"].get(stage)
+        if measured is None:
+            continue
+        for key, limit in limits.items():
+            if measured.get(key, 0.0) > limit:
+                failures.append(f"{stage} {key} {measured[key]:.1f} > {limit}")
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Headless end-to-end benchmark of the AI pipeline")
+    parser.add_argument("clips", nargs="+", help="recorded video files")
+    parser.add_argument("--realtime", action="store_true", help="play clips at their frame rate, dropping late frames")
+    parser.add_argument("--max-frames", type=int, default=0, help="frames measured per clip, 0 = whole clip")
+    parser.add_argument("--warmup", type=int, default=10, help="frames per clip left out of the measurements")
+    parser.add_argument("--config", help="JSON camera AI config applied to every clip (ROI, motion gate...)")
+    parser.add_argument("--no-preview", action="store_true", help="skip drawing and encoding the annotated preview")
+    parser.add_argument("--no-best-shot", action="store_true", help="OCR every plate crop instead of the improving shots")
+    parser.add_argument("--keyframe-eval", action="store_true", help="check the predicted boxes against detections")
+    parser.add_argument("--budget", help="JSON budget file, exit with status 1 when exceeded")
+    parser.add_argument("--output", help="write the report as JSON")
+    args = parser.parse_args()
+
+    config = None
+    if args.config:
+        with open(args.config) as f:
+            config = json.load(f)
+
+    clips = [run_clip(path, config, args.realtime, args.max_frames, args.warmup, not args.no_preview, not args.no_best_shot,
+                      args.keyframe_eval)
+             for path in args.clips]
+
+    # Overall figures over all clips
+    samples = {stage: [v for clip in clips for v in clip["samples"][stage]] for stage in STAGES}
+    handled = sum(c["frames_processed"] + c["frames_skipped"] + c["frames_predicted"] for c in clips)
+    dropped = sum(c["frames_dropped"] for c in clips)
+    busy = sum((c["frames_processed"] + c["frames_skipped"] + c["frames_predicted"]) / c["fps"] for c in clips if c["fps"])
+    report = {
+        "mode": "realtime" if args.realtime else "full_speed",
+        "preview": not args.no_preview,
+        "best_shot": not args.no_best_shot,
+        "frames": handled,
+        "fps": handled / busy if busy else 0.0,
+        "drop_rate": dropped / (handled + dropped) if handled + dropped else 0.0,
+        "peak_rss_mb": peak_rss_mb(),
+        "stages": summarize(samples),
+        "clips": [{k: v for k, v in clip.items() if k != "samples"} for clip in clips],
+    }
+
+    for clip in report["clips"]:
+        print(f"{clip['clip']}: {clip['fps']:.1f} FPS, {clip['frames_processed']} processed, "
+              f"{clip['frames_skipped']} skipped, {clip['frames_dropped']} dropped, {clip['errors']} errors")
+        avoided = f", {clip['best_shot']['rejected_low'] + clip['best_shot']['rejected_not_better']} avoided" if clip["best_shot"] else ""
+        print(f"  {clip['ocr_plates']} plates read{avoided}, {len(clip['plates'])} violations finalized")
+        keyframes = clip["keyframes"]
+        if keyframes["enabled"]:
+            accuracy = (f", vehicle recall {keyframes['recall']:.3f}, mean IoU {keyframes['mean_iou']:.3f} "
+                        f"over {keyframes['vehicles_checked']} vehicles" if "recall" in keyframes else "")
+            print(f"  {clip['frames_predicted']} predicted frames, detect rate {keyframes['detect_rate']:.2f}{accuracy}")
+    print(f"{'stage':<11}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'mean ms':>9}")
+    for stage, stats in report["stages"].items():
+        print(f"{stage:<11}{stats['p50_ms']:>9.2f}{stats['p95_ms']:>9.2f}{stats['p99_ms']:>9.2f}{stats['mean_ms']:>9.2f}")
+    print(f"Sustained {report['fps']:.1f} FPS over {handled} frames, peak RSS {report['peak_rss_mb']:.0f} MB")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+    if args.budget:
+        with open(args.budget) as f:
+            failures = check_budget(report, json.load(f))
+        if failures:
+            print("Budget exceeded:\n  " + "\n  ".join(failures))
+            sys.exit(1)
+        print("Within budget")
+
+
+if __name__ == "__main__":
+    main()
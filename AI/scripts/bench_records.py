@@ -0,0 +1,153 @@
+"""Construction and serialization cost of the per-frame output records.
+
+Compares the former pydantic ``DetectedResult``/``DeviceDetection`` models with the slotted
+records of ``src/models/base_model.py`` on one processing round of many cameras:
+
+    python scripts/bench_records.py [--cameras 50] [--violations 0 1 5] [--quick] [--output records.json]
+
+Cases, each for one round (one output per camera):
+
+* ``construct``: building the outputs and their violations
+* ``to_dict``: converting them to plain dicts, as the worker processes do
+* ``result_json``: serializing a ``/result`` response, the former path (base64 preview,
+  ``jsonable_encoder``, ``json.dumps``) against the lean ``ResultStore`` payload
+* ``result_frames``: the same with ``include_frames``, which still ships previews and crops
+"""
+import argparse
+import asyncio
+import base64
+import json
+import os
+import sys
+import warnings
+from enum import Enum
+from typing import Any, Dict, List, Optional
+from fastapi.encoders import jsonable_encoder
+from pydantic import BaseModel
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from src.models.base_model import DetectedResult, DeviceDetection, ViolationType
+from src.services.result_store import ResultStore, dumps, orjson
+from bench_hotpath import measure
+
+POST_FRAME = os.urandom(120_000)  # preview JPEG of a 960 px wide frame
+CROP = base64.b64encode(os.urandom(15_000)).decode()  # evidence crop
+
+
+class LegacyViolationType(str, Enum):
+    NO_HELMET = "no_helmet"
+
+
+class LegacyDetectedResult(BaseModel):
+    """DetectedResult as it was before the records"""
+    vehicle_id: str
+    image: str
+    violation: Optional[LegacyViolationType]
+    plate_numbers: str | None
+    time: str | None
+    plate_conf: float
+    camera_id: str | None
+    status: str | None
+
+
+class LegacyDeviceDetection(BaseModel):
+    """DeviceDetection as it was before the records"""
+    camera_id: str
+    post_frame: bytes
+    detected_result: List[LegacyDetectedResult] = []
+
+
+def violation_fields(camera: int, index: int) -> Dict[str, Any]:
+    return {
+        "vehicle_id": f"2026-01-01_id_{index}",
+        "image": CROP,
+        "plate_numbers": "59-F1 123.45",
+        "time": "2026-01-01T08:00:00",
+        "plate_conf": 0.93,
+        "camera_id": f"rtsp://camera-{camera}",
+        "status": "AI reliable",
+    }
+
+
+def build_legacy(cameras: int, violations: int) -> List[LegacyDeviceDetection]:
+    return [
+        LegacyDeviceDetection(
+            camera_id=f"rtsp://camera-{camera}",
+            post_frame=POST_FRAME,
+            detected_result=[
+                LegacyDetectedResult(violation=LegacyViolationType.NO_HELMET, **violation_fields(camera, i))
+                for i in range(violations)
+            ],
+        )
+        for camera in range(cameras)
+    ]
+
+
+def build_records(cameras: int, violations: int) -> List[DeviceDetection]:
+    return [
+        DeviceDetection(
+            camera_id=f"rtsp://camera-{camera}",
+            post_frame=POST_FRAME,
+            detected_result=[
+                DetectedResult(violation=ViolationType.NO_HELMET, **violation_fields(camera, i))
+                for i in range(violations)
+            ],
+        )
+        for camera in range(cameras)
+    ]
+
+
+def legacy_result_json(outputs: List[LegacyDeviceDetection]) -> bytes:
+    """Former GET /result: base64 previews, jsonable_encoder, then the response encoder"""
+    device_list = [output.model_copy(update={"post_frame": base64.b64encode(output.post_frame).decode()}) for output in outputs]
+    return json.dumps(jsonable_encoder({"time": 0.0, "device_list": device_list})).encode()
+
+
+def run(cameras: int, violation_counts: List[int], min_time: float, max_repeat: int) -> List[Dict[str, Any]]:
+    cases = []
+
+    def add(name: str, size: str, before, after) -> None:
+        stats = {"before": measure(before, min_time, max_repeat), "after": measure(after, min_time, max_repeat)}
+        speedup = stats["before"]["median_ms"] / stats["after"]["median_ms"] if stats["after"]["median_ms"] else 0.0
+        cases.append({"name": name, "size": size, **stats, "speedup": speedup})
+        print(f"{name:<15}{size:<16}{stats['before']['median_ms']:>11.3f}{stats['after']['median_ms']:>11.3f}{speedup:>9.1f}x")
+
+    print(f"{'case':<15}{'size':<16}{'before ms':>11}{'after ms':>11}{'speedup':>10}")
+    for violations in violation_counts:
+        size = f"{cameras}cam_{violations}viol"
+        legacy, records = build_legacy(cameras, violations), build_records(cameras, violations)
+        add("construct", size, lambda: build_legacy(cameras, violations), lambda: build_records(cameras, violations))
+        add("to_dict", size, lambda: [output.model_dump() for output in legacy], lambda: [output.to_dict() for output in records])
+
+        store = ResultStore(history=max(violations, 1), cache_size=0)  # time the serialization, not the cache
+        for camera, output in enumerate(records):
+            asyncio.run(store.update(f"camera-{camera}", output, 0.0))
+        add("result_json", size, lambda: legacy_result_json(legacy), store.delta_json)
+        add("result_frames", size, lambda: legacy_result_json(legacy), lambda: dumps(store.delta(include_frames=True)))
+    return cases
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cost of the pipeline output records")
+    parser.add_argument("--cameras", type=int, default=50, help="outputs per processing round")
+    parser.add_argument("--violations", type=int, nargs="+", default=[0, 1, 5], help="violations per output")
+    parser.add_argument("--min-time", type=float, default=1.0, help="seconds spent on each case")
+    parser.add_argument("--max-repeat", type=int, default=500, help="maximum calls of each case")
+    parser.add_argument("--quick", action="store_true", help="short run, for smoke testing")
+    parser.add_argument("--output", help="write the report as JSON")
+    args = parser.parse_args()
+    if args.quick:
+        args.min_time, args.max_repeat = 0.1, 20
+
+    # The former /result replaced the bytes preview by its base64 string, pydantic warns about it
+    warnings.filterwarnings("ignore", message="Pydantic serializer warnings")
+    print(f"JSON encoder: {'orjson' if orjson is not None else 'json'}")
+    cases = run(args.cameras, args.violations, args.min_time, args.max_repeat)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"cameras": args.cameras, "encoder": "orjson" if orjson is not None else "json", "cases": cases}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
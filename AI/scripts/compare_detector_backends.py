@@ -0,0 +1,164 @@
+"""Parity and throughput comparison of the detector backends.
+
+Runs the same frames through the PyTorch weights and their ONNX Runtime / OpenVINO
+exports, matches the boxes of every backend against PyTorch and times each backend
+at several batch sizes:
+
+    python scripts/compare_detector_backends.py --source MVI_0334.MOV --frames 200 \
+        --backends torch onnx openvino --batch-sizes 1 4 8 [--static] [--output report.json]
+
+With ``--static`` a model with a fixed batch size is exported for every batch size,
+otherwise one model with dynamic shapes is used for all of them.
+"""
+import argparse
+import glob
+import json
+import os
+import sys
+import time
+from typing import Dict, List
+import cv2
+import numpy as np
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from src.config import ModelConfig
+from src.modules.vehicle_detection import DETECT_BACKENDS, load_detector
+
+
+def read_frames(source: str, count: int) -> List[np.ndarray]:
+    """Read up to ``count`` frames from a video file or a folder of images"""
+    if os.path.isdir(source):
+        paths = sorted(glob.glob(os.path.join(source, "*.jpg")) + glob.glob(os.path.join(source, "*.png")))
+        return [cv2.imread(path) for path in paths[:count]]
+    capture = cv2.VideoCapture(source)
+    frames = []
+    while len(frames) < count:
+        ret, frame = capture.read()
+        if not ret:
+            break
+        frames.append(frame)
+    capture.release()
+    return frames
+
+
+def box_iou(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """Pairwise IoU of xyxy boxes"""
+    tl = np.maximum(a[:, None, :2], b[None, :, :2])
+    br = np.minimum(a[:, None, 2:4], b[None, :, 2:4])
+    inter = np.prod(np.clip(br - tl, 0, None), axis=2)
+    area_a = np.prod(a[:, 2:4] - a[:, :2], axis=1)
+    area_b = np.prod(b[:, 2:4] - b[:, :2], axis=1)
+    return inter / (area_a[:, None] + area_b[None, :] - inter + 1e-9)
+
+
+def match_boxes(reference: np.ndarray, candidate: np.ndarray, iou_threshold: float) -> Dict[str, float]:
+    """Greedy one-to-one matching of two ``boxes.data`` arrays (x1, y1, x2, y2, conf, cls)"""
+    if len(reference) == 0 or len(candidate) == 0:
+        return {"matched": 0, "reference": len(reference), "candidate": len(candidate), "iou": [], "conf_diff": []}
+    iou = box_iou(reference, candidate)
+    iou[reference[:, 5][:, None] != candidate[:, 5][None, :]] = 0
+    matched_iou, conf_diff = [], []
+    for index in np.argsort(-iou, axis=None):
+        i, j = np.unravel_index(index, iou.shape)
+        if iou[i, j] < iou_threshold:
+            break
+        matched_iou.append(float(iou[i, j]))
+        conf_diff.append(abs(float(reference[i, 4] - candidate[j, 4])))
+        iou[i, :] = 0
+        iou[:, j] = 0
+    return {"matched": len(matched_iou), "reference": len(reference), "candidate": len(candidate),
+            "iou": matched_iou, "conf_diff": conf_diff}
+
+
+def run_detector(detector, frames: List[np.ndarray], batch_size: int) -> List[np.ndarray]:
+    outputs = []
+    for start in range(0, len(frames), batch_size):
+        results = detector.predict(frames[start:start + batch_size])
+        outputs.extend(result.boxes.data.cpu().numpy() for result in results)
+    return outputs
+
+
+def benchmark(detector, frames: List[np.ndarray], batch_size: int, repeats: int) -> Dict[str, float]:
+    run_detector(detector, frames[:batch_size], batch_size)  # warm up this batch shape
+    latencies = []
+    for _ in range(repeats):
+        for start in range(0, len(frames), batch_size):
+            time_start = time.perf_counter()
+            detector.predict(frames[start:start + batch_size])
+            latencies.append(time.perf_counter() - time_start)
+    total = sum(latencies)
+    return {
+        "fps": len(frames) * repeats / total,
+        "batch_latency_ms_p50": float(np.percentile(latencies, 50) * 1000),
+        "batch_latency_ms_p95": float(np.percentile(latencies, 95) * 1000),
+    }
+
+
+def parity(reference: List[np.ndarray], candidate: List[np.ndarray], iou_threshold: float) -> Dict[str, float]:
+    stats = [match_boxes(r, c, iou_threshold) for r, c in zip(reference, candidate)]
+    matched = sum(s["matched"] for s in stats)
+    n_reference = sum(s["reference"] for s in stats)
+    n_candidate = sum(s["candidate"] for s in stats)
+    ious = [x for s in stats for x in s["iou"]]
+    conf_diff = [x for s in stats for x in s["conf_diff"]]
+    return {
+        "recall_vs_torch": matched / n_reference if n_reference else 1.0,
+        "precision_vs_torch": matched / n_candidate if n_candidate else 1.0,
+        "mean_iou": float(np.mean(ious)) if ious else 0.0,
+        "mean_conf_diff": float(np.mean(conf_diff)) if conf_diff else 0.0,
+        "max_conf_diff": float(np.max(conf_diff)) if conf_diff else 0.0,
+        "boxes_torch": n_reference,
+        "boxes": n_candidate,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare detector backends")
+    parser.add_argument("--weights", default=ModelConfig.DETECT_WEIGHT_PATH)
+    parser.add_argument("--source", default=ModelConfig.source_video_path, help="video file or folder of images")
+    parser.add_argument("--frames", type=int, default=100)
+    parser.add_argument("--backends", nargs="+", default=list(DETECT_BACKENDS), choices=list(DETECT_BACKENDS))
+    parser.add_argument("--batch-sizes", nargs="+", type=int, default=[1, 4, 8])
+    parser.add_argument("--imgsz", type=int, default=ModelConfig.DETECT_IMGSZ)
+    parser.add_argument("--static", action="store_true", help="export one fixed-batch model per batch size")
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--iou", type=float, default=0.5, help="IoU to match a box with the PyTorch box")
+    parser.add_argument("--output", help="write the report as JSON")
+    args = parser.parse_args()
+
+    frames = read_frames(args.source, args.frames)
+    if not frames:
+        sys.exit(f"No frames read from {args.source}")
+    print(f"{len(frames)} frames from {args.source}")
+
+    reference = run_detector(load_detector(args.weights, "torch"), frames, 1)
+    report = {"frames": len(frames), "imgsz": args.imgsz, "backends": {}}
+    for backend in args.backends:
+        report["backends"][backend] = {"throughput": {}}
+        detector = None
+        for batch_size in args.batch_sizes:
+            if detector is None or (args.static and backend != "torch"):
+                export_batch = batch_size if args.static and backend != "torch" else 0
+                detector = load_detector(args.weights, backend, imgsz=args.imgsz, batch=export_batch)
+            report["backends"][backend]["throughput"][batch_size] = benchmark(detector, frames, batch_size, args.repeats)
+        if backend != "torch":
+            report["backends"][backend]["parity"] = parity(reference, run_detector(detector, frames, 1), args.iou)
+
+    print(f"{'backend':<10}{'batch':>6}{'fps':>10}{'p50 ms':>10}{'p95 ms':>10}")
+    for backend, result in report["backends"].items():
+        for batch_size, timing in result["throughput"].items():
+            print(f"{backend:<10}{batch_size:>6}{timing['fps']:>10.1f}"
+                  f"{timing['batch_latency_ms_p50']:>10.1f}{timing['batch_latency_ms_p95']:>10.1f}")
+    for backend, result in report["backends"].items():
+        if "parity" in result:
+            p = result["parity"]
+            print(f"{backend}: recall {p['recall_vs_torch']:.3f}, precision {p['precision_vs_torch']:.3f}, "
+                  f"mean IoU {p['mean_iou']:.3f}, conf diff mean {p['mean_conf_diff']:.4f} max {p['max_conf_diff']:.4f}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""Accuracy and speed of the plate OCR modes on a labelled set of plate crops.
+
+The labels file is a CSV of ``image_path,text`` rows, paths relative to the file, with
+two-line plates written with a newline or a space between the lines:
+
+    python scripts/eval_plate_ocr.py --labels plates/val.csv [--modes det_rec rec_only] \
+        [--batch 16] [--output report.json]
+
+Texts are compared on their uppercase letters and digits only, so separators and the
+line break do not count. Reported per mode: milliseconds per plate, exact-match accuracy
+and character error rate (CER).
+"""
+import argparse
+import csv
+import json
+import os
+import re
+import sys
+import time
+from typing import Dict, List, Tuple
+import cv2
+import numpy as np
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from src.models.ai_model import ModelRegistry
+from src.modules.plate_recognition import PLATE_OCR_MODES, PlateRecognizer
+
+
+def normalize(text: str) -> str:
+    return re.sub(r"[^0-9A-Z]", "", (text or "").upper())
+
+
+def edit_distance(a: str, b: str) -> int:
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, 1):
+        current = [i]
+        for j, char_b in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (char_a != char_b)))
+        previous = current
+    return previous[-1]
+
+
+def read_labels(path: str) -> List[Tuple[np.ndarray, str]]:
+    """Plate crops and their texts, unreadable images are skipped"""
+    root = os.path.dirname(os.path.abspath(path))
+    samples = []
+    with open(path, newline="", encoding="utf-8") as f:
+        for row in csv.reader(f):
+            if len(row) < 2 or row[0] == "image_path":
+                continue
+            image = cv2.imread(os.path.join(root, row[0]))
+            if image is not None:
+                samples.append((image, row[1]))
+    return samples
+
+
+def evaluate(recognizer: PlateRecognizer, samples: List[Tuple[np.ndarray, str]], batch: int) -> Dict[str, float]:
+    recognizer.recognize_batch([image for image, _ in samples[:batch]])  # warm-up
+    predictions, elapsed = [], 0.0
+    for start in range(0, len(samples), batch):
+        crops = [image for image, _ in samples[start:start + batch]]
+        began = time.perf_counter()
+        predictions.extend(text for text, _ in recognizer.recognize_batch(crops))
+        elapsed += time.perf_counter() - began
+
+    exact, errors, chars = 0, 0, 0
+    for (_, label), prediction in zip(samples, predictions):
+        label, prediction = normalize(label), normalize(prediction)
+        exact += label == prediction
+        errors += edit_distance(prediction, label)
+        chars += len(label)
+    return {
+        "plates": len(samples),
+        "ms_per_plate": elapsed * 1000 / len(samples),
+        "exact_match": exact / len(samples),
+        "cer": errors / max(chars, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the plate OCR modes")
+    parser.add_argument("--labels", required=True, help="CSV of image_path,text")
+    parser.add_argument("--modes", nargs="+", default=list(PLATE_OCR_MODES), choices=PLATE_OCR_MODES)
+    parser.add_argument("--batch", type=int, default=16, help="plates per recognize_batch call")
+    parser.add_argument("--output", help="write the report as JSON")
+    args = parser.parse_args()
+
+    samples = read_labels(args.labels)
+    if not samples:
+        sys.exit(f"No readable plates in {args.labels}")
+    ocr_model = ModelRegistry().ocr  # only the OCR network is loaded
+
+    report = {}
+    print(f"{'mode':<10}{'plates':>8}{'ms/plate':>10}{'exact':>8}{'CER':>8}")
+    for mode in args.modes:
+        stats = report[mode] = evaluate(PlateRecognizer(ocr_model, mode=mode), samples, args.batch)
+        print(f"{mode:<10}{stats['plates']:>8}{stats['ms_per_plate']:>10.2f}{stats['exact_match']:>8.3f}{stats['cer']:>8.3f}")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
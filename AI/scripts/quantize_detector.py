@@ -0,0 +1,238 @@
+"""INT8 post-training quantization of the detector.
+
+Calibrates the detector on a folder of our own frames, writes the INT8 model where
+``load_detector`` expects it and reports per-class accuracy against the FP32 model:
+
+    python scripts/quantize_detector.py --backend openvino --calib-dir data/calib_frames \
+        [--eval-dir data/eval_frames] [--labels-dir data/eval_labels] [--output int8_report.json]
+
+The quantized model is then used by setting ``DETECT_BACKEND`` to the same backend
+and ``DETECT_PRECISION=int8``, with the same ``DETECT_IMGSZ`` and ``DETECT_BATCH``.
+
+OpenVINO models are quantized with NNCF through the ultralytics exporter, ONNX models
+with ONNX Runtime static quantization (QDQ). In both cases the box decoding of the
+detection head is kept in floating point.
+
+With ``--labels-dir`` (YOLO txt labels named like the images), precision and recall
+against the labels are reported for both models as well.
+"""
+import argparse
+import glob
+import json
+import os
+import re
+import shutil
+import sys
+import tempfile
+import time
+from typing import Dict, List, Optional
+import cv2
+import numpy as np
+import yaml
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from ultralytics import YOLO
+from src.config import ModelConfig
+from src.modules.vehicle_detection import export_detector, exported_model_path, load_detector
+from compare_detector_backends import match_boxes
+
+
+def list_images(folder: str, limit: Optional[int] = None) -> List[str]:
+    """Images of a folder, evenly sampled down to ``limit``"""
+    paths = sorted(p for ext in ("jpg", "jpeg", "png") for p in glob.glob(os.path.join(folder, f"*.{ext}")))
+    if limit and len(paths) > limit:
+        paths = [paths[i] for i in np.linspace(0, len(paths) - 1, limit).astype(int)]
+    return paths
+
+
+def quantize_openvino(weights: str, images: List[str], imgsz: int, batch: int, target: str) -> None:
+    """NNCF quantization through the ultralytics exporter, calibrated on ``images``"""
+    with tempfile.TemporaryDirectory() as workdir:
+        image_dir = os.path.join(workdir, "images")
+        os.makedirs(image_dir)
+        for path in images:
+            os.symlink(os.path.abspath(path), os.path.join(image_dir, os.path.basename(path)))
+        # Calibration only needs images, the missing labels are reported as a warning
+        data_yaml = os.path.join(workdir, "calib.yaml")
+        with open(data_yaml, "w") as f:
+            yaml.safe_dump({"path": workdir, "train": "images", "val": "images",
+                            "names": YOLO(weights, verbose=False).names}, f)
+        exported = YOLO(weights, verbose=False).export(
+            format="openvino", int8=True, data=data_yaml, imgsz=imgsz,
+            batch=max(1, batch), dynamic=batch <= 0, verbose=False,
+        )
+        shutil.move(str(exported).rstrip(os.sep), target)
+
+
+class FrameCalibrationReader:
+    """Calibration data reader of ONNX Runtime, preprocessed like the ultralytics predictor"""
+
+    def __init__(self, images: List[str], imgsz: int, batch: int, input_name: str):
+        self.images = images
+        self.imgsz = imgsz
+        self.batch = max(1, batch)
+        self.input_name = input_name
+        self._index = 0
+
+    def _preprocess(self, path: str) -> np.ndarray:
+        from ultralytics.data.augment import LetterBox
+
+        image = LetterBox(new_shape=(self.imgsz, self.imgsz), auto=False)(image=cv2.imread(path))
+        return image[..., ::-1].transpose(2, 0, 1).astype(np.float32) / 255.0
+
+    def get_next(self) -> Optional[Dict[str, np.ndarray]]:
+        if self._index + self.batch > len(self.images):
+            return None
+        paths = self.images[self._index:self._index + self.batch]
+        self._index += self.batch
+        return {self.input_name: np.stack([self._preprocess(path) for path in paths])}
+
+    def rewind(self) -> None:
+        self._index = 0
+
+
+def quantize_onnx(weights: str, images: List[str], imgsz: int, batch: int, target: str) -> None:
+    """ONNX Runtime static QDQ quantization of the FP32 export"""
+    import onnx
+    from onnxruntime.quantization import CalibrationMethod, QuantFormat, QuantType, quantize_static
+
+    fp32_path = str(export_detector(weights, "onnx", imgsz, batch))
+    fp32_model = onnx.load(fp32_path)
+
+    # Keep the box decoding of the detection head (last module) in floating point
+    head = max(int(m.group(1)) for node in fp32_model.graph.node if (m := re.match(r"/model\.(\d+)/", node.name)))
+    nodes_to_exclude = [
+        node.name for node in fp32_model.graph.node
+        if node.name.startswith(f"/model.{head}/")
+        and (node.op_type in {"Add", "Sub", "Mul", "Div", "Sigmoid"} or ".dfl" in node.name or "/dfl/" in node.name)
+    ]
+
+    reader = FrameCalibrationReader(images, imgsz, batch, fp32_model.graph.input[0].name)
+    quantize_static(
+        fp32_path, target, reader,
+        quant_format=QuantFormat.QDQ,
+        per_channel=True,
+        activation_type=QuantType.QUInt8,
+        weight_type=QuantType.QInt8,
+        calibrate_method=CalibrationMethod.MinMax,
+        nodes_to_exclude=nodes_to_exclude,
+    )
+
+    # ultralytics reads class names, stride and input size from the model metadata
+    int8_model = onnx.load(target)
+    del int8_model.metadata_props[:]
+    int8_model.metadata_props.extend(fp32_model.metadata_props)
+    onnx.save(int8_model, target)
+
+
+def load_labels(labels_dir: str, image_path: str, shape) -> np.ndarray:
+    """YOLO txt labels of an image as (x1, y1, x2, y2, 1, cls) rows in pixels"""
+    label_path = os.path.join(labels_dir, os.path.splitext(os.path.basename(image_path))[0] + ".txt")
+    if not os.path.exists(label_path):
+        return np.zeros((0, 6))
+    rows = np.loadtxt(label_path, ndmin=2)
+    if rows.size == 0:
+        return np.zeros((0, 6))
+    h, w = shape[:2]
+    cls, cx, cy, bw, bh = rows[:, 0], rows[:, 1] * w, rows[:, 2] * h, rows[:, 3] * w, rows[:, 4] * h
+    return np.stack([cx - bw / 2, cy - bh / 2, cx + bw / 2, cy + bh / 2, np.ones_like(cls), cls], axis=1)
+
+
+def per_class_match(reference: List[np.ndarray], candidate: List[np.ndarray], class_id: int, iou: float) -> Dict[str, float]:
+    matched = n_reference = n_candidate = 0
+    conf_diff = []
+    for r, c in zip(reference, candidate):
+        stats = match_boxes(r[r[:, 5] == class_id], c[c[:, 5] == class_id], iou)
+        matched += stats["matched"]
+        n_reference += stats["reference"]
+        n_candidate += stats["candidate"]
+        conf_diff.extend(stats["conf_diff"])
+    return {
+        "recall": matched / n_reference if n_reference else 1.0,
+        "precision": matched / n_candidate if n_candidate else 1.0,
+        "boxes_reference": n_reference,
+        "boxes": n_candidate,
+        "mean_conf_diff": float(np.mean(conf_diff)) if conf_diff else 0.0,
+    }
+
+
+def predict_all(detector, frames: List[np.ndarray]) -> Dict[str, object]:
+    outputs, latencies = [], []
+    for frame in frames:
+        time_start = time.perf_counter()
+        result = detector.predict(frame)[0]
+        latencies.append(time.perf_counter() - time_start)
+        outputs.append(result.boxes.data.cpu().numpy())
+    return {"boxes": outputs, "fps": len(frames) / sum(latencies)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="INT8 post-training quantization of the detector")
+    parser.add_argument("--weights", default=ModelConfig.DETECT_WEIGHT_PATH)
+    parser.add_argument("--backend", default="openvino", choices=["openvino", "onnx"])
+    parser.add_argument("--calib-dir", required=True, help="folder of calibration frames")
+    parser.add_argument("--max-calib", type=int, default=300, help="calibration frames used, evenly sampled")
+    parser.add_argument("--eval-dir", help="folder of evaluation frames, defaults to the calibration folder")
+    parser.add_argument("--max-eval", type=int, default=200)
+    parser.add_argument("--labels-dir", help="YOLO txt labels of the evaluation frames")
+    parser.add_argument("--imgsz", type=int, default=ModelConfig.DETECT_IMGSZ)
+    parser.add_argument("--batch", type=int, default=ModelConfig.DETECT_BATCH, help="fixed batch, 0 = dynamic")
+    parser.add_argument("--iou", type=float, default=0.5)
+    parser.add_argument("--force", action="store_true", help="quantize again if the INT8 model exists")
+    parser.add_argument("--output", help="write the report as JSON")
+    args = parser.parse_args()
+
+    target = str(exported_model_path(args.weights, args.backend, args.imgsz, args.batch, "int8"))
+    if os.path.isdir(target) and args.force:
+        shutil.rmtree(target)
+    elif os.path.isfile(target) and args.force:
+        os.remove(target)
+    if not os.path.exists(target):
+        calib_images = list_images(args.calib_dir, args.max_calib)
+        if len(calib_images) < max(1, args.batch):
+            sys.exit(f"Not enough calibration frames in {args.calib_dir}")
+        print(f"Calibrating on {len(calib_images)} frames from {args.calib_dir}...")
+        quantize = quantize_openvino if args.backend == "openvino" else quantize_onnx
+        quantize(args.weights, calib_images, args.imgsz, args.batch, target)
+    print(f"INT8 model: {target}")
+
+    # Accuracy of the INT8 model against the FP32 model of the same backend
+    eval_images = list_images(args.eval_dir or args.calib_dir, args.max_eval)
+    frames = [cv2.imread(path) for path in eval_images]
+    fp32 = load_detector(args.weights, args.backend, imgsz=args.imgsz, batch=args.batch)
+    int8 = load_detector(args.weights, args.backend, imgsz=args.imgsz, batch=args.batch, precision="int8")
+    fp32_out, int8_out = predict_all(fp32, frames), predict_all(int8, frames)
+    labels = [load_labels(args.labels_dir, path, frame.shape) for path, frame in zip(eval_images, frames)] if args.labels_dir else None
+
+    report = {
+        "model": target,
+        "frames": len(frames),
+        "fps": {"fp32": fp32_out["fps"], "int8": int8_out["fps"]},
+        "classes": {},
+    }
+    for class_id, name in fp32.names.items():
+        entry = {"int8_vs_fp32": per_class_match(fp32_out["boxes"], int8_out["boxes"], class_id, args.iou)}
+        if labels is not None:
+            entry["fp32_vs_labels"] = per_class_match(labels, fp32_out["boxes"], class_id, args.iou)
+            entry["int8_vs_labels"] = per_class_match(labels, int8_out["boxes"], class_id, args.iou)
+        report["classes"][name] = entry
+
+    print(f"FP32 {report['fps']['fp32']:.1f} FPS, INT8 {report['fps']['int8']:.1f} FPS on {len(frames)} frames")
+    print(f"{'class':<14}{'fp32 boxes':>11}{'int8 boxes':>11}{'recall':>8}{'precision':>11}{'conf diff':>11}")
+    for name, entry in report["classes"].items():
+        m = entry["int8_vs_fp32"]
+        print(f"{name:<14}{m['boxes_reference']:>11}{m['boxes']:>11}{m['recall']:>8.3f}{m['precision']:>11.3f}{m['mean_conf_diff']:>11.4f}")
+    if labels is not None:
+        print(f"{'class':<14}{'fp32 P':>8}{'fp32 R':>8}{'int8 P':>8}{'int8 R':>8}  (against labels)")
+        for name, entry in report["classes"].items():
+            f, q = entry["fp32_vs_labels"], entry["int8_vs_labels"]
+            print(f"{name:<14}{f['precision']:>8.3f}{f['recall']:>8.3f}{q['precision']:>8.3f}{q['recall']:>8.3f}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+"""Local stand-in for the backend violation endpoint.
+
+Used to exercise the violation uploader and its outbox without the real backend:
+
+    python scripts/stub_backend.py --port 8386 --down-for 30 --fail-rate 0.2
+    BACKEND_URL=http://127.0.0.1:8386 uvicorn src.app_v2:app
+
+The stub answers 503 for the first ``--down-for`` seconds, then fails a random
+``--fail-rate`` share of the requests. ``GET /stats`` returns what it received.
+"""
+import argparse
+import asyncio
+import random
+import time
+from typing import Any, Dict, List
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+
+def create_app(down_for: float = 0.0, fail_rate: float = 0.0, latency: float = 0.0) -> FastAPI:
+    app = FastAPI()
+    started_at = time.time()
+    stats: Dict[str, Any] = {"requests": 0, "failed": 0, "violations": 0, "tracking_ids": set()}
+
+    @app.post("/api/violations/create/")
+    async def create_violations(request: Request):
+        stats["requests"] += 1
+        if latency:
+            await asyncio.sleep(latency)
+        if time.time() - started_at < down_for or random.random() < fail_rate:
+            stats["failed"] += 1
+            return JSONResponse(status_code=503, content={"detail": "stub backend unavailable"})
+
+        items: List[Dict[str, Any]] = await request.json()
+        if not isinstance(items, list):
+            return JSONResponse(status_code=400, content={"detail": "expected a list of violations"})
+        stats["violations"] += len(items)
+        stats["tracking_ids"].update(item.get("tracking_id") for item in items)
+        return JSONResponse(status_code=201, content={"created": len(items)})
+
+    @app.get("/stats")
+    async def get_stats():
+        return {**stats, "tracking_ids": len(stats["tracking_ids"])}
+
+    return app
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Stub of the backend violation endpoint")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8386)
+    parser.add_argument("--down-for", type=float, default=0.0, help="seconds answering 503 after start")
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="share of requests answered with 503")
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every request")
+    args = parser.parse_args()
+    uvicorn.run(create_app(args.down_for, args.fail_rate, args.latency), host=args.host, port=args.port)
@@ -1,18 +1,20 @@
 # main.py
 import asyncio
 from typing import Dict, List, Optional
-from fastapi import FastAPI, HTTPException, Depends, BackgroundTasks, status
+from contextlib import aclosing
+from fastapi import FastAPI, HTTPException, Depends, BackgroundTasks, WebSocket, WebSocketDisconnect, status
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.encoders import jsonable_encoder
-from fastapi.responses import StreamingResponse
+from fastapi.responses import PlainTextResponse, Response, StreamingResponse
 from pydantic import BaseModel, AnyUrl, validator
+from starlette.websockets import WebSocketState
 import uuid
 from contextlib import asynccontextmanager
 import time
 from loguru import logger
 import base64
 from src.services.stream_service import StreamService
-from src.models.schema import AIResult
+from src.services.metrics import get_metrics
+from src.services.result_store import dumps
 from src.extractors.service import InfoExtractor
 from src.extractors.model import VehicleInfo, CitizenInfo, ImageBase64Request
 
@@ -20,13 +22,15 @@ from src.extractors.model import VehicleInfo, CitizenInfo, ImageBase64Request
 extractor = InfoExtractor()
 class CameraInput(BaseModel):
     camera_id: str
+    since: Optional[int] = None  # only violations published after this version
+    include_frames: bool = False  # add the preview frame and the evidence crops
     
 # Global service instances
 stream_service = None
-ai_service = None
 
 class CameraURL(BaseModel):
     url: str
+    config: Optional[dict] = None  # AI config of this camera, e.g. roi_polygon
     
     @validator('url')
     def validate_url(cls, v):
@@ -69,20 +73,30 @@ async def health_check():
     """API health check endpoint"""
     return {"status": "healthy", "timestamp": time.time()}
 
-@app.get("/result", response_model=AIResult)
-async def get_result():
-    """Get the latest AI processing results"""
-    result = stream_service.get_latest_result()
-    if not result:
-        return {"time": time.time(), "device_list": []}
-    
-    # Create a copy without frame data to reduce response size
-    serializable_result = result.copy()
-    if serializable_result.get("device_list"):
-        for device in serializable_result["device_list"]:
-            device.post_frame = base64.b64encode(device.post_frame).decode("utf-8")
-    
-    return jsonable_encoder(serializable_result)
+@app.get("/stats")
+async def get_stats():
+    """Get batching and stream processing statistics"""
+    return stream_service.get_stats()
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def get_prometheus_metrics():
+    """Pipeline metrics in the Prometheus text exposition format"""
+    return PlainTextResponse(get_metrics().render(), media_type="text/plain; version=0.0.4")
+
+def _result_response(since: Optional[int], include_frames: bool, stream_id: Optional[str] = None) -> Response:
+    results = stream_service.results
+    if include_frames:
+        stream_service.request_preview(stream_id)
+        content = dumps(results.delta(since, include_frames=True, stream_id=stream_id))
+    else:
+        content = results.delta_json(since, stream_id=stream_id)
+    return Response(content=content, media_type="application/json")
+
+@app.get("/result")
+async def get_result(since: Optional[int] = None, include_frames: bool = False):
+    """Get the latest violations of every camera, or all violations published after version ``since``.
+    Frames and evidence crops are only included with include_frames=true."""
+    return _result_response(since, include_frames)
 
 @app.post("/result")
 async def get_result_by_camera_id(input: CameraInput):
@@ -92,20 +106,20 @@ async def get_result_by_camera_id(input: CameraInput):
         raise HTTPException(status_code=404, detail=f"Stream ID {camera_id} not found")
     
     # Lấy kết quả mới nhất cho camera_id
-    result = stream_service.get_latest_result_camera_id(camera_id)
-    
-    # Nếu không có kết quả, trả về mặc định
-    if not result:
-        return {"time": time.time(), "device_list": []}
-    
-    # Tạo bản sao kết quả để xử lý dữ liệu frame
-    serializable_result = result.copy()
-    if serializable_result.get("device_list"):
-        for device in serializable_result["device_list"]:
-            # Mã hóa frame thành base64 nếu có
-            if hasattr(device, "post_frame") and device.post_frame is not None:
-                device.post_frame = base64.b64encode(device.post_frame).decode("utf-8")
-    return jsonable_encoder(serializable_result)
+    return _result_response(input.since, input.include_frames, camera_id)
+
+@app.websocket("/ws/results")
+async def push_results(websocket: WebSocket, since: int = 0):
+    """Violations pushed as they are published, each message is a /result delta without frames"""
+    await websocket.accept()
+    try:
+        async with aclosing(stream_service.results.changes(since)) as changes:
+            async for message in changes:
+                await websocket.send_text(message.decode())
+    except WebSocketDisconnect:
+        pass
+    if websocket.client_state == WebSocketState.CONNECTED:
+        await websocket.close()
 
 @app.post("/cameras", status_code=status.HTTP_201_CREATED)
 async def add_camera(
@@ -115,7 +129,15 @@ async def add_camera(
 ):
     """Add a new camera stream to the system"""
     try:
+        existed = camera.url in stream_service.streams
         stream_id, rtsp_stream = await stream_service.add_stream(camera.url)
+        if camera.config:
+            try:
+                await stream_service.update_ai_config(camera.config, stream_id)
+            except ValueError:
+                if not existed:
+                    await stream_service.remove_stream(camera.url)
+                raise
         background_tasks.add_task(stream_service.initialize_stream, camera.url)
         
         return {
@@ -157,11 +179,35 @@ async def stream_video(stream_id: str):
         media_type="multipart/x-mixed-replace; boundary=frame"
     )
 
+@app.websocket("/ws/overlay/{stream_id}")
+async def stream_overlay(websocket: WebSocket, stream_id: str):
+    """Detection overlays of a camera as JSON messages, drawn by the client over /stream/{stream_id}.
+    Sent when PREVIEW_OVERLAY is "client", boxes are in pixels of a width x height frame."""
+    if not stream_service.is_valid_stream_id(stream_id):
+        await websocket.close(code=1008)
+        return
+    await websocket.accept()
+    try:
+        async with aclosing(stream_service.generate_overlays(stream_id)) as overlays:
+            async for message in overlays:
+                await websocket.send_text(message)
+    except WebSocketDisconnect:
+        pass
+    if websocket.client_state == WebSocketState.CONNECTED:
+        await websocket.close()
+
+@app.get("/ai/config")
+async def get_ai_config():
+    """Get the AI configuration of every camera"""
+    return stream_service.get_ai_config()
+
 @app.post("/ai/config")
-async def update_ai_config(config: dict):
-    """Update AI service configuration"""
+async def update_ai_config(config: dict, camera_id: Optional[str] = None):
+    """Update AI configuration of one camera, or of every camera when camera_id is omitted"""
+    if camera_id is not None and not stream_service.is_valid_camera_id(camera_id):
+        raise HTTPException(status_code=404, detail=f"Stream ID {camera_id} not found")
     try:
-        await ai_service.update_config(config)
+        await stream_service.update_ai_config(config, camera_id)
         return {"message": "AI configuration updated successfully"}
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
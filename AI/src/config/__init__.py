@@ -1,4 +1,5 @@
 # Application configuration initialization
+import os
 from .logging_message import Message
 
 class ModelConfig:
@@ -11,6 +12,14 @@ class ModelConfig:
     # REC_CHAR_DICT_PATH  = "pretrained"
     PALATE_WEIGHT_PATH = "./src/models/weights/license_plate_detector.pt"
     DETECT_CONF = 0.25
+    DETECT_BACKEND = os.getenv("DETECT_BACKEND", "torch")  # torch | onnx | openvino
+    DETECT_IMGSZ = int(os.getenv("DETECT_IMGSZ", "640"))  # input size of exported models
+    DETECT_BATCH = int(os.getenv("DETECT_BATCH", "0"))  # fixed batch of exported models, 0 = dynamic
+    DETECT_PRECISION = os.getenv("DETECT_PRECISION", "fp32")  # fp32 | int8 (see scripts/quantize_detector.py)
+    OCR_REC_BATCH_NUM = 32  # text lines per recognizer forward pass
+    PLATE_OCR_MODE = os.getenv("PLATE_OCR_MODE", "det_rec")  # det_rec | rec_only (see scripts/eval_plate_ocr.py)
+    PLATE_TWO_LINE_MAX_ASPECT = float(os.getenv("PLATE_TWO_LINE_MAX_ASPECT", "2.5"))  # width / height of split plates
+    OCR_REC_HEIGHT = 48  # input height of the PP-OCRv3 recognizer
     source_video_path = "MVI_0334.MOV"
     
 class AppConfig:
@@ -23,12 +32,11 @@ class AppConfig:
     PORT = 7860
 
 class API:
-    BACKEND = "https://hanaxuan-backend.hf.space"
+    BACKEND = os.getenv("BACKEND_URL", "https://hanaxuan-backend.hf.space")
     # BACKEND = "http://localhost:8386"
     CREATE_VIOLATION = f"{BACKEND}/api/violations/create/"
     
 # src/config/__init__.py
-import os
 from typing import Dict, Any
 
 class AppConfig_2:
@@ -45,13 +53,73 @@ class AppConfig_2:
     MAX_RETRY_ATTEMPTS = int(os.getenv("MAX_RETRY_ATTEMPTS", "3"))
     RETRY_COOLDOWN = float(os.getenv("RETRY_COOLDOWN", "5.0"))  # seconds
     
+    # Capture threads
+    MAX_FRAME_AGE = float(os.getenv("MAX_FRAME_AGE", "1.0"))  # seconds, older frames are skipped
+    CAPTURE_MAX_READ_FAILURES = int(os.getenv("CAPTURE_MAX_READ_FAILURES", "50"))
+    CAPTURE_RETRY_DELAY = float(os.getenv("CAPTURE_RETRY_DELAY", "0.05"))  # seconds
+    
     # Concurrency limits
     MAX_CONCURRENT_PROCESSING = int(os.getenv("MAX_CONCURRENT_PROCESSING", "10"))
     MAX_CONCURRENT_AI_TASKS = int(os.getenv("MAX_CONCURRENT_AI_TASKS", "4"))
+    MAX_MODEL_REPLICAS = int(os.getenv("MAX_MODEL_REPLICAS", "2"))  # per network, created on contention
+
+    # Where camera pipelines run: "thread" (API process) or "process" (worker processes, see src/services/worker_pool.py)
+    EXECUTION_MODE = os.getenv("EXECUTION_MODE", "thread")
+    WORKER_PROCESSES = int(os.getenv("WORKER_PROCESSES", "2"))  # each worker loads its own models
+    FRAME_RING_SLOTS = int(os.getenv("FRAME_RING_SLOTS", "3"))  # shared-memory frame slots per camera
+    WORKER_STATS_INTERVAL = float(os.getenv("WORKER_STATS_INTERVAL", "5.0"))  # seconds
+    WORKER_REQUEST_TIMEOUT = float(os.getenv("WORKER_REQUEST_TIMEOUT", "300.0"))  # seconds, covers model loading
+    
+    # Plate OCR memoization
+    PLATE_CONSENSUS_MIN_READINGS = int(os.getenv("PLATE_CONSENSUS_MIN_READINGS", "3"))
+    
+    # Best-shot gating of plate OCR and evidence (see src/modules/plate_quality.py)
+    PLATE_BEST_SHOT = os.getenv("PLATE_BEST_SHOT", "true").lower() == "true"
+    PLATE_MIN_AREA = int(os.getenv("PLATE_MIN_AREA", "300"))  # pixels, smaller plates are never read
+    PLATE_FULL_AREA = int(os.getenv("PLATE_FULL_AREA", "3000"))  # pixels, larger plates get the full size score
+    PLATE_FULL_SHARPNESS = float(os.getenv("PLATE_FULL_SHARPNESS", "400"))  # Laplacian variance of a sharp plate
+    PLATE_MIN_QUALITY = float(os.getenv("PLATE_MIN_QUALITY", "0.05"))
+    PLATE_BEST_SHOT_MARGIN = float(os.getenv("PLATE_BEST_SHOT_MARGIN", "0.1"))  # relative gain over the best shot
+    
+    # Track-level violation aggregation
+    VIOLATION_TOP_K = int(os.getenv("VIOLATION_TOP_K", "3"))  # evidence crops kept per track
+    VIOLATION_TIMEOUT = float(os.getenv("VIOLATION_TIMEOUT", "10.0"))  # seconds before a long track is finalized
+    
+    # Cross-camera dynamic batching
+    BATCH_MAX_SIZE = int(os.getenv("BATCH_MAX_SIZE", "8"))
+    BATCH_WINDOW = float(os.getenv("BATCH_WINDOW", "0.02"))  # seconds
+    BATCH_STATS_WINDOW = int(os.getenv("BATCH_STATS_WINDOW", "200"))  # batches kept for stats
+    
+    # Violation upload to the backend
+    UPLOAD_BATCH_SIZE = int(os.getenv("UPLOAD_BATCH_SIZE", "20"))  # violations per request
+    UPLOAD_FLUSH_INTERVAL = float(os.getenv("UPLOAD_FLUSH_INTERVAL", "1.0"))  # seconds before a partial batch is sent
+    UPLOAD_MAX_CONCURRENCY = int(os.getenv("UPLOAD_MAX_CONCURRENCY", "4"))  # requests in flight
+    UPLOAD_MAX_PENDING = int(os.getenv("UPLOAD_MAX_PENDING", "1000"))  # oldest violations are dropped beyond this
+    UPLOAD_MAX_RETRIES = int(os.getenv("UPLOAD_MAX_RETRIES", "3"))
+    UPLOAD_RETRY_BACKOFF = float(os.getenv("UPLOAD_RETRY_BACKOFF", "0.5"))  # seconds, doubled on each retry
+    UPLOAD_TIMEOUT = float(os.getenv("UPLOAD_TIMEOUT", "10.0"))  # seconds per request
+    UPLOAD_CIRCUIT_THRESHOLD = int(os.getenv("UPLOAD_CIRCUIT_THRESHOLD", "3"))  # failed batches before the backend is considered down
+    
+    # On-disk outbox for violations the backend could not take (empty path disables it)
+    OUTBOX_PATH = os.getenv("OUTBOX_PATH", "./data/violation_outbox.db")
+    OUTBOX_MAX_ROWS = int(os.getenv("OUTBOX_MAX_ROWS", "20000"))
+    OUTBOX_MAX_BYTES = int(os.getenv("OUTBOX_MAX_BYTES", str(512 * 1024 * 1024)))  # summed payload size
+    OUTBOX_DRAIN_INTERVAL = float(os.getenv("OUTBOX_DRAIN_INTERVAL", "5.0"))  # seconds between replays
+    OUTBOX_DRAIN_BATCH_SIZE = int(os.getenv("OUTBOX_DRAIN_BATCH_SIZE", "50"))  # violations per replay request
     
     # Frame compression
     JPEG_QUALITY = int(os.getenv("JPEG_QUALITY", "80"))
     
+    # Annotated previews for /stream and /result, only encoded for cameras someone is watching
+    PREVIEW_WIDTH = int(os.getenv("PREVIEW_WIDTH", "960"))  # pixels, 0 = analysis resolution
+    PREVIEW_JPEG_QUALITY = int(os.getenv("PREVIEW_JPEG_QUALITY", "70"))
+    PREVIEW_REQUEST_TTL = float(os.getenv("PREVIEW_REQUEST_TTL", "10.0"))  # seconds a /result call keeps previews on
+    # burned: boxes drawn into the preview | client: raw preview plus /ws/overlay/{stream_id} messages
+    PREVIEW_OVERLAY = os.getenv("PREVIEW_OVERLAY", "burned")
+    
+    # /result and /ws/results
+    RESULT_HISTORY = int(os.getenv("RESULT_HISTORY", "100"))  # violations kept per camera for ?since= queries
+    
     # API security
     API_KEY_HEADER = "X-API-Key"
     API_KEY = os.getenv("API_KEY", "123")  # Change in production!
@@ -61,5 +129,21 @@ class AppConfig_2:
         "confidence_threshold": float(os.getenv("AI_CONFIDENCE_THRESHOLD", "0.5")),
         "iou_threshold": float(os.getenv("AI_IOU_THRESHOLD", "0.45")),
         "max_detections": int(os.getenv("AI_MAX_DETECTIONS", "100")),
+        # Motion gate: skip detection on static frames (see src/modules/motion_gate.py)
+        "motion_gate": os.getenv("MOTION_GATE", "false").lower() == "true",
+        "motion_method": os.getenv("MOTION_METHOD", "diff"),  # diff | mog2
+        "motion_threshold": float(os.getenv("MOTION_THRESHOLD", "25")),  # gray level change of a moving pixel
+        "motion_min_area": float(os.getenv("MOTION_MIN_AREA", "0.002")),  # share of moving pixels
+        "motion_downscale_width": int(os.getenv("MOTION_DOWNSCALE_WIDTH", "160")),
+        "motion_hold_frames": int(os.getenv("MOTION_HOLD_FRAMES", "15")),  # frames still detected after motion
+        "motion_keyframe_interval": int(os.getenv("MOTION_KEYFRAME_INTERVAL", "100")),  # forced detection, 0 = off
+        # Keyframe detection: detect every N frames, tracker prediction in between (see src/modules/keyframe.py)
+        "keyframe_detection": os.getenv("KEYFRAME_DETECTION", "false").lower() == "true",
+        "keyframe_min_interval": int(os.getenv("KEYFRAME_MIN_INTERVAL", "1")),  # frames
+        "keyframe_max_interval": int(os.getenv("KEYFRAME_MAX_INTERVAL", "5")),  # frames
+        "keyframe_max_shift": float(os.getenv("KEYFRAME_MAX_SHIFT", "0.3")),  # box heights moved between keyframes
+        "keyframe_max_uncertainty": float(os.getenv("KEYFRAME_MAX_UNCERTAINTY", "0.35")),  # Kalman std / box height
+        # Region of interest: [[x, y], ...] in pixels or frame fractions, None = full frame (see src/modules/roi.py)
+        "roi_polygon": None,
         # Add other AI config parameters as needed
     }
\ No newline at end of file
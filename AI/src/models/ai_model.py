@@ -1,44 +1,157 @@
+import threading
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional
 import numpy as np
-from src.config import ModelConfig
-from deep_sort_realtime.deepsort_tracker import DeepSort
+from src.config import ModelConfig, AppConfig_2
+from deep_sort_realtime.embedder.embedder_pytorch import MobileNetv2_Embedder
 from loguru import logger
 import torch
-from ultralytics import YOLO
 from paddleocr import PaddleOCR
-# Load a model
-class Model:
+from src.modules.vehicle_detection import VehicleDetector, load_detector
+
+
+class ModelPool:
+    """Pool of replicas of one network.
+
+    The first replica is loaded once and shared by every camera. Extra replicas are
+    only created when all existing ones are busy in other threads, up to ``max_replicas``.
+    """
+
+    def __init__(self, name: str, factory: Callable[[], Any], max_replicas: int = AppConfig_2.MAX_MODEL_REPLICAS):
+        self.name = name
+        self.max_replicas = max(1, max_replicas)
+        self._factory = factory
+        self._replicas: List[Any] = []
+        self._idle: List[Any] = []
+        self._size = 0  # created or being created
+        self._cond = threading.Condition()
+
+    def _create(self) -> Any:
+        logger.info(f"Loading {self.name} replica {self._size}/{self.max_replicas}...")
+        replica = self._factory()
+        with self._cond:
+            self._replicas.append(replica)
+        return replica
+
+    def _checkout(self) -> Any:
+        with self._cond:
+            while True:
+                if self._idle:
+                    return self._idle.pop()
+                if self._size < self.max_replicas:
+                    self._size += 1
+                    break
+                self._cond.wait()
+        # Load outside the lock, other threads can still release replicas
+        try:
+            return self._create()
+        except Exception:
+            with self._cond:
+                self._size -= 1
+                self._cond.notify()
+            raise
+
+    def _release(self, replica: Any) -> None:
+        with self._cond:
+            self._idle.append(replica)
+            self._cond.notify()
+
+    @contextmanager
+    def acquire(self) -> Iterator[Any]:
+        """Borrow a replica for exclusive use in the current thread"""
+        replica = self._checkout()
+        try:
+            yield replica
+        finally:
+            self._release(replica)
+
+    def primary(self) -> Any:
+        """Return the first replica, loading it if needed. Only use it for read-only metadata"""
+        if not self._replicas:
+            with self.acquire():
+                pass
+        return self._replicas[0]
+
+    @property
+    def size(self) -> int:
+        return len(self._replicas)
+
+
+class ModelRegistry:
+    """Process-wide registry that loads each network once and shares it across camera pipelines"""
+
+    _instance: Optional["ModelRegistry"] = None
+    _instance_lock = threading.Lock()
+
     def __init__(self, config: ModelConfig = ModelConfig()):
         # Check if CUDA is available
         if torch.cuda.is_available():
             self.device = torch.device("cuda")
-            use_gpu = True
+            self.use_gpu = True
         else:
             self.device = torch.device("cpu")
-            use_gpu = False
-            
-        print(f"Using device: {self.device}")
+            self.use_gpu = False
+        logger.info(f"Using device: {self.device}")
+
         self.config = config
-        self.detect_model = YOLO(config.DETECT_WEIGHT_PATH, verbose=False)
+        self.detector = ModelPool("detector", self._load_detector)
+        self.ocr = ModelPool("ocr", self._load_ocr)
+        self.embedder = ModelPool("embedder", self._load_embedder)
+
+    @classmethod
+    def get_instance(cls) -> "ModelRegistry":
+        """Return the registry of this process, creating and warming it up on first use"""
+        with cls._instance_lock:
+            if cls._instance is None:
+                registry = cls()
+                registry.preload()
+                cls._instance = registry
+        return cls._instance
+
+    def preload(self) -> None:
+        """Load and warm up one replica of every network"""
+        logger.info("model initiation....")
+        for pool in (self.detector, self.ocr, self.embedder):
+            pool.primary()
+        logger.info("model warmup successful")
+
+    @property
+    def class_names(self) -> Dict[int, str]:
+        return self.detector.primary().names
+
+    def _load_detector(self) -> VehicleDetector:
+        config = self.config
+        return load_detector(
+            config.DETECT_WEIGHT_PATH,
+            backend=config.DETECT_BACKEND,
+            imgsz=config.DETECT_IMGSZ,
+            batch=config.DETECT_BATCH,
+            use_gpu=self.use_gpu,
+            precision=config.DETECT_PRECISION,
+        )
+
+    def _load_ocr(self) -> PaddleOCR:
+        config = self.config
         if config.PADDLE_DET_PATH == "pretrained" and config.PADDLE_REC_PATH == "pretrained":
-            self.ocr_model = PaddleOCR(lang='en', show_log=False, use_angle_cls=True, use_gpu=use_gpu)
+            ocr_model = PaddleOCR(lang='en', show_log=False, use_angle_cls=True, use_gpu=self.use_gpu, rec_batch_num=config.OCR_REC_BATCH_NUM)
         else:
-            self.ocr_model = PaddleOCR(det_model_dir=config.PADDLE_DET_PATH, rec_model_dir=config.PADDLE_REC_PATH, rec_char_dict_path=config.REC_CHAR_DICT_PATH, show_log=False, use_angle_cls=True, use_gpu=True)
-        self.object_tracker = DeepSort(
-                            max_age=1,  
-                            n_init=2,  
-                            nms_max_overlap=1.0,  # Avoid redundant overlap checks
-                            max_cosine_distance=0.2,  # Faster similarity checks
-                            nn_budget=50,  # Limit embedding storage
-                            embedder="mobilenet",
-                            embedder_model_name="mobilenetv2_x1_0",  # Smaller & faster version
-                            embedder_gpu=True,  
-                            half=True,  # Use FP16 for speed
-                            )
-        self.warmup()
-        
-    def warmup(self):
-        logger.info("model initiation....")
+            ocr_model = PaddleOCR(det_model_dir=config.PADDLE_DET_PATH, rec_model_dir=config.PADDLE_REC_PATH, rec_char_dict_path=config.REC_CHAR_DICT_PATH, show_log=False, use_angle_cls=True, use_gpu=True, rec_batch_num=config.OCR_REC_BATCH_NUM)
         img = np.zeros((640, 480, 3), dtype=np.uint8)
-        self.detect_model(img, verbose=False, half=True)
-        self.ocr_model.ocr(img, cls=True)
-        logger.info("model warmup successful")
\ No newline at end of file
+        ocr_model.ocr(img, cls=True)
+        return ocr_model
+
+    def _load_embedder(self) -> MobileNetv2_Embedder:
+        # Appearance embedder of DeepSort, trackers themselves are created per camera
+        embedder = MobileNetv2_Embedder(
+            half=True,  # Use FP16 for speed
+            max_batch_size=16,
+            bgr=True,
+            gpu=self.use_gpu,
+        )
+        embedder.predict([np.zeros((128, 64, 3), dtype=np.uint8)])
+        return embedder
+
+
+def get_model_registry() -> ModelRegistry:
+    """Shortcut for ModelRegistry.get_instance()"""
+    return ModelRegistry.get_instance()
@@ -1,44 +1,62 @@
-from pydantic import BaseModel
-from typing import List, Optional, Any
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
 from enum import Enum
 
+# Records built for every frame and every violation of the pipeline. They are plain
+# slotted dataclasses: no validation or coercion, the HTTP layer serializes them
+# itself (see src/services/result_store.py) and pydantic stays on request bodies.
+
 class ViolationType(str, Enum):
     NO_HELMET = "no_helmet"
-    
-class DetectedResult(BaseModel):
+
+
+class _Record:
+    """Dict-style access kept for the call sites written against the former pydantic models"""
+    __slots__ = ()
+
+    def __getitem__(self, item):
+        return getattr(self, item)
+
+    def __setitem__(self, key, value):
+        setattr(self, key, value)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+@dataclass(slots=True)
+class DetectedResult(_Record):
     vehicle_id: str
     image: str  #  base64
     violation: Optional[ViolationType]
-    plate_numbers: str | None
-    time: str | None
+    plate_numbers: Optional[str]
+    time: Optional[str]
     plate_conf: float
-    camera_id: str | None
-    status: str | None
-    
-    def __getitem__(self, item):
-        return getattr(self, item)
-    
-    def __setitem__(self, key, value):
-        object.__setattr__(self, key, value)
+    camera_id: Optional[str]
+    status: Optional[str]
+
 
-class DeviceDetection(BaseModel):
+@dataclass(slots=True)
+class DeviceDetection(_Record):
     camera_id: str
-    post_frame: bytes  # image base64
-    detected_result: List[DetectedResult] = []
+    post_frame: Optional[bytes] = None  # JPEG preview, None when nobody watches the camera
+    overlay: Optional[Dict[str, Any]] = None  # detection geometry when PREVIEW_OVERLAY is "client"
+    detected_result: List[DetectedResult] = field(default_factory=list)
 
-    def __getitem__(self, item):
-        return getattr(self, item)
-    
-    def __setitem__(self, key, value):
-        object.__setattr__(self, key, value)
-        
-class FrameData(BaseModel):
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "camera_id": self.camera_id,
+            "post_frame": self.post_frame,
+            "overlay": self.overlay,
+            "detected_result": [result.to_dict() for result in self.detected_result],
+        }
+
+
+@dataclass(slots=True)
+class FrameData(_Record):
+    """A video frame with its metadata"""
     url: str
-    frame: Any
+    frame: Any  # np.ndarray
     frame_count: int
-    
-    def __getitem__(self, item):
-        return getattr(self, item)
-    
-    def __setitem__(self, key, value):
-        object.__setattr__(self, key, value)
\ No newline at end of file
+    timestamp: float = field(default_factory=time.time)  # capture time of the frame
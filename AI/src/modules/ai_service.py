@@ -1,39 +1,118 @@
 import asyncio
-from typing import List, Dict, Any, Optional
+from dataclasses import dataclass, field
+from typing import List, Dict, Any, Optional, Tuple
 import numpy as np
 import cv2
 from loguru import logger
-from src.models.schema import DeviceDetection, FrameData
+from src.models.base_model import DeviceDetection, FrameData
 from src.config import AppConfig, AppConfig_2
 
-from src.modules.annotation import visualize_detections, visualize_yolo_results
+from src.modules.annotation import overlay_message, visualize_detections, visualize_yolo_results
 from src.modules.vehicle_detection import VehicleDetector
 from src.modules.plate_recognition import PlateRecognizer
 from src.modules.object_tracking import ObjectTracker
+from src.modules.plate_cache import PlateReadingCache
+from src.modules.plate_quality import BestShotSelector, plate_quality
+from src.modules.violation_aggregator import ViolationAggregator
+from src.modules.motion_gate import MotionGate
+from src.modules.keyframe import KeyframeScheduler
+from src.modules.roi import RegionOfInterest
+from src.modules.association import AssociationResult, associate_vehicles
 from src.config import ModelConfig
-from src.models.ai_model import Model
-from src.utils import mapping_tracked_vehicles, process_to_output_json, fully_optimized_mapping_tracked_vehicles
+from src.models.ai_model import get_model_registry
+from src.services.metrics import camera_label, get_metrics
+from src.utils import process_to_output_json
 import time
-from ultralytics import YOLO
-import torch
-device = torch.device("cuda:0" if torch.cuda.is_available() else "cpu")
+
+
+@dataclass
+class FrameContext:
+    """Intermediate state of one frame between the tracking and output stages"""
+    frame: np.ndarray
+    association: AssociationResult
+    has_vehicles: bool
+    plate_requests: List[Tuple[int, int, np.ndarray]] = field(default_factory=list)  # (track ID, plate object index, crop)
+    timings: Dict[str, float] = field(default_factory=dict)
+    plate_cache: Optional[PlateReadingCache] = None
+    best_shot: Optional[BestShotSelector] = None
+    alive_track_ids: Optional[set] = None
+    skipped: bool = False  # static frame rejected by the motion gate
+    predicted: bool = False  # frame between keyframes, boxes extrapolated by the tracker
+
+
+def collect_plate_crops(frame: np.ndarray, association: AssociationResult, plate_cache: Optional[PlateReadingCache] = None,
+                        best_shot: Optional[BestShotSelector] = None) -> List[Tuple[int, int, np.ndarray]]:
+    """Collect the license plate crops (class 3) of every vehicle with a no-helmet rider (class 2).
+    
+    Plates of tracks already settled in ``plate_cache`` get the cached reading and are not collected.
+    With ``best_shot``, plates are scored first and only the shots improving on the best one of
+    their track are collected, the others get the current reading of the track.
+    """
+    plate_requests = []
+    for v, o in zip(*association.violation_plates()):
+        track_id = int(association.vehicle_ids[v])
+        if best_shot is not None:
+            association.plate_qualities[o] = plate_quality(frame, association.object_boxes[o])
+        cached = plate_cache.lookup(track_id) if plate_cache is not None else None
+        if cached is not None:
+            association.plate_texts[o], association.plate_confs[o] = cached
+            continue
+        if best_shot is not None and not best_shot.should_read(track_id, association.plate_qualities[o]):
+            current = plate_cache.current(track_id) if plate_cache is not None else None
+            if current is not None:
+                association.plate_texts[o], association.plate_confs[o] = current
+            continue
+        if plate_cache is not None:
+            plate_cache.record_miss()
+        # Original resolution, recognize_batch resizes for the OCR mode in use
+        plate_frame = PlateRecognizer.crop_plate(frame, association.object_boxes[o].tolist(), size=None)
+        if plate_frame is not None:
+            plate_requests.append((track_id, int(o), plate_frame))
+    return plate_requests
+
+
+def recognize_plates(plate_recognizer: PlateRecognizer, contexts: List[FrameContext]) -> None:
+    """Recognize the plate crops of all given frames with one batched OCR call and store the readings"""
+    requests = [(ctx, track_id, index, crop) for ctx in contexts for track_id, index, crop in ctx.plate_requests]
+    if not requests:
+        return
+    
+    plate_start = time.time()
+    readings = plate_recognizer.recognize_batch([crop for _, _, _, crop in requests])
+    plate_time = (time.time() - plate_start) / len(requests)
+    metrics = get_metrics()
+    metrics.ocr_calls.inc()
+    metrics.ocr_plates.inc(len(requests))
+    
+    for (ctx, track_id, index, _), (plate_number, plate_conf) in zip(requests, readings):
+        ctx.timings["plate"] = ctx.timings.get("plate", 0.0) + plate_time
+        if plate_number is not None:
+            if ctx.best_shot is not None:
+                ctx.best_shot.commit(track_id, float(ctx.association.plate_qualities[index]))
+            if ctx.plate_cache is not None:
+                # Report the consensus of all readings of this track
+                plate_number, plate_conf = ctx.plate_cache.update(track_id, plate_number, plate_conf)
+            ctx.association.plate_texts[index] = plate_number
+            ctx.association.plate_confs[index] = plate_conf
 
 class AI_Service:
-    def __init__(self, config: ModelConfig = ModelConfig()):
+    def __init__(self, config: ModelConfig = ModelConfig(), camera_id: str = ""):
         """Initialize AI Controller with configuration and models"""
         self.config = config
         
-        model = Model()
-        self.vehicle_detector = YOLO(config.DETECT_WEIGHT_PATH, verbose=False)
-        self.object_tracker = ObjectTracker(model.object_tracker)
-        self.plate_recognizer = PlateRecognizer(ocr_model=model.ocr_model)
-
-        self.y_min = 750.0
+        # Networks are shared process-wide, only tracker state is per instance
+        registry = get_model_registry()
+        self.vehicle_detector = registry.detector
+        self.object_tracker = ObjectTracker(registry.embedder)
+        self.plate_recognizer = PlateRecognizer(ocr_model=registry.ocr)
+        self.violation_aggregator = ViolationAggregator(camera_id=camera_id, max_age=self.object_tracker.max_time_lost)
+        self.roi = RegionOfInterest(AppConfig_2.AI_DEFAULT_CONFIG["roi_polygon"])
 
         self.CLASS_DICT = {}
         self.CLASS_ID = [0, 1, 2, 3]
+        class_names = registry.class_names
         for id in self.CLASS_ID:
-            self.CLASS_DICT[id] = self.vehicle_detector.model.names[id]
+            self.CLASS_DICT[id] = class_names[id]
         self.data_tracker =  {}
         
     def process_frame(self, frame: np.ndarray, frame_count: int, verbose: bool = False, camera_id: str = "") -> DeviceDetection:
@@ -53,63 +132,46 @@ class AI_Service:
         
         # Vehicle detection
         detect_start = time.time()
-        detection_results = self.vehicle_detector(frame, verbose=verbose)
+        crop, region = self.roi.crop(frame)
+        with self.vehicle_detector.acquire() as detector:
+            detection_results = detector(crop, verbose=verbose)
+        self.roi.restore(detection_results[0], frame, region)
         detect_time = time.time() - detect_start
         
         # Object tracking
         track_start = time.time()
         vehicle_track_dets, vehicle_track_ids = self.object_tracker.bytetrack(detection_results, frame)
+        alive_track_ids = self.object_tracker.alive_track_ids()
         track_time = time.time() - track_start
         
         # Group objects with vehicles
         mapping_start = time.time()
-        grouped_json = fully_optimized_mapping_tracked_vehicles(
-            vehicle_track_dets, 
-            vehicle_track_ids, 
-            detection_results[0].boxes.data, 
-            device  # Assuming 'device' should be a class attribute
-        )
+        association = associate_vehicles(vehicle_track_dets, vehicle_track_ids, detection_results[0].boxes.data)
         mapping_time = time.time() - mapping_start
         
-        # License plate recognition
+        # License plate recognition, all plates of the frame in one batch
         plate_start = time.time()
         if len(vehicle_track_dets) > 0:
-            for vehicle in grouped_json:
-                # Check if this is a vehicle with license plate (class 2 indicates vehicle)
-                if any(obj["class"] == 2 for obj in vehicle["objects"]):
-                    for obj in vehicle["objects"]:
-                        # Process license plates (class 3)
-                        if obj["class"] == 3:
-                            x_min, y_min, x_max, y_max = map(int, obj["bbox"])
-                            # Ensure coordinates are within frame boundaries
-                            x_min = max(0, x_min)
-                            y_min = max(0, y_min)
-                            x_max = min(frame.shape[1], x_max)
-                            y_max = min(frame.shape[0], y_max)
-                            
-                            # Skip if plate region is too small
-                            if x_max <= x_min or y_max <= y_min:
-                                continue
-                                
-                            # Crop license plate region
-                            plate_frame = frame[y_min:y_max, x_min:x_max]
-                            plate_frame = cv2.resize(plate_frame, (320, 320), interpolation=cv2.INTER_LANCZOS4)
-                            
-                            # Recognize plate
-                            plate_number, plate_conf = self.plate_recognizer.recognize(plate_frame)
-                            if plate_number is not None:
-                                obj["plate_number"] = plate_number
-                                obj["plate_conf"] = plate_conf
+            recognize_plates(self.plate_recognizer, [FrameContext(
+                frame=frame,
+                association=association,
+                has_vehicles=True,
+                plate_requests=collect_plate_crops(frame, association),
+            )])
         plate_time = time.time() - plate_start
         
         # Visualization
         vis_start = time.time()
-        post_frame = visualize_detections(frame, grouped_json)
+        post_frame = visualize_detections(frame, association)
         vis_time = time.time() - vis_start
         
         # Process to output JSON
         json_start = time.time()
-        output_json = process_to_output_json(grouped_json, frame, post_frame, camera_id=camera_id)
+        # Violations are reported once per track, when the track ends
+        output_json = process_to_output_json(
+            association, frame, post_frame, camera_id=camera_id or self.violation_aggregator.camera_id,
+            violation_aggregator=self.violation_aggregator, alive_track_ids=alive_track_ids,
+        )
         json_time = time.time() - json_start
         
         # Calculate total processing time
@@ -178,7 +240,10 @@ class AI_Service:
 
         # Vehicle detection
         detect_start = time.time()
-        detection_results = self.vehicle_detector(frame)
+        crop, region = self.roi.crop(frame)
+        with self.vehicle_detector.acquire() as detector:
+            detection_results = detector(crop)
+        self.roi.restore(detection_results[0], frame, region)
         detect_time = time.time() - detect_start
 
         # Object tracking
@@ -188,33 +253,26 @@ class AI_Service:
         track_time = time.time() - track_start
         mapping_start = time.time()
         # Group objects with vehicles   
-        # grouped_json = mapping_tracked_vehicles(vehicle_track_dets, vehicle_track_ids, detection_results[0].boxes.data)
-        grouped_json = fully_optimized_mapping_tracked_vehicles(vehicle_track_dets, vehicle_track_ids, detection_results[0].boxes.data, device)
+        association = associate_vehicles(vehicle_track_dets, vehicle_track_ids, detection_results[0].boxes.data)
         mapping_time = time.time() - mapping_start
         # grouped_json = self.mapping_vehicles_no_tracked(detection_results[0].boxes.data)
         
-        # Single OCR
+        # Batch OCR
         plate_time = 0
         if len(vehicle_track_dets) > 0: # Check if result has object
             plate_start = time.time()
-            for vehicle in grouped_json:
-                if any(obj["class"] == 2 for obj in vehicle["objects"]):
-                    for obj in vehicle["objects"]:
-                        if obj["class"] == 3:
-                            x_min, y_min, x_max, y_max = map(int, obj["bbox"])
-                            plate_frame = frame[y_min:y_max, x_min:x_max]  # Crop license plate region
-                            plate_frame = cv2.resize(plate_frame, (320, 320), interpolation=cv2.INTER_LANCZOS4)
-                            plate_number, plate_conf = self.plate_recognizer.recognize(plate_frame)
-                            if plate_number is not None:
-                                obj["plate_number"] = plate_number
-                                obj["plate_conf"] = plate_conf
+            recognize_plates(self.plate_recognizer, [FrameContext(
+                frame=frame,
+                association=association,
+                has_vehicles=True,
+                plate_requests=collect_plate_crops(frame, association),
+            )])
             plate_time = time.time() - plate_start
 
-        # Batch OCR
                 
         # Visualization
         vis_start = time.time()
-        post_frame = visualize_detections(frame, grouped_json)
+        post_frame = visualize_detections(frame, association)
         vis_time = time.time() - vis_start
 
         # Total time
@@ -238,7 +296,8 @@ class AI_Service:
             return b""  # Return empty bytes on failure
         
         # Perform vehicle detection
-        detection_results = self.vehicle_detector.detect(frame_array)
+        with self.vehicle_detector.acquire() as detector:
+            detection_results = detector.detect(frame_array)
         
         # Visualize detection results on the decoded frame
         frame_with_boxes = visualize_yolo_results(frame_array, detection_results)
@@ -261,36 +320,121 @@ class AIService:
         self._processing_lock = asyncio.Lock()
         self._worker_semaphore = asyncio.Semaphore(AppConfig_2.MAX_CONCURRENT_AI_TASKS)
         self.url = url
-        # Initialize models
+        # Shared models are loaded once per process, this service only holds camera state
         logger.info("Initializing AI models...")
-        model = Model()
-        # self.vehicle_detector = VehicleDetector(model.detect_model)
-        self.vehicle_detector = YOLO(config.DETECT_WEIGHT_PATH, verbose=False)
-        self.object_tracker = ObjectTracker(model.object_tracker)
-        self.plate_recognizer = PlateRecognizer(ocr_model=model.ocr_model)
-
-        self.y_min = 750.0
+        registry = get_model_registry()
+        self.vehicle_detector = registry.detector
+        self.object_tracker = ObjectTracker(registry.embedder)
+        self.plate_recognizer = PlateRecognizer(ocr_model=registry.ocr)
+        self.plate_cache = PlateReadingCache(max_age=self.object_tracker.max_time_lost)
+        self.best_shot = BestShotSelector(max_age=self.object_tracker.max_time_lost) if AppConfig_2.PLATE_BEST_SHOT else None
+        self.violation_aggregator = ViolationAggregator(
+            camera_id=url, max_age=self.object_tracker.max_time_lost,
+            margin=AppConfig_2.PLATE_BEST_SHOT_MARGIN if self.best_shot is not None else 0.0,
+        )
+        self.camera_config: Dict[str, Any] = dict(AppConfig_2.AI_DEFAULT_CONFIG)
+        self.motion_gate = MotionGate(self.camera_config)
+        self.keyframes = KeyframeScheduler(self.camera_config)
+        self.roi = RegionOfInterest(self.camera_config["roi_polygon"])
+        self.last_timings: Dict[str, float] = {}  # stage timings of the last finished frame
+        self.camera_label = camera_label(url)  # metric label, the stream service uses the stream ID
+        self.processing_fps = 0.0
+        self._last_finished: Optional[float] = None
+        self.preview_enabled = True  # draw and encode post_frame, turned off for cameras nobody watches
+        self.client_overlay = AppConfig_2.PREVIEW_OVERLAY == "client"  # raw preview plus overlay geometry
 
         # Setup class mapping
         self.CLASS_DICT = {}
         self.CLASS_ID = [0, 1, 2, 3]
+        class_names = registry.class_names
         for id in self.CLASS_ID:
-            self.CLASS_DICT[id] = self.vehicle_detector.model.names[id]
+            self.CLASS_DICT[id] = class_names[id]
         self.data_tracker = {}
         
         logger.info("AI Service initialized successfully")
         
     async def update_config(self, new_config: Dict[str, Any]) -> None:
-        """Update AI configuration parameters"""
+        """Update AI configuration parameters of this camera"""
+        unknown = set(new_config) - set(self.camera_config)
+        if unknown:
+            raise ValueError(f"Unknown AI config keys: {sorted(unknown)}")
         async with self._processing_lock:
-            # Update config - this would need to be adapted to your specific configuration needs
-            # For example:
+            # Validate everything before changing anything
+            config = {**self.camera_config, **new_config}
+            try:
+                RegionOfInterest.validate(config["roi_polygon"])
+                self.motion_gate.validate(config)
+                self.keyframes.validate(config)
+            except TypeError as e:
+                # e.g. null for a number, reported as a bad request like other invalid values
+                raise ValueError(f"Invalid AI config value: {str(e)}") from e
+            
+            self.motion_gate.update_config(config)
+            self.keyframes.update_config(config)
+            self.roi.set_polygon(config["roi_polygon"])
+            self.camera_config = config
             if "confidence_threshold" in new_config:
                 self.config.confidence_threshold = new_config["confidence_threshold"]
             if "iou_threshold" in new_config:
                 self.config.iou_threshold = new_config["iou_threshold"]
             
-            logger.info(f"AI configuration updated: {new_config}")
+            logger.info(f"AI configuration updated for {self.url}: {new_config}")
+    
+    def skip_static_frame(self, frame: np.ndarray) -> Optional[DeviceDetection]:
+        """Skip detection when the motion gate finds the frame static, or between keyframes.
+        
+        The tracker is still advanced by one frame so ended tracks are evicted and their
+        violations finalized. Only the region of interest is watched. Returns the output
+        of the skipped frame, or None when the frame has to go through detection.
+        """
+        if self.motion_gate.should_process(self.roi.crop(frame)[0]):
+            if not self.keyframes.enabled or self.keyframes.should_detect(self.object_tracker.predicted_boxes()):
+                return None
+            return self._predict_frame(frame)
+        self.keyframes.reset()
+        try:
+            self.object_tracker.tick()
+            alive_track_ids = self.object_tracker.alive_track_ids()
+            self.plate_cache.evict(alive_track_ids)
+            if self.best_shot is not None:
+                self.best_shot.evict(alive_track_ids)
+            ctx = FrameContext(
+                frame=frame,
+                association=AssociationResult.empty(),
+                has_vehicles=False,
+                timings={"detect": 0.0, "track": 0.0, "mapping": 0.0, "plate": 0.0},
+                plate_cache=self.plate_cache,
+                alive_track_ids=alive_track_ids,
+                skipped=True,
+            )
+            return self.finish_frame(ctx)
+        except Exception as e:
+            logger.error(f"Error processing skipped frame: {str(e)}", exc_info=True)
+            return None
+    
+    def _predict_frame(self, frame: np.ndarray) -> Optional[DeviceDetection]:
+        """Output of a frame between keyframes: tracker prediction only, no detection or OCR"""
+        try:
+            track_start = time.time()
+            self.object_tracker.tick()
+            association = self.keyframes.predict(self.object_tracker.predicted_boxes())
+            alive_track_ids = self.object_tracker.alive_track_ids()
+            self.plate_cache.evict(alive_track_ids)
+            if self.best_shot is not None:
+                self.best_shot.evict(alive_track_ids)
+            ctx = FrameContext(
+                frame=frame,
+                association=association,
+                has_vehicles=association.has_vehicles,
+                timings={"detect": 0.0, "track": time.time() - track_start, "mapping": 0.0, "plate": 0.0},
+                plate_cache=self.plate_cache,
+                alive_track_ids=alive_track_ids,
+                predicted=True,
+            )
+            return self.finish_frame(ctx)
+        except Exception as e:
+            logger.error(f"Error processing predicted frame: {str(e)}", exc_info=True)
+            return None
             
     async def aprocess_frame(self, frame: np.ndarray, frame_count: int):
         """Process a single frame and return detection results - async wrapper around synchronous processing"""
@@ -308,9 +452,43 @@ class AIService:
         try:
             # Vehicle detection
             detect_start = time.time()
-            detection_results = self.vehicle_detector.predict(frame, verbose=False)
+            crop, region = self.roi.crop(frame)
+            with self.vehicle_detector.acquire() as detector:
+                detection_results = detector.predict(crop, verbose=False)
+            self.roi.restore(detection_results[0], frame, region)
             detect_time = time.time() - detect_start
-            
+        except Exception as e:
+            logger.error(f"Error processing frame: {str(e)}", exc_info=True)
+            # Return an empty result on error
+            return None
+        
+        return self.process_detections_sync(frame, detection_results, detect_time=detect_time, verbose=verbose)
+    
+    def process_detections_sync(self, frame: np.ndarray, detection_results, detect_time: float = 0.0, verbose: bool = False) -> DeviceDetection:
+        """Run tracking, mapping, plate recognition and output building on detections of one frame.
+        
+        Args:
+            frame: Frame the detections were computed on
+            detection_results: Detector output for this frame only (list with one result)
+            detect_time: Detection time attributed to this frame
+            verbose: Whether to log processing times
+        """
+        ctx = self.prepare_frame(frame, detection_results, detect_time=detect_time)
+        if ctx is None:
+            return None
+        try:
+            recognize_plates(self.plate_recognizer, [ctx])
+        except Exception as e:
+            logger.error(f"Error recognizing plates: {str(e)}", exc_info=True)
+            return None
+        return self.finish_frame(ctx, verbose=verbose)
+    
+    def prepare_frame(self, frame: np.ndarray, detection_results, detect_time: float = 0.0) -> Optional[FrameContext]:
+        """Track and group the detections of one frame and collect its plate crops.
+        
+        Plate recognition is left to the caller so plates of several frames can share one OCR batch.
+        """
+        try:
             # Object tracking
             track_start = time.time()
             vehicle_track_dets, vehicle_track_ids = self.object_tracker.bytetrack(detection_results, frame)
@@ -318,50 +496,79 @@ class AIService:
             
             mapping_start = time.time()
             # Group objects with vehicles   
-            grouped_json = mapping_tracked_vehicles(vehicle_track_dets, vehicle_track_ids, detection_results[0].boxes.data)
+            association = associate_vehicles(vehicle_track_dets, vehicle_track_ids, detection_results[0].boxes.data)
             mapping_time = time.time() - mapping_start
+            if self.keyframes.enabled:
+                self.keyframes.record_keyframe(association)
             
-            # License plate recognition
-            palate_start = time.time()
-            if len(vehicle_track_dets) > 0:
-                for vehicle in grouped_json:
-                    if any(obj["class"] == 2 for obj in vehicle["objects"]):
-                        for obj in vehicle["objects"]:
-                            if obj["class"] == 3:
-                                x_min, y_min, x_max, y_max = map(int, obj["bbox"])
-                                plate_frame = frame[y_min:y_max, x_min:x_max]  # Crop license plate region
-                                plate_frame = cv2.resize(plate_frame, (320, 320), interpolation=cv2.INTER_LANCZOS4)
-                                plate_number, plate_conf = self.plate_recognizer.recognize(plate_frame)
-                                if plate_number is not None:
-                                    obj["plate_number"] = plate_number
-                                    obj["plate_conf"] = plate_conf
-                
-                palate_time = time.time() - palate_start
-                
+            # Forget plate readings of tracks dropped by the tracker
+            alive_track_ids = self.object_tracker.alive_track_ids()
+            self.plate_cache.evict(alive_track_ids)
+            if self.best_shot is not None:
+                self.best_shot.evict(alive_track_ids)
+            
+            ctx = FrameContext(
+                frame=frame,
+                association=association,
+                has_vehicles=association.has_vehicles,
+                timings={"detect": detect_time, "track": track_time, "mapping": mapping_time, "plate": 0.0},
+                plate_cache=self.plate_cache,
+                best_shot=self.best_shot,
+                alive_track_ids=alive_track_ids,
+            )
+            if ctx.has_vehicles:
+                ctx.plate_requests = collect_plate_crops(frame, association, self.plate_cache, self.best_shot)
+            return ctx
+        except Exception as e:
+            logger.error(f"Error processing frame: {str(e)}", exc_info=True)
+            # Return an empty result on error
+            return None
+    
+    def finish_frame(self, ctx: FrameContext, verbose: bool = False) -> Optional[DeviceDetection]:
+        """Draw and build the output of a frame whose plates have been recognized"""
+        try:
+            frame, association, timings = ctx.frame, ctx.association, ctx.timings
+            self.last_timings = timings
+            if ctx.has_vehicles:
                 # Visualization
                 vis_start = time.time()
-                post_frame = visualize_detections(frame, grouped_json)
-                visualize_detections_time = time.time() - vis_start
+                post_frame, overlay = self._preview(frame, association)
+                timings["visualize"] = time.time() - vis_start
                 
                 # Process to output JSON
-                process_to_output_json_time = time.time()
-                output_json = process_to_output_json(grouped_json, frame, post_frame, camera_id=self.url)
-                process_to_output_json_time = time.time() - process_to_output_json_time
+                json_start = time.time()
+                output_json = process_to_output_json(
+                    association, frame, post_frame, camera_id=self.url,
+                    violation_aggregator=self.violation_aggregator, alive_track_ids=ctx.alive_track_ids,
+                    observe=not ctx.predicted,
+                )
+                output_json.overlay = overlay
+                timings["json"] = time.time() - json_start
                 
-                total_time = time.time() - detect_start
+                total_time = sum(timings.values())
                 
                 if verbose:
-                    logger.debug(f"Detection: {detect_time:.3f}s, Tracking: {track_time:.3f}s, " 
-                                f"Mapping: {mapping_time:.3f}s, Plate: {palate_time:.3f}s, "
-                                f"Visualization: {visualize_detections_time:.3f}s, "
-                                f"JSON Processing: {process_to_output_json_time:.3f}s, "
+                    logger.debug(f"Detection: {timings['detect']:.3f}s, Tracking: {timings['track']:.3f}s, " 
+                                f"Mapping: {timings['mapping']:.3f}s, Plate: {timings['plate']:.3f}s, "
+                                f"Visualization: {timings['visualize']:.3f}s, "
+                                f"JSON Processing: {timings['json']:.3f}s, "
                                 f"Total: {total_time:.3f}s")
                     logger.info(f"URL detect: {self.url}")
                 
+                self._record_frame(ctx)
                 return output_json
             else:
-                # No vehicles detected
-                output_json = process_to_output_json(grouped_json, frame, frame, camera_id=self.url)
+                # No vehicles detected, tracks may still have ended
+                json_start = time.time()
+                output_json = process_to_output_json(
+                    association, frame, frame if self.preview_enabled else None, camera_id=self.url,
+                    violation_aggregator=self.violation_aggregator, alive_track_ids=ctx.alive_track_ids,
+                    observe=not ctx.predicted,
+                )
+                if self.preview_enabled and self.client_overlay:
+                    output_json.overlay = overlay_message(association, frame.shape)  # clears the client overlay
+                timings["json"] = time.time() - json_start
+                self._record_frame(ctx)
                 return output_json
         except Exception as e:
             logger.error(f"Error processing frame: {str(e)}", exc_info=True)
@@ -369,6 +576,24 @@ class AIService:
             return None
     
     
+    def _preview(self, frame: np.ndarray, association: AssociationResult):
+        """Frame to encode as post_frame and the overlay shipped with it"""
+        if not self.preview_enabled:
+            return None, None
+        if self.client_overlay:
+            # The client draws the boxes, the raw frame is encoded without a copy
+            return frame, overlay_message(association, frame.shape)
+        return visualize_detections(frame, association), None
+    
+    def _record_frame(self, ctx: FrameContext) -> None:
+        """Update the processing rate and the stage latency metrics with a finished frame"""
+        now = time.time()
+        # Exponential moving average of the processing rate
+        if self._last_finished is not None and now > self._last_finished:
+            self.processing_fps = 0.9 * self.processing_fps + 0.1 / (now - self._last_finished)
+        self._last_finished = now
+        get_metrics().observe_frame(self.camera_label, ctx.timings, skipped=ctx.skipped, predicted=ctx.predicted)
+    
     async def process_frames(self, frame_data_list: List[FrameData]) -> List[DeviceDetection]:
         """Process multiple frames concurrently"""
         if not frame_data_list:
@@ -393,9 +618,6 @@ class AIService:
                 # Create empty result for failed processing
                 processed_results.append(DeviceDetection(
                     camera_id=frame_data_list[i]["url"],
-                    frame_count=frame_data_list[i]["frame_count"],
-                    timestamp=time.time(),
-                    detections=[],
                     post_frame=None
                 ))
             else:
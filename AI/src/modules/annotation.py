@@ -18,13 +18,13 @@ def find_longest_value(color_dict):
     return max(len(name) for name in color_dict.values())
 
 
-def visualize_detections(frame_ori, detections):
+def visualize_detections(frame_ori, association):
     """
     Draws bounding boxes on the frame based on detected objects.
 
     Args:
         frame (np.ndarray): Image frame.
-        detections (list): List of dictionaries containing vehicle data.
+        association (AssociationResult): Vehicles of the frame and their associated objects.
 
     Returns:
         np.ndarray: Annotated frame.
@@ -37,37 +37,68 @@ def visualize_detections(frame_ori, detections):
               2: (0, 0, 255),  # Red - No Helmet
               3: (0, 255, 255)}  # Yellow - License Plate
 
-    for vehicle in detections:
+    for vehicle_id, vehicle_bbox in zip(association.vehicle_ids.tolist(), association.vehicle_boxes.astype(int).tolist()):
         # Draw vehicle bounding box
-        vehicle_bbox = vehicle["vehicle_bbox"]
-        x_min, y_min, x_max, y_max = map(int, vehicle_bbox)
+        x_min, y_min, x_max, y_max = vehicle_bbox
         cv2.rectangle(frame, (x_min, y_min), (x_max, y_max), colors[0], 1)
-        cv2.putText(frame, f"Moto {vehicle['vehicle_id']}", 
+        cv2.putText(frame, f"Moto {vehicle_id}", 
                     (x_min, y_min - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.5, colors[0], 2)
 
-        # Draw each associated object
-        for obj in vehicle["objects"]:
-            obj_class = obj["class"]
-            obj_bbox = obj["bbox"]
-            x1, y1, x2, y2 = map(int, obj_bbox)
-            conf = obj["confidence"]
-
-            # Draw object bounding box
-            cv2.rectangle(frame, (x1, y1), (x2, y2), colors[obj_class], 1)
-            if obj_class == 2:
-                label = f"No Helmet ({conf:.2f})"
-                cv2.putText(frame, label, (x1, y1 - 5), cv2.FONT_HERSHEY_SIMPLEX, 0.5, colors[obj_class], 2)
-
-            elif obj_class == 3 and "plate_number" in obj:  # If license plate, display plate number
-                dump_plate = obj["plate_number"].replace("\n", " ")
-                label = f"{dump_plate} ({obj['plate_conf']:.2f})"
-                cv2.putText(frame, label, (x1, y1 - 5), cv2.FONT_HERSHEY_SIMPLEX, 0.5, colors[obj_class], 2)
-            # else:
-            #     label = f"Class {obj_class} ({conf:.2f})"
+    # Draw each associated object
+    object_boxes = association.object_boxes.astype(int)
+    for o in association.pair_object.tolist():
+        obj_class = int(association.object_classes[o])
+        x1, y1, x2, y2 = object_boxes[o].tolist()
+
+        # Draw object bounding box
+        cv2.rectangle(frame, (x1, y1), (x2, y2), colors[obj_class], 1)
+        if obj_class == 2:
+            label = f"No Helmet ({association.object_confs[o]:.2f})"
+            cv2.putText(frame, label, (x1, y1 - 5), cv2.FONT_HERSHEY_SIMPLEX, 0.5, colors[obj_class], 2)
+
+        elif obj_class == 3 and association.plate_texts[o] is not None:  # If license plate, display plate number
+            dump_plate = association.plate_texts[o].replace("\n", " ")
+            label = f"{dump_plate} ({association.plate_confs[o]:.2f})"
+            cv2.putText(frame, label, (x1, y1 - 5), cv2.FONT_HERSHEY_SIMPLEX, 0.5, colors[obj_class], 2)
 
     return frame
 
 
+def overlay_message(association, frame_shape):
+    """
+    Geometry drawn by visualize_detections, for clients that draw the overlay themselves.
+
+    Args:
+        association (AssociationResult): Vehicles of the frame and their associated objects.
+        frame_shape (tuple): Shape of the analysed frame, boxes are in its pixels.
+
+    Returns:
+        dict: Frame size, vehicles with their track ID and associated objects.
+    """
+    height, width = frame_shape[:2]
+    vehicles = [
+        {"id": vehicle_id, "box": box}
+        for vehicle_id, box in zip(association.vehicle_ids.tolist(), association.vehicle_boxes.astype(int).tolist())
+    ]
+
+    objects = []
+    object_boxes = association.object_boxes.astype(int)
+    for v, o in zip(association.pair_vehicle.tolist(), association.pair_object.tolist()):
+        obj_class = int(association.object_classes[o])
+        obj = {
+            "vehicle_id": vehicles[v]["id"],
+            "class": obj_class,
+            "box": object_boxes[o].tolist(),
+            "conf": round(float(association.object_confs[o]), 3),
+        }
+        if obj_class == 3 and association.plate_texts[o] is not None:
+            obj["plate"] = association.plate_texts[o]
+            obj["plate_conf"] = round(float(association.plate_confs[o]), 3)
+        objects.append(obj)
+
+    return {"width": width, "height": height, "vehicles": vehicles, "objects": objects}
+
+
 names = {
     0: 'moto',
     1: 'helm',
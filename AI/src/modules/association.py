@@ -0,0 +1,157 @@
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+import numpy as np
+
+# Object classes of the detector
+VEHICLE, HELMET, NO_HELMET, PLATE = 0, 1, 2, 3
+
+# An object belongs to a vehicle when almost all of it lies inside the vehicle box (CIP)
+# and its center is at the expected relative height of the box (HHB)
+CIP_THRESHOLD = 0.947
+HEAD_HHB_RANGE = (0.0, 0.29)  # helmet / no-helmet: top of the vehicle box
+PLATE_HHB_RANGE = (0.64, 1.0)  # license plate: bottom of the vehicle box
+
+
+def _as_array(data, columns: int) -> np.ndarray:
+    """Convert a tensor, an array or a tuple of rows to a float32 (N, columns) array"""
+    if hasattr(data, "cpu"):
+        data = data.cpu().numpy()
+    if len(data) == 0:
+        return np.zeros((0, columns), dtype=np.float32)
+    array = np.asarray(np.stack(data) if isinstance(data, (tuple, list)) else data, dtype=np.float32)
+    return array.reshape(len(array), -1)[:, :columns]
+
+
+@dataclass
+class AssociationResult:
+    """Columnar association of the objects of one frame with its tracked vehicles.
+
+    Vehicles and objects are stored as arrays, and each (vehicle, object) assignment
+    as a pair of indices, ordered by vehicle then by object. Plate readings are stored
+    per object. Use ``to_grouped`` to get the nested dict layout at the JSON boundary.
+    """
+    vehicle_ids: np.ndarray  # (V,) track IDs
+    vehicle_boxes: np.ndarray  # (V, 4) xyxy
+    object_boxes: np.ndarray  # (O, 4) xyxy
+    object_classes: np.ndarray  # (O,) int
+    object_confs: np.ndarray  # (O,)
+    pair_vehicle: np.ndarray  # (P,) index into vehicles
+    pair_object: np.ndarray  # (P,) index into objects
+    max_nohelmet_conf: np.ndarray  # (V,) NaN when the vehicle has no no-helmet rider
+    plate_texts: List[Optional[str]] = field(default_factory=list)  # (O,) OCR reading of plate objects
+    plate_confs: Optional[np.ndarray] = None  # (O,) NaN when not read
+    plate_qualities: Optional[np.ndarray] = None  # (O,) NaN when not scored, see plate_quality
+
+    def __post_init__(self):
+        if not self.plate_texts:
+            self.plate_texts = [None] * len(self.object_classes)
+        if self.plate_confs is None:
+            self.plate_confs = np.full(len(self.object_classes), np.nan)
+        if self.plate_qualities is None:
+            self.plate_qualities = np.full(len(self.object_classes), np.nan)
+
+    @classmethod
+    def empty(cls) -> "AssociationResult":
+        return associate_vehicles(np.zeros((0, 4)), np.zeros(0), np.zeros((0, 6)))
+
+    def __len__(self) -> int:
+        return len(self.vehicle_ids)
+
+    @property
+    def has_vehicles(self) -> bool:
+        return len(self.vehicle_ids) > 0
+
+    def pairs_of_class(self, class_id: int) -> np.ndarray:
+        """Indices of the pairs whose object has the given class"""
+        return np.nonzero(self.object_classes[self.pair_object] == class_id)[0]
+
+    def violating_vehicles(self) -> np.ndarray:
+        """Indices of the vehicles with a no-helmet rider"""
+        return np.nonzero(~np.isnan(self.max_nohelmet_conf))[0]
+
+    def violation_plates(self) -> Tuple[np.ndarray, np.ndarray]:
+        """(vehicle index, object index) of the plates of vehicles with a no-helmet rider"""
+        plates = self.pairs_of_class(PLATE)
+        plates = plates[~np.isnan(self.max_nohelmet_conf[self.pair_vehicle[plates]])]
+        return self.pair_vehicle[plates], self.pair_object[plates]
+
+    def to_grouped(self) -> List[Dict[str, Any]]:
+        """Nested dict layout: one entry per vehicle with the list of its objects"""
+        grouped = [
+            {
+                "vehicle_id": int(vehicle_id),
+                "vehicle_bbox": box.tolist(),
+                "objects": [],
+                "max_nohelmet_conf": None if np.isnan(conf) else float(conf),
+            }
+            for vehicle_id, box, conf in zip(self.vehicle_ids, self.vehicle_boxes, self.max_nohelmet_conf)
+        ]
+        for v, o in zip(self.pair_vehicle.tolist(), self.pair_object.tolist()):
+            obj = {
+                "class": int(self.object_classes[o]),
+                "bbox": self.object_boxes[o].tolist(),
+                "confidence": float(self.object_confs[o]),
+            }
+            if self.plate_texts[o] is not None:
+                obj["plate_number"] = self.plate_texts[o]
+                obj["plate_conf"] = float(self.plate_confs[o])
+            grouped[v]["objects"].append(obj)
+        return grouped
+
+
+def associate_vehicles(vehicle_track_dets, vehicle_track_ids, detection_results) -> AssociationResult:
+    """
+    Assign helmets, no-helmets and plates to the tracked vehicles of a frame in one pass.
+
+    The vehicle x object CIP and HHB matrices are computed with broadcasting and every
+    object satisfying the rules of its class is assigned to the vehicle.
+
+    Args:
+        vehicle_track_dets: Tracked vehicle boxes, (V, 4+) array, tensor or tuple of rows
+        vehicle_track_ids: Track IDs of the vehicles
+        detection_results: All detections of the frame, (N, 6) [x1, y1, x2, y2, conf, class]
+    """
+    vehicles = _as_array(vehicle_track_dets, 4)
+    vehicle_ids = np.asarray([int(track_id) for track_id in vehicle_track_ids], dtype=np.int64)
+    detections = _as_array(detection_results, 6)
+    objects = detections[detections[:, 5] != VEHICLE]
+
+    object_boxes = objects[:, :4]
+    object_classes = objects[:, 5].astype(np.int64)
+    object_confs = objects[:, 4]
+
+    # Intersection of every vehicle with every object, (V, O)
+    inter_w = np.minimum(vehicles[:, None, 2], object_boxes[None, :, 2]) - np.maximum(vehicles[:, None, 0], object_boxes[None, :, 0])
+    inter_h = np.minimum(vehicles[:, None, 3], object_boxes[None, :, 3]) - np.maximum(vehicles[:, None, 1], object_boxes[None, :, 1])
+    inter = np.clip(inter_w, 0, None) * np.clip(inter_h, 0, None)
+    object_area = (object_boxes[:, 2] - object_boxes[:, 0]) * (object_boxes[:, 3] - object_boxes[:, 1])
+    cip = np.divide(inter, object_area[None, :], out=np.zeros_like(inter), where=object_area[None, :] > 0)
+
+    # Relative height of the object center inside the vehicle box, (V, O)
+    vehicle_height = (vehicles[:, 3] - vehicles[:, 1])[:, None]
+    center_y = ((object_boxes[:, 1] + object_boxes[:, 3]) / 2)[None, :]
+    hhb = np.divide(center_y - vehicles[:, 1, None], vehicle_height,
+                    out=np.zeros_like(inter), where=vehicle_height > 0)
+
+    is_head = ((object_classes == HELMET) | (object_classes == NO_HELMET))[None, :]
+    is_plate = (object_classes == PLATE)[None, :]
+    valid = (cip > CIP_THRESHOLD) & (
+        (is_head & (hhb >= HEAD_HHB_RANGE[0]) & (hhb <= HEAD_HHB_RANGE[1]))
+        | (is_plate & (hhb >= PLATE_HHB_RANGE[0]) & (hhb <= PLATE_HHB_RANGE[1]))
+    )
+    pair_vehicle, pair_object = np.nonzero(valid)
+
+    nohelmet = np.where(valid & (object_classes == NO_HELMET)[None, :], object_confs[None, :], -np.inf)
+    max_nohelmet_conf = nohelmet.max(axis=1, initial=-np.inf)
+    max_nohelmet_conf[np.isinf(max_nohelmet_conf)] = np.nan
+
+    return AssociationResult(
+        vehicle_ids=vehicle_ids,
+        vehicle_boxes=vehicles,
+        object_boxes=object_boxes,
+        object_classes=object_classes,
+        object_confs=object_confs,
+        pair_vehicle=pair_vehicle,
+        pair_object=pair_object,
+        max_nohelmet_conf=max_nohelmet_conf.astype(np.float32),
+    )
@@ -0,0 +1,166 @@
+from typing import Any, Dict, Optional, Tuple
+import numpy as np
+from src.config import AppConfig_2
+from src.modules.association import AssociationResult
+
+
+class KeyframeScheduler:
+    """Per-camera choice of the frames the detector runs on.
+
+    Detection runs on keyframes only. In between, vehicle boxes come from the Kalman state
+    of the tracker and the helmets, no-helmets and plates of the last keyframe follow their
+    vehicle (see ``predict``). The keyframe interval adapts to the scene: it is the number
+    of frames the vehicles need to move by ``max_shift`` box heights at the speed measured
+    between the last two keyframes, between ``min_interval`` and ``max_interval``. A
+    keyframe is also forced when the position uncertainty of a tracked vehicle reaches
+    ``max_uncertainty`` box heights.
+
+    Settings come from the per-camera AI config, keys prefixed with ``keyframe_``. This is
+    independent of ``motion_keyframe_interval``, which forces detections on static scenes.
+    """
+
+    def __init__(self, config: Optional[Dict[str, Any]] = None):
+        self.enabled = False
+        self.min_interval = 1
+        self.max_interval = 5
+        self.max_shift = 0.3  # box heights
+        self.max_uncertainty = 0.35  # box heights
+        self.interval = 1
+        self._since_keyframe = 0
+        self._reference: Optional[AssociationResult] = None  # association of the last keyframe
+        self._positions: Dict[int, Tuple[float, float, float]] = {}  # track ID -> center x, center y, height
+        self.last_prediction: Optional[AssociationResult] = None
+
+        self.keyframes = 0
+        self.predicted_frames = 0
+        self.forced_keyframes = 0  # keyframes forced by the tracker uncertainty
+        self.scene_speed = 0.0  # box heights per frame
+        self.update_config(config or AppConfig_2.AI_DEFAULT_CONFIG)
+
+    def validate(self, config: Dict[str, Any]) -> Dict[str, Any]:
+        """Check the ``keyframe_*`` keys of a camera config and return the parsed settings, without applying them"""
+        settings = {
+            "enabled": bool(config.get("keyframe_detection", self.enabled)),
+            "min_interval": int(config.get("keyframe_min_interval", self.min_interval)),
+            "max_interval": int(config.get("keyframe_max_interval", self.max_interval)),
+            "max_shift": float(config.get("keyframe_max_shift", self.max_shift)),
+            "max_uncertainty": float(config.get("keyframe_max_uncertainty", self.max_uncertainty)),
+        }
+        if settings["min_interval"] < 1 or settings["max_interval"] < settings["min_interval"]:
+            raise ValueError("keyframe intervals must satisfy 1 <= keyframe_min_interval <= keyframe_max_interval")
+        return settings
+
+    def update_config(self, config: Dict[str, Any]) -> None:
+        """Apply the ``keyframe_*`` keys of a camera config"""
+        for name, value in self.validate(config).items():
+            setattr(self, name, value)
+        self.reset()
+
+    def reset(self) -> None:
+        """Detect on the next frame, e.g. after frames skipped by the motion gate"""
+        self._reference = None
+        self._positions = {}
+        self.interval = self.min_interval
+
+    def should_detect(self, tracks: Dict[int, Tuple[np.ndarray, float]]) -> bool:
+        """
+        Whether the next frame is a keyframe.
+
+        Args:
+            tracks: Kalman state of the tracker before this frame, track ID -> (xyxy box,
+                position uncertainty in box heights), see ``ObjectTracker.predicted_boxes``.
+        """
+        if not self.enabled or self._reference is None or self._since_keyframe + 1 >= self.interval:
+            return True
+        for track_id in self._reference.vehicle_ids.tolist():
+            state = tracks.get(track_id)
+            if state is not None and state[1] >= self.max_uncertainty:
+                self.forced_keyframes += 1
+                return True
+        return False
+
+    def record_keyframe(self, association: AssociationResult) -> None:
+        """Keep the association of a detected frame and adapt the interval to the scene speed.
+
+        The association is kept by reference, so plate readings stored into it later are
+        carried to the predicted frames.
+        """
+        frames = self._since_keyframe + 1
+        positions = {
+            int(track_id): ((box[0] + box[2]) / 2, (box[1] + box[3]) / 2, box[3] - box[1])
+            for track_id, box in zip(association.vehicle_ids.tolist(), association.vehicle_boxes.tolist())
+        }
+        speeds = [
+            np.hypot(x - self._positions[track_id][0], y - self._positions[track_id][1]) / max(height, 1.0) / frames
+            for track_id, (x, y, height) in positions.items() if track_id in self._positions
+        ]
+        if speeds:
+            self.scene_speed = float(np.median(speeds))
+            interval = int(self.max_shift / self.scene_speed) if self.scene_speed > 0 else self.max_interval
+        else:
+            # Unknown speed: measure it on the next frame, or wait long when the scene is empty
+            interval = self.min_interval if positions else self.max_interval
+        self.interval = min(self.max_interval, max(self.min_interval, interval))
+
+        self._reference = association
+        self._positions = positions
+        self._since_keyframe = 0
+        self.keyframes += 1
+
+    def predict(self, tracks: Dict[int, Tuple[np.ndarray, float]]) -> AssociationResult:
+        """
+        Association of a frame between keyframes.
+
+        Vehicles of the last keyframe still kept by the tracker get their Kalman box. Their
+        objects keep their position relative to the vehicle box, and their plate readings.
+
+        Args:
+            tracks: Kalman state of the tracker after it was advanced to this frame.
+        """
+        self._since_keyframe += 1
+        self.predicted_frames += 1
+        reference = self._reference
+        keep = np.array([track_id in tracks for track_id in reference.vehicle_ids.tolist()], dtype=bool)
+        old_boxes = reference.vehicle_boxes[keep]
+        new_boxes = np.array([tracks[track_id][0] for track_id in reference.vehicle_ids[keep].tolist()],
+                             dtype=np.float32).reshape(-1, 4)
+
+        # Objects assigned to a kept vehicle, moved with the affine map of its box
+        vehicle_index = np.full(len(reference.vehicle_ids), -1, dtype=np.int64)
+        vehicle_index[keep] = np.arange(int(keep.sum()))
+        pair_keep = vehicle_index[reference.pair_vehicle] >= 0
+        pair_vehicle = vehicle_index[reference.pair_vehicle[pair_keep]]
+        objects = reference.pair_object[pair_keep]
+        old, new = old_boxes[pair_vehicle], new_boxes[pair_vehicle]
+        scale = np.divide(new[:, 2:] - new[:, :2], old[:, 2:] - old[:, :2],
+                          out=np.ones((len(old), 2), dtype=np.float32), where=(old[:, 2:] - old[:, :2]) > 0)
+        boxes = reference.object_boxes[objects].reshape(-1, 2, 2)
+        object_boxes = ((boxes - old[:, None, :2]) * scale[:, None, :] + new[:, None, :2]).reshape(-1, 4)
+
+        self.last_prediction = AssociationResult(
+            vehicle_ids=reference.vehicle_ids[keep],
+            vehicle_boxes=new_boxes,
+            object_boxes=object_boxes.astype(np.float32),
+            object_classes=reference.object_classes[objects],
+            object_confs=reference.object_confs[objects],
+            pair_vehicle=pair_vehicle,
+            pair_object=np.arange(len(objects)),
+            max_nohelmet_conf=reference.max_nohelmet_conf[keep],
+            plate_texts=[reference.plate_texts[o] for o in objects.tolist()],
+            plate_confs=reference.plate_confs[objects],
+            plate_qualities=reference.plate_qualities[objects],
+        )
+        return self.last_prediction
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Detection savings of this camera"""
+        frames = self.keyframes + self.predicted_frames
+        return {
+            "enabled": self.enabled,
+            "keyframes": self.keyframes,
+            "predicted_frames": self.predicted_frames,
+            "forced_keyframes": self.forced_keyframes,
+            "detect_rate": self.keyframes / frames if frames else 1.0,
+            "interval": self.interval,
+            "scene_speed": self.scene_speed,
+        }
@@ -0,0 +1,134 @@
+import time
+from typing import Any, Dict, Optional
+import cv2
+import numpy as np
+from src.config import AppConfig_2
+
+MOTION_METHODS = ("diff", "mog2")
+
+
+class MotionGate:
+    """Cheap per-camera pre-filter deciding whether a frame is worth running detection on.
+
+    The frame is downscaled to ``downscale_width``, converted to gray and compared with
+    the previous frame (``diff``) or with a MOG2 background model (``mog2``). Detection
+    runs when the share of changed pixels reaches ``min_area``, for ``hold_frames``
+    frames after the last motion so vehicles are followed until they leave, and on
+    every ``keyframe_interval``-th frame so slow or stopped vehicles are not missed.
+
+    Settings come from the per-camera AI config, keys prefixed with ``motion_``.
+    """
+
+    def __init__(self, config: Optional[Dict[str, Any]] = None):
+        self.enabled = False
+        self.method = "diff"
+        self.threshold = 25  # gray level difference of a changed pixel
+        self.min_area = 0.002  # share of changed pixels to count as motion
+        self.downscale_width = 160
+        self.hold_frames = 15
+        self.keyframe_interval = 100  # 0 disables forced detections
+        self._reference: Optional[np.ndarray] = None
+        self._subtractor = None
+        self._hold_left = 0
+        self._since_processed = 0
+
+        self.frames_processed = 0
+        self.frames_skipped = 0
+        self.keyframes = 0
+        self.last_motion_ratio = 0.0
+        self.gate_time = 0.0
+        self.update_config(config or AppConfig_2.AI_DEFAULT_CONFIG)
+
+    def validate(self, config: Dict[str, Any]) -> Dict[str, Any]:
+        """Check the ``motion_*`` keys of a camera config and return the parsed settings, without applying them"""
+        method = config.get("motion_method", self.method)
+        if method not in MOTION_METHODS:
+            raise ValueError(f"motion_method must be one of {list(MOTION_METHODS)}, got {method}")
+        settings = {
+            "enabled": bool(config.get("motion_gate", self.enabled)),
+            "method": method,
+            "threshold": float(config.get("motion_threshold", self.threshold)),
+            "min_area": float(config.get("motion_min_area", self.min_area)),
+            "downscale_width": int(config.get("motion_downscale_width", self.downscale_width)),
+            "hold_frames": int(config.get("motion_hold_frames", self.hold_frames)),
+            "keyframe_interval": int(config.get("motion_keyframe_interval", self.keyframe_interval)),
+        }
+        if settings["downscale_width"] <= 0:
+            raise ValueError("motion_downscale_width must be positive")
+        return settings
+
+    def update_config(self, config: Dict[str, Any]) -> None:
+        """Apply the ``motion_*`` keys of a camera config"""
+        settings = self.validate(config)
+        reset = (settings["method"] != self.method or settings["downscale_width"] != self.downscale_width
+                 or settings["threshold"] != self.threshold)
+        for name, value in settings.items():
+            setattr(self, name, value)
+        if reset:
+            self._reference = None
+            self._subtractor = None
+
+    def _prepare(self, frame: np.ndarray) -> np.ndarray:
+        height, width = frame.shape[:2]
+        scale = self.downscale_width / width
+        small = cv2.resize(frame, (self.downscale_width, max(1, int(height * scale))), interpolation=cv2.INTER_AREA)
+        gray = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY) if small.ndim == 3 else small
+        # Blur away sensor noise, which is strong on night footage
+        return cv2.GaussianBlur(gray, (5, 5), 0)
+
+    def _motion_ratio(self, gray: np.ndarray) -> Optional[float]:
+        """Share of changed pixels, or None while there is no reference yet"""
+        if self.method == "mog2":
+            if self._subtractor is None:
+                self._subtractor = cv2.createBackgroundSubtractorMOG2(varThreshold=self.threshold, detectShadows=False)
+            mask = self._subtractor.apply(gray)
+            return cv2.countNonZero(mask) / mask.size
+
+        reference, self._reference = self._reference, gray
+        if reference is None or reference.shape != gray.shape:
+            return None
+        mask = cv2.absdiff(gray, reference) > self.threshold
+        return float(np.count_nonzero(mask)) / mask.size
+
+    def should_process(self, frame: np.ndarray) -> bool:
+        """Return True when detection must run on this frame"""
+        if not self.enabled:
+            self.frames_processed += 1
+            return True
+
+        gate_start = time.time()
+        ratio = self._motion_ratio(self._prepare(frame))
+        self.last_motion_ratio = 1.0 if ratio is None else ratio
+        self._since_processed += 1
+
+        if ratio is None or ratio >= self.min_area:
+            self._hold_left = self.hold_frames
+            process = True
+        elif self._hold_left > 0:
+            self._hold_left -= 1
+            process = True
+        else:
+            process = 0 < self.keyframe_interval <= self._since_processed
+            self.keyframes += int(process)
+
+        if process:
+            self._since_processed = 0
+            self.frames_processed += 1
+        else:
+            self.frames_skipped += 1
+        self.gate_time += time.time() - gate_start
+        return process
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Skipped versus processed frame counters"""
+        total = self.frames_processed + self.frames_skipped
+        return {
+            "enabled": self.enabled,
+            "method": self.method,
+            "frames_processed": self.frames_processed,
+            "frames_skipped": self.frames_skipped,
+            "skip_rate": self.frames_skipped / total if total else 0.0,
+            "keyframes": self.keyframes,
+            "last_motion_ratio": round(self.last_motion_ratio, 5),
+            "avg_gate_ms": 1000 * self.gate_time / total if total and self.enabled else 0.0,
+        }
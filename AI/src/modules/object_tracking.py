@@ -6,9 +6,19 @@ import supervision as sv
 from supervision import Detections
 
 class ObjectTracker:
-    def __init__(self, model):
+    def __init__(self, embedder_pool=None):
+        """Per-camera tracker state. Appearance embeddings for DeepSort come from a shared
+        embedder pool so the MobileNet network is not loaded once per camera."""
         self.tracked_objects = []
-        self.object_tracker = model
+        self.embedder_pool = embedder_pool
+        self.object_tracker = DeepSort(
+                            max_age=1,  
+                            n_init=2,  
+                            nms_max_overlap=1.0,  # Avoid redundant overlap checks
+                            max_cosine_distance=0.2,  # Faster similarity checks
+                            nn_budget=50,  # Limit embedding storage
+                            embedder=None,  # Embeddings are computed with the shared embedder
+                            )
         self.bytetracker = sv.ByteTrack(
                         track_activation_threshold= 0.25,
                         lost_track_buffer= 30,
@@ -17,6 +27,7 @@ class ObjectTracker:
                         minimum_consecutive_frames= 1,
                             )
         self.TRACKING_CLASS = [0]
+        self.max_time_lost = getattr(self.bytetracker, "max_time_lost", 30)
     
     def track(self, detection_results, origin_frame):
         track_dets = tuple()
@@ -31,7 +42,7 @@ class ObjectTracker:
                     dets.append(([int(x1), int(y1), int(x2 - x1), int(y2 - y1)], conf, id))
             if dets:
                 # Object tracking
-                tracks = self.object_tracker.update_tracks(dets, frame=origin_frame)
+                tracks = self.object_tracker.update_tracks(dets, embeds=self.embed(dets, origin_frame))
             
                 track_info = [(track.to_tlbr(), track.get_det_conf(), track.get_det_class(), track.track_id)for track in tracks]
                
@@ -39,17 +50,66 @@ class ObjectTracker:
                 mask = np.array([conf is not None for conf in track_confs])
         return track_dets, track_ids
     
+    def embed(self, dets, origin_frame):
+        """Compute appearance embeddings of [ltwh, conf, class] detections with the shared embedder"""
+        im_height, im_width = origin_frame.shape[:2]
+        crops = []
+        for (left, top, width, height), _, _ in dets:
+            x1, y1 = max(0, left), max(0, top)
+            x2, y2 = min(im_width, left + width), min(im_height, top + height)
+            crops.append(origin_frame[y1:y2, x1:x2])
+        with self.embedder_pool.acquire() as embedder:
+            return embedder.predict(crops)
+    
     def bytetrack(self, results, frame):
         result = results[0]
         detections = self.extract_class_0_detections(result)
-        self.bytetracker.update_with_detections(detections) #
-        detections = self.bytetracker.update_with_detections(detections)
+        detections = self._update_bytetrack(detections)
         vehicle_track_dets, vehicle_track_ids = detections.xyxy, detections.tracker_id
         track_dets = tuple(np.array(row, dtype=np.float32) for row in vehicle_track_dets)
         track_ids = tuple(np.array(row, dtype=np.float32) for row in vehicle_track_ids)
         return track_dets, track_ids
     
     
+    def _update_bytetrack(self, detections):
+        self.bytetracker.update_with_detections(detections) #
+        return self.bytetracker.update_with_detections(detections)
+    
+    def tick(self):
+        """Advance the tracker by one frame without detections, so lost tracks keep ageing"""
+        self._update_bytetrack(Detections.empty())
+    
+    def alive_track_ids(self):
+        """IDs of the tracks ByteTrack still keeps (tracked or lost), or None if not exposed"""
+        tracked = getattr(self.bytetracker, "tracked_tracks", None)
+        lost = getattr(self.bytetracker, "lost_tracks", None)
+        if tracked is None or lost is None:
+            return None
+        return {self._track_id(track) for track in list(tracked) + list(lost)}
+
+    @staticmethod
+    def _track_id(track) -> int:
+        """ID reported for a track: supervision >= 0.24 only has external_track_id, older versions only track_id"""
+        external = getattr(track, "external_track_id", None)
+        return int(external if external is not None else track.track_id)
+
+    def predicted_boxes(self):
+        """Kalman state of the tracks ByteTrack keeps: ID -> (xyxy box, position std in box heights)"""
+        tracks = list(getattr(self.bytetracker, "tracked_tracks", [])) + list(getattr(self.bytetracker, "lost_tracks", []))
+        boxes = {}
+        for track in tracks:
+            mean, covariance = getattr(track, "mean", None), getattr(track, "covariance", None)
+            if mean is None:
+                continue
+            center_x, center_y, aspect, height = mean[:4]  # ByteTrack filters (x, y, a, h)
+            if height <= 0:
+                continue
+            width = aspect * height
+            box = np.array([center_x - width / 2, center_y - height / 2, center_x + width / 2, center_y + height / 2], dtype=np.float32)
+            uncertainty = float(np.sqrt(covariance[0, 0] + covariance[1, 1]) / height) if covariance is not None else 0.0
+            boxes[self._track_id(track)] = (box, uncertainty)
+        return boxes
+
     def extract_class_0_detections(self, results):
         boxes = results.boxes.xyxy.cpu().numpy()  # Tọa độ bounding box [x1, y1, x2, y2]
         confidence = results.boxes.conf.cpu().numpy()  # Độ tin cậy
@@ -0,0 +1,154 @@
+from collections import defaultdict
+from typing import Any, Dict, Iterable, Optional, Tuple
+from src.config import AppConfig_2
+from src.config.globalVariables import THRESHOLD_PLATE_CERTAIN
+
+
+class TrackPlateVotes:
+    """Character-level votes of all plate readings of one track.
+
+    Readings are grouped by layout (number of lines and characters per line) so that
+    characters at the same position of the same line vote together, weighted by the
+    OCR confidence of the reading.
+    """
+
+    def __init__(self):
+        self.readings = 0
+        self.layout_weights: Dict[Tuple[int, ...], float] = defaultdict(float)
+        self.layout_readings: Dict[Tuple[int, ...], int] = defaultdict(int)
+        # (layout, line, position) -> {char: summed confidence}
+        self.char_votes: Dict[Tuple[Tuple[int, ...], int, int], Dict[str, float]] = defaultdict(lambda: defaultdict(float))
+        self.last_seen = 0
+        self.settled = False
+
+    def add(self, plate_text: str, plate_conf: float) -> None:
+        lines = plate_text.split("\n")
+        layout = tuple(len(line) for line in lines)
+        self.readings += 1
+        self.layout_weights[layout] += plate_conf
+        self.layout_readings[layout] += 1
+        for line_index, line in enumerate(lines):
+            for position, char in enumerate(line):
+                self.char_votes[(layout, line_index, position)][char] += plate_conf
+
+    def consensus(self) -> Tuple[Optional[str], float, int]:
+        """
+        Build the consensus reading from the votes.
+
+        Returns:
+            tuple: (plate text, confidence, number of readings supporting its layout).
+            The confidence is the mean OCR confidence of the layout scaled by the
+            average share of the winning character at each position.
+        """
+        if not self.layout_weights:
+            return None, 0.0, 0
+        layout = max(self.layout_weights, key=self.layout_weights.get)
+        support = self.layout_readings[layout]
+
+        lines, agreements = [], []
+        for line_index, line_length in enumerate(layout):
+            chars = []
+            for position in range(line_length):
+                votes = self.char_votes[(layout, line_index, position)]
+                char, weight = max(votes.items(), key=lambda item: item[1])
+                chars.append(char)
+                agreements.append(weight / sum(votes.values()))
+            lines.append("".join(chars))
+
+        mean_conf = self.layout_weights[layout] / support
+        agreement = sum(agreements) / len(agreements) if agreements else 0.0
+        return "\n".join(lines), mean_conf * agreement, support
+
+
+class PlateReadingCache:
+    """Per-camera cache of plate readings keyed by track ID.
+
+    Every OCR reading of a track adds character-level votes. Once the consensus of a
+    track is supported by enough readings and its confidence reaches
+    ``THRESHOLD_PLATE_CERTAIN``, the track is settled and its plate is served from
+    the cache instead of calling OCR again.
+    """
+
+    def __init__(
+        self,
+        certain_threshold: float = THRESHOLD_PLATE_CERTAIN,
+        min_readings: int = AppConfig_2.PLATE_CONSENSUS_MIN_READINGS,
+        max_age: int = 30,
+    ):
+        self.certain_threshold = certain_threshold
+        self.min_readings = max(1, min_readings)
+        self.max_age = max_age  # frames, only used when alive track IDs are unknown
+        self._entries: Dict[int, TrackPlateVotes] = {}
+        self._frame_index = 0
+
+        self.hits = 0  # OCR calls saved
+        self.misses = 0  # OCR calls made
+        self.evictions = 0
+
+    def lookup(self, track_id: int) -> Optional[Tuple[str, float]]:
+        """Return the consensus plate of a settled track, or None if OCR is still needed"""
+        entry = self._entries.get(track_id)
+        if entry is not None:
+            entry.last_seen = self._frame_index
+            if entry.settled:
+                self.hits += 1
+                plate_text, plate_conf, _ = entry.consensus()
+                return plate_text, plate_conf
+        return None
+
+    def record_miss(self) -> None:
+        """Count a plate of an unsettled track sent to OCR"""
+        self.misses += 1
+
+    def current(self, track_id: int) -> Optional[Tuple[str, float]]:
+        """Consensus of the readings of a track so far, settled or not"""
+        entry = self._entries.get(track_id)
+        if entry is None:
+            return None
+        plate_text, plate_conf, _ = entry.consensus()
+        return (plate_text, plate_conf) if plate_text is not None else None
+
+    def update(self, track_id: int, plate_text: str, plate_conf: float) -> Tuple[str, float]:
+        """Add an OCR reading to a track and return the current consensus reading"""
+        entry = self._entries.get(track_id)
+        if entry is None:
+            entry = self._entries[track_id] = TrackPlateVotes()
+        entry.last_seen = self._frame_index
+        entry.add(plate_text, float(plate_conf))
+
+        consensus_text, consensus_conf, support = entry.consensus()
+        if support >= self.min_readings and consensus_conf >= self.certain_threshold:
+            entry.settled = True
+        return consensus_text, consensus_conf
+
+    def evict(self, alive_track_ids: Optional[Iterable[int]] = None) -> None:
+        """Advance one frame and drop the tracks the tracker no longer keeps.
+
+        Args:
+            alive_track_ids: IDs of tracks still held by the tracker (tracked or lost).
+                When None, tracks unseen for more than ``max_age`` frames are dropped.
+        """
+        self._frame_index += 1
+        if alive_track_ids is not None:
+            alive = set(alive_track_ids)
+            dropped = [track_id for track_id in self._entries if track_id not in alive]
+        else:
+            dropped = [
+                track_id for track_id, entry in self._entries.items()
+                if self._frame_index - entry.last_seen > self.max_age
+            ]
+        for track_id in dropped:
+            del self._entries[track_id]
+        self.evictions += len(dropped)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Hit-rate metrics of the cache"""
+        lookups = self.hits + self.misses
+        return {
+            "tracks": len(self._entries),
+            "settled_tracks": sum(1 for entry in self._entries.values() if entry.settled),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+        }
@@ -0,0 +1,129 @@
+from typing import Any, Dict, Iterable, Optional, Sequence
+import cv2
+import numpy as np
+from src.config import AppConfig_2
+
+# Width / height of Vietnamese plates: two-line motorbike plates are about 1.4, one-line ones about 4.3
+PLATE_ASPECT_RANGES = ((0.9, 1.9), (3.0, 5.5))
+SHARPNESS_HEIGHT = 32  # plates are scored at this height so sharpness does not depend on their size
+
+
+def plate_quality(
+        frame: np.ndarray,
+        box: Sequence[float],
+        min_area: int = AppConfig_2.PLATE_MIN_AREA,
+        full_area: int = AppConfig_2.PLATE_FULL_AREA,
+        full_sharpness: float = AppConfig_2.PLATE_FULL_SHARPNESS,
+) -> float:
+    """
+    Cheap estimate of how readable a plate box is, before running OCR on it.
+
+    The score is the product of four terms in [0, 1]: the pixel area (saturating at
+    ``full_area``), how close the aspect ratio is to a plate, the Laplacian variance of
+    the plate at a fixed height (blur) and the vertical position, plates low in the frame
+    being closer to the camera. Boxes cut by the frame border are halved.
+
+    Args:
+        frame(np.ndarray): The full frame.
+        box: Plate box [x_min, y_min, x_max, y_max].
+
+    Returns:
+        float: Quality score, 0 for boxes smaller than ``min_area`` pixels.
+    """
+    frame_h, frame_w = frame.shape[:2]
+    x_min, y_min = max(0, int(box[0])), max(0, int(box[1]))
+    x_max, y_max = min(frame_w, int(box[2])), min(frame_h, int(box[3]))
+    width, height = x_max - x_min, y_max - y_min
+    if width < 2 or height < 2 or width * height < min_area:
+        return 0.0
+
+    size = min(1.0, width * height / full_area)
+
+    aspect = width / height
+    # Distance in log scale to the nearest plate aspect range, 0 inside one
+    distance = min(max(0.0, np.log(low / aspect), np.log(aspect / high)) for low, high in PLATE_ASPECT_RANGES)
+    shape = float(np.exp(-2.0 * distance))
+
+    plate = frame[y_min:y_max, x_min:x_max]
+    gray = cv2.cvtColor(plate, cv2.COLOR_BGR2GRAY) if plate.ndim == 3 else plate
+    scaled_width = max(2, round(width * SHARPNESS_HEIGHT / height))
+    gray = cv2.resize(gray, (scaled_width, SHARPNESS_HEIGHT), interpolation=cv2.INTER_AREA)
+    sharpness = min(1.0, cv2.Laplacian(gray, cv2.CV_32F).var() / full_sharpness)
+
+    position = 0.5 + 0.5 * (y_min + y_max) / (2 * frame_h)
+    if x_min == 0 or y_min == 0 or x_max == frame_w or y_max == frame_h:
+        position *= 0.5
+    return float(size * shape * sharpness * position)
+
+
+class BestShotSelector:
+    """Per-camera best plate quality of every track, to OCR only its improving shots.
+
+    A plate is read when its quality reaches ``min_quality`` and beats the best quality
+    already read for the track by ``margin`` (relative), so a track is read on its first
+    usable shot and again only when a clearly better one comes. A shot becomes the best
+    one only once OCR gave a reading for it (``commit``), so a sharp crop that could not
+    be read does not block the next shots. The same margin is used by
+    ``ViolationAggregator`` to replace kept evidence.
+    """
+
+    def __init__(
+        self,
+        min_quality: float = AppConfig_2.PLATE_MIN_QUALITY,
+        margin: float = AppConfig_2.PLATE_BEST_SHOT_MARGIN,
+        max_age: int = 30,
+    ):
+        self.min_quality = min_quality
+        self.margin = margin
+        self.max_age = max_age  # frames, only used when alive track IDs are unknown
+        self._best: Dict[int, float] = {}
+        self._last_seen: Dict[int, int] = {}
+        self._frame_index = 0
+
+        self.accepted = 0  # crops sent to OCR
+        self.rejected_low = 0  # below min_quality
+        self.rejected_not_better = 0  # no better than the best shot of the track
+
+    def should_read(self, track_id: int, quality: float) -> bool:
+        """Whether this shot of a track is worth OCR"""
+        self._last_seen[track_id] = self._frame_index
+        if quality < self.min_quality:
+            self.rejected_low += 1
+            return False
+        best = self._best.get(track_id)
+        if best is not None and quality <= best * (1.0 + self.margin):
+            self.rejected_not_better += 1
+            return False
+        self.accepted += 1
+        return True
+
+    def commit(self, track_id: int, quality: float) -> None:
+        """Record a shot OCR could read as the best one of its track"""
+        if track_id in self._last_seen and quality > self._best.get(track_id, 0.0):
+            self._best[track_id] = quality
+
+    def evict(self, alive_track_ids: Optional[Iterable[int]] = None) -> None:
+        """Advance one frame and drop the tracks the tracker no longer keeps"""
+        self._frame_index += 1
+        if alive_track_ids is not None:
+            alive = set(alive_track_ids)
+            dropped = [track_id for track_id in self._last_seen if track_id not in alive]
+        else:
+            dropped = [
+                track_id for track_id, last_seen in self._last_seen.items()
+                if self._frame_index - last_seen > self.max_age
+            ]
+        for track_id in dropped:
+            del self._last_seen[track_id]
+            self._best.pop(track_id, None)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """OCR calls avoided by the gate"""
+        scored = self.accepted + self.rejected_low + self.rejected_not_better
+        return {
+            "tracks": len(self._best),
+            "accepted": self.accepted,
+            "rejected_low": self.rejected_low,
+            "rejected_not_better": self.rejected_not_better,
+            "skip_rate": (scored - self.accepted) / scored if scored else 0.0,
+        }
@@ -1,9 +1,95 @@
-from typing import Union
+from contextlib import nullcontext
+from typing import List, Optional, Union
 import cv2
 import numpy as np
 from supervision.draw.color import Color, ColorPalette
 from ultralytics import YOLO
 from paddleocr import PaddleOCR
+from src.config import ModelConfig
+
+PLATE_OCR_MODES = ("det_rec", "rec_only")
+
+
+def sort_text_boxes(dt_boxes) -> list:
+    """
+    Sort detected text boxes from top to bottom, then left to right (same rule as PaddleOCR).
+
+    Args:
+        dt_boxes: Detected boxes, each with 4 points of shape (4, 2).
+
+    Returns:
+        list: Sorted boxes.
+    """
+    boxes = sorted(dt_boxes, key=lambda box: (box[0][1], box[0][0]))
+    for i in range(len(boxes) - 1):
+        for j in range(i, -1, -1):
+            if abs(boxes[j + 1][0][1] - boxes[j][0][1]) < 10 and boxes[j + 1][0][0] < boxes[j][0][0]:
+                boxes[j], boxes[j + 1] = boxes[j + 1], boxes[j]
+            else:
+                break
+    return boxes
+
+
+def crop_text_line(image: np.ndarray, points) -> np.ndarray:
+    """
+    Crop a detected text line and warp it to an axis-aligned image.
+
+    Args:
+        image(np.ndarray): Plate crop the box was detected on.
+        points: The 4 corner points of the text box.
+
+    Returns:
+        np.ndarray: The rectified text line.
+    """
+    points = np.asarray(points, dtype=np.float32)
+    width = int(max(np.linalg.norm(points[0] - points[1]), np.linalg.norm(points[2] - points[3])))
+    height = int(max(np.linalg.norm(points[0] - points[3]), np.linalg.norm(points[1] - points[2])))
+    width, height = max(width, 1), max(height, 1)
+    target = np.float32([[0, 0], [width, 0], [width, height], [0, height]])
+    matrix = cv2.getPerspectiveTransform(points, target)
+    line = cv2.warpPerspective(image, matrix, (width, height), borderMode=cv2.BORDER_REPLICATE, flags=cv2.INTER_CUBIC)
+    if height / width >= 1.5:
+        line = np.rot90(line)
+    return line
+
+
+def split_plate_lines(plate: np.ndarray, two_line_max_aspect: float = ModelConfig.PLATE_TWO_LINE_MAX_ASPECT) -> List[np.ndarray]:
+    """
+    Split a plate crop into its text lines without a text detector.
+
+    Wide plates are one line. Square-ish ones (Vietnamese motorbike plates) have two lines,
+    cut at the row with the least ink in the middle band of the plate, with a small overlap
+    so descenders and accents of either line are kept.
+
+    Args:
+        plate(np.ndarray): Plate crop at its original resolution.
+        two_line_max_aspect: Width / height ratio up to which the plate has two lines.
+
+    Returns:
+        List[np.ndarray]: The text lines, top to bottom.
+    """
+    height, width = plate.shape[:2]
+    if height < 8 or width / height > two_line_max_aspect:
+        return [plate]
+    gray = cv2.cvtColor(plate, cv2.COLOR_BGR2GRAY) if plate.ndim == 3 else plate
+    _, binary = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+    # Characters are the minority class whatever the plate colors
+    ink = binary == 0 if np.count_nonzero(binary == 0) < binary.size / 2 else binary == 255
+    profile = ink.mean(axis=1)
+    low, high = int(height * 0.35), int(height * 0.65) + 1
+    band = profile[low:high]
+    rows = np.flatnonzero(band == band.min())
+    split = low + int(rows[len(rows) // 2])  # middle of the emptiest rows
+    margin = max(1, int(height * 0.04))
+    return [plate[:split + margin], plate[max(0, split - margin):]]
+
+
+def resize_to_height(line: np.ndarray, height: int = ModelConfig.OCR_REC_HEIGHT) -> np.ndarray:
+    """Resize a text line to the recognizer input height, keeping its aspect ratio"""
+    h, w = line.shape[:2]
+    width = max(1, round(w * height / h))
+    interpolation = cv2.INTER_AREA if h > height else cv2.INTER_CUBIC
+    return cv2.resize(line, (width, height), interpolation=interpolation)
 
 
 class PlateRecognizer:
@@ -12,7 +98,7 @@ class PlateRecognizer:
 
     Args:
         license_plate_detector: A license plate detection model.
-        ocr_model: An Optical Character Recognition (OCR) model.
+        ocr_model: An Optical Character Recognition (OCR) model, or a shared ModelPool of them.
         plate_conf (float, optional): Confidence threshold for license plate detection.
             Defaults to 0.6.
         color (Union[Color, ColorPalette], optional): Color or ColorPalette for annotation.
@@ -25,9 +111,44 @@ class PlateRecognizer:
     def __init__(
             self,
             ocr_model,
+            mode: str = ModelConfig.PLATE_OCR_MODE,
     ):
         # self.license_plate_detector = license_plate_detector
+        if mode not in PLATE_OCR_MODES:
+            raise ValueError(f"Unknown plate OCR mode {mode!r}, expected one of {PLATE_OCR_MODES}")
         self.ocr_model = ocr_model
+        self.mode = mode
+
+    @staticmethod
+    def crop_plate(frame: np.ndarray, bbox, size: Optional[tuple[int, int]] = (320, 320)) -> Optional[np.ndarray]:
+        """
+        Crop a license plate box from a frame and resize it for OCR.
+
+        Args:
+            frame(np.ndarray): The full frame.
+            bbox: Plate box [x_min, y_min, x_max, y_max].
+            size: Output size of the crop, None keeps the original resolution.
+
+        Returns:
+            Optional[np.ndarray]: The resized crop, or None if the box is empty inside the frame.
+        """
+        x_min, y_min, x_max, y_max = map(int, bbox)
+        # Ensure coordinates are within frame boundaries
+        x_min, y_min = max(0, x_min), max(0, y_min)
+        x_max, y_max = min(frame.shape[1], x_max), min(frame.shape[0], y_max)
+        if x_max <= x_min or y_max <= y_min:
+            return None
+        plate_frame = frame[y_min:y_max, x_min:x_max]
+        if size is None:
+            return plate_frame.copy()
+        return cv2.resize(plate_frame, size, interpolation=cv2.INTER_LANCZOS4)
+
+    def _acquire_ocr(self):
+        """Borrow the OCR model, from the shared pool when one is given"""
+        if hasattr(self.ocr_model, "acquire"):
+            return self.ocr_model.acquire()
+        return nullcontext(self.ocr_model)
+
     def recognize(
             self,
             plate_frame: np.ndarray
@@ -43,7 +164,8 @@ class PlateRecognizer:
             Union[None, tuple[str, float]]: A tuple containing the recognized plate text and confidence score,
             or None if no plate is detected.
         """
-        result = self.ocr_model.ocr(plate_frame, cls=True)
+        with self._acquire_ocr() as ocr_model:
+            result = ocr_model.ocr(plate_frame, cls=True)
         if result and result[0]:
             plate_text = []
             confidences = []
@@ -58,6 +180,65 @@ class PlateRecognizer:
     
         return None, None
 
+    def recognize_batch(
+            self,
+            plate_frames: List[np.ndarray]
+    ) -> List[Union[tuple[None, None], tuple[str, float]]]:
+        """
+        Recognize a batch of license plate crops.
+
+        In ``det_rec`` mode text lines are detected on every crop resized to 320x320, then the
+        lines of the whole batch go through the angle classifier and the recognizer together,
+        so recognition runs as batched forward passes instead of once per plate. In ``rec_only``
+        mode the lines are split geometrically (see ``split_plate_lines``) and only the
+        recognizer runs, on lines resized to its input height.
+
+        Args:
+            plate_frames(List[np.ndarray]): The plate crops to recognize, at their original resolution.
+
+        Returns:
+            List[Union[tuple[None, None], tuple[str, float]]]: Plate text and confidence score
+            for every crop, in input order, or (None, None) where no text is recognized.
+        """
+        results = [(None, None)] * len(plate_frames)
+        if not plate_frames:
+            return results
+
+        with self._acquire_ocr() as ocr_model:
+            line_crops, owners = [], []
+            if self.mode == "rec_only":
+                for index, plate_frame in enumerate(plate_frames):
+                    for line in split_plate_lines(plate_frame):
+                        line_crops.append(resize_to_height(line))
+                        owners.append(index)
+            else:
+                for index, plate_frame in enumerate(plate_frames):
+                    plate_frame = cv2.resize(plate_frame, (320, 320), interpolation=cv2.INTER_LANCZOS4)
+                    dt_boxes, _ = ocr_model.text_detector(plate_frame)
+                    if dt_boxes is None:
+                        continue
+                    for box in sort_text_boxes(dt_boxes):
+                        line_crops.append(crop_text_line(plate_frame, box))
+                        owners.append(index)
+            if not line_crops:
+                return results
+
+            if ocr_model.use_angle_cls and self.mode == "det_rec":
+                line_crops, _, _ = ocr_model.text_classifier(line_crops)
+            rec_res, _ = ocr_model.text_recognizer(line_crops)
+            drop_score = getattr(ocr_model, "drop_score", 0.5)
+
+        plate_lines = [[] for _ in plate_frames]
+        for index, (text, conf) in zip(owners, rec_res):
+            if conf >= drop_score:
+                plate_lines[index].append((text, conf))
+
+        for index, lines in enumerate(plate_lines):
+            if lines:
+                texts, confidences = zip(*lines)
+                results[index] = ("\n".join(texts), sum(confidences) / len(confidences))
+        return results
+
 # Example usage
 if __name__ == "__main__":
     ocr_model = PaddleOCR(lang='en', show_log=False, use_angle_cls=True, use_gpu=True)
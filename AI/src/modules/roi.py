@@ -0,0 +1,130 @@
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+import cv2
+import numpy as np
+import torch
+
+
+@dataclass(frozen=True)
+class ResolvedRegion:
+    """The region of a polygon for one frame size, kept by a frame from crop to restore"""
+    polygon: np.ndarray  # the polygon it was computed from
+    shape: Tuple[int, int]  # frame height, width
+    rect: Tuple[int, int, int, int]  # bounding rectangle x1, y1, x2, y2
+    mask: np.ndarray  # 1 inside the polygon, frame-sized
+
+
+class RegionOfInterest:
+    """Polygon region of a camera view that detection is restricted to.
+
+    Only the bounding rectangle of the polygon is sent to the detector, which letterboxes
+    it to its input size. The detections are then shifted back to full-frame coordinates
+    and the ones whose center lies outside the polygon are dropped, before tracking and OCR.
+
+    The polygon is a list of [x, y] points, in pixels or as fractions of the frame size
+    when all coordinates are within [0, 1]. Without a polygon the full frame is used.
+
+    The polygon can be replaced while frames are in flight in batch threads, so ``crop``
+    returns the resolved region and ``restore`` maps the result with that same region.
+    """
+
+    def __init__(self, polygon: Optional[Sequence[Sequence[float]]] = None):
+        self.polygon: Optional[np.ndarray] = None
+        self._region: Optional[ResolvedRegion] = None  # last resolved region
+
+        self.detections_kept = 0
+        self.detections_dropped = 0
+        self.set_polygon(polygon)
+
+    @staticmethod
+    def validate(polygon: Any) -> Optional[np.ndarray]:
+        """Check a polygon from the camera config and return it as an (N, 2) float array"""
+        if polygon is None or len(polygon) == 0:
+            return None
+        try:
+            points = np.asarray(polygon, dtype=np.float32)
+        except (TypeError, ValueError):
+            raise ValueError("roi_polygon must be a list of [x, y] points")
+        if points.ndim != 2 or points.shape[1] != 2 or len(points) < 3:
+            raise ValueError("roi_polygon must have at least 3 [x, y] points")
+        if (points < 0).any():
+            raise ValueError("roi_polygon coordinates must not be negative")
+        return points
+
+    def set_polygon(self, polygon: Optional[Sequence[Sequence[float]]]) -> None:
+        # A single assignment, regions resolved from the old polygon are never reused
+        self.polygon = self.validate(polygon)
+
+    @property
+    def enabled(self) -> bool:
+        return self.polygon is not None
+
+    def _resolve(self, shape: Tuple[int, ...]) -> Optional[ResolvedRegion]:
+        """Compute the pixel polygon, its bounding rectangle and its mask for a frame size"""
+        polygon, region = self.polygon, self._region
+        if polygon is None:
+            return None
+        height, width = shape[:2]
+        if region is not None and region.polygon is polygon and region.shape == (height, width):
+            return region
+        points = polygon
+        if points.max() <= 1.0:
+            points = points * np.array([width, height], dtype=np.float32)
+        points = np.round(points).astype(np.int32)
+        points[:, 0] = np.clip(points[:, 0], 0, width - 1)
+        points[:, 1] = np.clip(points[:, 1], 0, height - 1)
+
+        x, y, w, h = cv2.boundingRect(points)
+        mask = np.zeros((height, width), dtype=np.uint8)
+        cv2.fillPoly(mask, [points], 1)
+        self._region = ResolvedRegion(polygon=polygon, shape=(height, width), rect=(x, y, x + w, y + h), mask=mask)
+        return self._region
+
+    def crop(self, frame: np.ndarray) -> Tuple[np.ndarray, Optional[ResolvedRegion]]:
+        """Bounding rectangle of the region (a view, not a copy), or the frame itself, and
+        the region to pass to ``restore``"""
+        region = self._resolve(frame.shape)
+        if region is None:
+            return frame, None
+        x1, y1, x2, y2 = region.rect
+        return frame[y1:y2, x1:x2], region
+
+    def restore(self, result, frame: np.ndarray, region: Optional[ResolvedRegion]):
+        """Map a detector result computed on a crop of ``frame`` back to ``frame`` and drop
+        detections outside the polygon of ``region``, the one returned by ``crop``. The
+        result is updated in place and returned."""
+        if region is None:
+            return result
+        x1, y1, _, _ = region.rect
+        data = result.boxes.data.clone()
+        data[:, [0, 2]] += x1
+        data[:, [1, 3]] += y1
+
+        boxes = data[:, :4].cpu().numpy()
+        height, width = region.shape
+        cx = np.clip(((boxes[:, 0] + boxes[:, 2]) / 2).astype(np.int32), 0, width - 1)
+        cy = np.clip(((boxes[:, 1] + boxes[:, 3]) / 2).astype(np.int32), 0, height - 1)
+        keep = region.mask[cy, cx].astype(bool)
+        self.detections_kept += int(keep.sum())
+        self.detections_dropped += int(len(keep) - keep.sum())
+
+        result.orig_img = frame
+        result.orig_shape = frame.shape[:2]
+        result.update(boxes=data[torch.from_numpy(keep).to(data.device)])
+        return result
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Detections kept and dropped by the region"""
+        stats = {
+            "enabled": self.enabled,
+            "detections_kept": self.detections_kept,
+            "detections_dropped": self.detections_dropped,
+        }
+        region = self._region
+        if region is not None and region.polygon is self.polygon:
+            x1, y1, x2, y2 = region.rect
+            stats["crop_ratio"] = (x2 - x1) * (y2 - y1) / (region.shape[0] * region.shape[1])
+        return stats
+
+    def to_config(self) -> Optional[List[List[float]]]:
+        return self.polygon.tolist() if self.polygon is not None else None
@@ -1,14 +1,145 @@
-from typing import List, Union
+from typing import Dict, List, Optional, Union
+from pathlib import Path
+import shutil
 import sys
 import os
 import numpy as np
+from loguru import logger
+from ultralytics import YOLO
 
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../..")))
 
+# Inference backends of the detector -> ultralytics export format
+DETECT_BACKENDS = {"torch": None, "onnx": "onnx", "openvino": "openvino"}
+DETECT_PRECISIONS = ("fp32", "int8")
+
+
+def exported_model_path(weight_path: str, backend: str, imgsz: int, batch: int, precision: str = "fp32") -> Path:
+    """Location of the exported model for one backend, input shape and precision, next to the .pt weights"""
+    weight = Path(weight_path)
+    shape = f"b{batch}" if batch > 0 else "dyn"
+    stem = f"{weight.stem}_{shape}_{imgsz}"
+    if precision != "fp32":
+        stem = f"{stem}_{precision}"
+    if backend == "onnx":
+        return weight.with_name(f"{stem}.onnx")
+    if backend == "openvino":
+        # ultralytics recognizes OpenVINO models by the "_openvino_model" directory suffix
+        return weight.with_name(f"{stem}_openvino_model")
+    raise ValueError(f"Unknown detector backend: {backend}")
+
+
+def export_detector(weight_path: str, backend: str, imgsz: int = 640, batch: int = 0) -> Path:
+    """
+    Export the PyTorch weights to ONNX or OpenVINO once and return the exported model.
+
+    Args:
+        weight_path: Path to the .pt weights
+        backend: "onnx" or "openvino"
+        imgsz: Square input size of the exported model
+        batch: Fixed batch size of the exported model, 0 for a dynamic batch and image size
+    """
+    target = exported_model_path(weight_path, backend, imgsz, batch)
+    if target.exists():
+        return target
+
+    logger.info(f"Exporting {weight_path} to {backend} (imgsz={imgsz}, batch={batch or 'dynamic'})...")
+    exported = YOLO(weight_path, verbose=False).export(
+        format=DETECT_BACKENDS[backend],
+        imgsz=imgsz,
+        batch=max(1, batch),
+        dynamic=batch <= 0,
+        half=False,
+        simplify=True,
+        verbose=False,
+    )
+    # The export always uses the name of the weights, keep one file per input shape
+    shutil.move(str(exported).rstrip(os.sep), str(target))
+    return target
+
+
 class VehicleDetector:
-    def __init__(self, model):
+    """YOLO detector running on PyTorch, ONNX Runtime or OpenVINO.
+
+    All backends are loaded through ``ultralytics.YOLO``, so ``predict`` returns the same
+    ``Results`` objects (and ``boxes.data`` layout) whatever the backend. Models exported
+    with a fixed batch size only accept full batches, so smaller batches are padded with
+    the last frame and the padded results are dropped.
+    """
+
+    def __init__(self, model, batch_size: int = 0, imgsz: Optional[int] = None, half: bool = False, conf: float = 0.25):
         self.model = model
+        self.batch_size = batch_size  # 0: any batch size
+        self.imgsz = imgsz
+        self.half = half
+        self.conf = conf
+
+    @property
+    def names(self) -> Dict[int, str]:
+        return self.model.names
+
+    def predict(self, frames: Union[np.ndarray, List[np.ndarray]], **kwargs) -> List:
+        """Run the detector on one frame or a list of frames"""
+        kwargs.setdefault("verbose", False)
+        if self.imgsz is not None:
+            kwargs.setdefault("imgsz", self.imgsz)
+        kwargs.setdefault("half", self.half)
+        if isinstance(frames, np.ndarray):
+            if self.batch_size <= 1:
+                return self.model.predict(frames, **kwargs)
+            frames = [frames]
+        elif self.batch_size <= 0:
+            return self.model.predict(frames, **kwargs)
+
+        results = []
+        for start in range(0, len(frames), self.batch_size):
+            chunk = list(frames[start:start + self.batch_size])
+            count = len(chunk)
+            chunk.extend([chunk[-1]] * (self.batch_size - count))
+            results.extend(self.model.predict(chunk, batch=self.batch_size, **kwargs)[:count])
+        return results
+
+    __call__ = predict
 
     def detect(self, origin_frame: Union[np.ndarray, List[np.ndarray]]) -> List:
-        results = self.model(origin_frame, conf=0.25, verbose = False)
-        return results
\ No newline at end of file
+        return self.predict(origin_frame, conf=self.conf)
+
+
+def load_detector(
+    weight_path: str,
+    backend: str = "torch",
+    imgsz: int = 640,
+    batch: int = 0,
+    use_gpu: bool = False,
+    precision: str = "fp32",
+) -> VehicleDetector:
+    """
+    Load and warm up the detector on the given backend, exporting the weights if needed.
+
+    FP16 is only used by the PyTorch backend on GPU; it has no effect on CPU. INT8
+    models need calibration frames and are produced by ``scripts/quantize_detector.py``.
+    """
+    if backend not in DETECT_BACKENDS:
+        raise ValueError(f"Unknown detector backend: {backend}, expected one of {list(DETECT_BACKENDS)}")
+    if precision not in DETECT_PRECISIONS:
+        raise ValueError(f"Unknown detector precision: {precision}, expected one of {list(DETECT_PRECISIONS)}")
+    if precision == "int8" and backend == "torch":
+        raise ValueError("INT8 detector requires the onnx or openvino backend")
+
+    if backend == "torch":
+        detector = VehicleDetector(YOLO(weight_path, verbose=False), half=use_gpu)
+    else:
+        if precision == "fp32":
+            model_path = export_detector(weight_path, backend, imgsz, batch)
+        else:
+            model_path = exported_model_path(weight_path, backend, imgsz, batch, precision)
+            if not model_path.exists():
+                raise FileNotFoundError(
+                    f"{model_path} not found, create it with: python scripts/quantize_detector.py "
+                    f"--backend {backend} --imgsz {imgsz} --batch {batch} --calib-dir <frames>"
+                )
+        detector = VehicleDetector(YOLO(str(model_path), task="detect", verbose=False), batch_size=batch, imgsz=imgsz)
+
+    img = np.zeros((640, 480, 3), dtype=np.uint8)
+    detector.predict([img] * max(1, batch))
+    return detector
@@ -0,0 +1,173 @@
+import heapq
+import itertools
+import time
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+import numpy as np
+from loguru import logger
+from src.config import AppConfig_2
+from src.models.base_model import DetectedResult
+from src.utils import build_detected_result, crop_vehicle, encode_image_to_string
+
+
+@dataclass
+class ViolationEvidence:
+    """One frame of a violating track kept as evidence, not encoded yet"""
+    score: float
+    vehicle_img: np.ndarray
+    violation: Dict[str, Any]
+    detected_at: datetime
+
+
+@dataclass
+class TrackViolation:
+    """Best evidence collected so far for one tracked vehicle"""
+    track_id: int
+    first_seen: float
+    last_seen: int  # frame index
+    frames: int = 0
+    evidence: List[Tuple[float, int, ViolationEvidence]] = field(default_factory=list)  # min-heap on score
+
+
+class ViolationAggregator:
+    """Per-camera aggregation of violations over the lifetime of a track.
+
+    Each frame of a violating vehicle is scored by its no-helmet and plate confidence and
+    its plate quality, and only the best ``top_k`` crops are kept, without encoding them.
+    Once ``top_k`` crops are kept, a new one must beat the worst by ``margin`` (relative)
+    to replace it. A track is
+    finalized when the tracker drops it or ``timeout`` seconds after it was first seen;
+    its evidence is then encoded and output once as results sharing one tracking ID.
+    """
+
+    def __init__(
+        self,
+        camera_id: str = "",
+        top_k: int = AppConfig_2.VIOLATION_TOP_K,
+        timeout: float = AppConfig_2.VIOLATION_TIMEOUT,
+        max_age: int = 30,
+        margin: float = 0.0,
+    ):
+        self.camera_id = camera_id
+        self.top_k = max(1, top_k)
+        self.timeout = timeout
+        self.margin = margin
+        self.max_age = max_age  # frames, only used when alive track IDs are unknown
+        self._tracks: Dict[int, TrackViolation] = {}
+        self._closed: Dict[int, int] = {}  # tracks finalized on timeout -> last seen frame
+        self._frame_index = 0
+        self._counter = itertools.count()
+
+        self.frames_observed = 0
+        self.candidates_total = 0
+        self.evidence_kept = 0
+        self.violations_finalized = 0
+        self.results_emitted = 0
+
+    def observe(self, frame: np.ndarray, violations: List[Dict[str, Any]]) -> None:
+        """Add the violations found on one frame (see extract_violations)"""
+        self._frame_index += 1
+        self.frames_observed += 1
+        now = time.time()
+        for violation in violations:
+            track_id = violation["vehicle_id"]
+            if track_id in self._closed:
+                self._closed[track_id] = self._frame_index
+                continue
+
+            track = self._tracks.get(track_id)
+            if track is None:
+                track = self._tracks[track_id] = TrackViolation(track_id=track_id, first_seen=now, last_seen=self._frame_index)
+            track.last_seen = self._frame_index
+            track.frames += 1
+            self.candidates_total += 1
+
+            score = violation["nohelmet_conf"] + violation["plate_conf"] + violation.get("plate_quality", 0.0)
+            if len(track.evidence) >= self.top_k and score <= track.evidence[0][0] * (1.0 + self.margin):
+                continue
+            # Copy the crop only when it makes the top-k, the frame buffer is reused
+            evidence = ViolationEvidence(
+                score=score,
+                vehicle_img=crop_vehicle(frame, violation["vehicle_bbox"]).copy(),
+                violation=violation,
+                detected_at=datetime.now(),
+            )
+            entry = (score, next(self._counter), evidence)
+            if len(track.evidence) < self.top_k:
+                heapq.heappush(track.evidence, entry)
+            else:
+                heapq.heapreplace(track.evidence, entry)
+            self.evidence_kept += 1
+
+    def collect(self, alive_track_ids: Optional[Iterable[int]] = None) -> List[DetectedResult]:
+        """Finalize tracks that ended or timed out and return their results.
+
+        Args:
+            alive_track_ids: IDs of tracks still held by the tracker. When None, tracks
+                unseen for more than ``max_age`` frames are considered ended.
+        """
+        alive = set(alive_track_ids) if alive_track_ids is not None else None
+
+        def has_ended(last_seen: int, track_id: int) -> bool:
+            if alive is not None:
+                return track_id not in alive
+            return self._frame_index - last_seen > self.max_age
+
+        now = time.time()
+        finished = []
+        for track_id, track in list(self._tracks.items()):
+            ended = has_ended(track.last_seen, track_id)
+            if ended or now - track.first_seen >= self.timeout:
+                del self._tracks[track_id]
+                finished.append(track)
+                if not ended:
+                    # Ignore the rest of this track, it was already reported
+                    self._closed[track_id] = track.last_seen
+
+        for track_id, last_seen in list(self._closed.items()):
+            if has_ended(last_seen, track_id):
+                del self._closed[track_id]
+
+        return [result for track in finished for result in self._finalize(track)]
+
+    def flush(self) -> List[DetectedResult]:
+        """Finalize every pending track, e.g. when the camera is removed"""
+        finished = list(self._tracks.values())
+        self._tracks.clear()
+        self._closed.clear()
+        return [result for track in finished for result in self._finalize(track)]
+
+    def _finalize(self, track: TrackViolation) -> List[DetectedResult]:
+        """Encode the best evidence of a track, best first"""
+        evidence = [entry[2] for entry in sorted(track.evidence, key=lambda entry: entry[0], reverse=True)]
+        if not evidence:
+            return []
+        # All results of a track share the tracking ID of its first evidence
+        first_detected = min(item.detected_at for item in evidence)
+        results = []
+        for item in evidence:
+            result = build_detected_result(
+                item.violation,
+                encode_image_to_string(item.vehicle_img),
+                camera_id=self.camera_id,
+                detected_at=item.detected_at,
+            )
+            result.vehicle_id = f"{first_detected.strftime('%Y-%m-%d')}_id_{track.track_id}"
+            results.append(result)
+        self.violations_finalized += 1
+        self.results_emitted += len(results)
+        logger.debug(f"Violation finalized for track {track.track_id} on {self.camera_id}: "
+                     f"{len(results)} evidence from {track.frames} frames")
+        return results
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Aggregation counters of this camera"""
+        return {
+            "pending_tracks": len(self._tracks),
+            "frames_observed": self.frames_observed,
+            "candidates_total": self.candidates_total,
+            "evidence_kept": self.evidence_kept,
+            "violations_finalized": self.violations_finalized,
+            "results_emitted": self.results_emitted,
+        }
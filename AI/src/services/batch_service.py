@@ -0,0 +1,203 @@
+# src/services/batch_service.py
+import asyncio
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, Deque, Dict, List, Optional
+import numpy as np
+from loguru import logger
+from src.models.base_model import DeviceDetection, FrameData
+from src.modules.ai_service import recognize_plates
+from src.config import AppConfig_2 as AppConfig
+
+
+@dataclass
+class BatchItem:
+    """A frame waiting for batched detection, with the AI service of its camera"""
+    service: Any
+    frame_data: FrameData
+    future: asyncio.Future
+    enqueued_at: float = field(default_factory=time.time)
+
+
+class DynamicBatcher:
+    """Gather frames from all camera streams and run the detector once per batch.
+
+    The first queued frame opens a window of ``batch_window`` seconds. Every frame
+    submitted inside that window is added to the batch, up to ``max_batch_size``
+    frames. The whole batch goes through a single ``predict`` call and each result
+    is handed back to the ``AIService`` of its camera for tracking and post-processing.
+    Plate crops of all frames in the batch are then recognized with one OCR batch.
+    """
+
+    def __init__(
+        self,
+        detector=None,  # ModelPool of detectors
+        plate_recognizer=None,
+        max_batch_size: int = AppConfig.BATCH_MAX_SIZE,
+        batch_window: float = AppConfig.BATCH_WINDOW,
+        stats_window: int = AppConfig.BATCH_STATS_WINDOW,
+    ):
+        self.detector = detector
+        self.plate_recognizer = plate_recognizer
+        self.max_batch_size = max(1, max_batch_size)
+        self.batch_window = max(0.0, batch_window)
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+
+        # Rolling statistics
+        self._latencies: Deque[float] = deque(maxlen=stats_window)
+        self._wait_times: Deque[float] = deque(maxlen=stats_window)
+        self._sizes: Deque[int] = deque(maxlen=stats_window)
+        self.batches_total = 0
+        self.frames_total = 0
+        self.errors_total = 0
+
+    async def submit(self, service, frame_data: FrameData) -> Optional[DeviceDetection]:
+        """Queue a frame for batched processing and wait for its result"""
+        self._ensure_worker()
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put(BatchItem(service=service, frame_data=frame_data, future=future))
+        return await future
+
+    def _ensure_worker(self) -> None:
+        """Start the batching loop on the running event loop if it is not running yet"""
+        if self._queue is None:
+            self._queue = asyncio.Queue()
+        if self._worker is None or self._worker.done():
+            self._worker = asyncio.create_task(self._run())
+
+    async def _collect_batch(self) -> List[BatchItem]:
+        """Wait for a first frame, then gather more until the window closes or the batch is full"""
+        loop = asyncio.get_running_loop()
+        batch = [await self._queue.get()]
+        deadline = loop.time() + self.batch_window
+        while len(batch) < self.max_batch_size:
+            # Take whatever is already queued without waiting
+            if not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+                continue
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout=timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self) -> None:
+        """Main batching loop"""
+        while True:
+            try:
+                batch = await self._collect_batch()
+            except asyncio.CancelledError:
+                break
+            # Drop frames whose caller stopped waiting
+            batch = [item for item in batch if not item.future.done()]
+            if batch:
+                await self._dispatch(batch)
+
+    async def _dispatch(self, batch: List[BatchItem]) -> None:
+        """Run one batch in a worker thread and resolve the futures of its frames"""
+        dispatch_time = time.time()
+        try:
+            outputs = await asyncio.to_thread(
+                self.process_batch,
+                [item.service for item in batch],
+                [item.frame_data["frame"] for item in batch],
+            )
+        except Exception as e:
+            self.errors_total += 1
+            logger.error(f"Batch processing error ({len(batch)} frames): {str(e)}")
+            for item in batch:
+                if not item.future.done():
+                    item.future.set_exception(e)
+            return
+
+        latency = time.time() - dispatch_time
+        self._record_batch(len(batch), latency, [dispatch_time - item.enqueued_at for item in batch])
+        for item, output in zip(batch, outputs):
+            if not item.future.done():
+                item.future.set_result(output)
+
+    def process_batch(self, services: List[Any], frames: List[np.ndarray]) -> List[Optional[DeviceDetection]]:
+        """Detect objects on all frames with one predict call, track each frame with the AI
+        service of its own camera, then recognize the plates of the whole batch together"""
+        if self.detector is None or self.plate_recognizer is None:
+            raise RuntimeError("No detector or plate recognizer attached to the batcher")
+
+        detect_start = time.time()
+        # Only the region of interest of each camera goes through the detector
+        crops = [service.roi.crop(frame) for service, frame in zip(services, frames)]
+        with self.detector.acquire() as detector:
+            detection_results = detector.predict([crop for crop, _ in crops], verbose=False)
+        for service, frame, result, (_, region) in zip(services, frames, detection_results, crops):
+            service.roi.restore(result, frame, region)
+        detect_time = time.time() - detect_start
+
+        contexts = [
+            service.prepare_frame(frame, [result], detect_time=detect_time / len(frames))
+            for service, frame, result in zip(services, frames, detection_results)
+        ]
+        
+        # One OCR batch for the plates of every frame
+        try:
+            recognize_plates(self.plate_recognizer, [ctx for ctx in contexts if ctx is not None])
+        except Exception as e:
+            logger.error(f"Batch plate recognition error: {str(e)}")
+        
+        return [
+            service.finish_frame(ctx, verbose=True) if ctx is not None else None
+            for service, ctx in zip(services, contexts)
+        ]
+
+    def _record_batch(self, size: int, latency: float, wait_times: List[float]) -> None:
+        """Update rolling batch statistics"""
+        self.batches_total += 1
+        self.frames_total += size
+        self._sizes.append(size)
+        self._latencies.append(latency)
+        self._wait_times.extend(wait_times)
+        logger.debug(
+            f"Batch {self.batches_total}: {size}/{self.max_batch_size} frames, "
+            f"latency {latency:.3f}s, occupancy {size / self.max_batch_size:.0%}"
+        )
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Rolling per-batch latency and occupancy statistics"""
+        stats = {
+            "max_batch_size": self.max_batch_size,
+            "batch_window": self.batch_window,
+            "batches_total": self.batches_total,
+            "frames_total": self.frames_total,
+            "errors_total": self.errors_total,
+            "queue_depth": self._queue.qsize() if self._queue is not None else 0,
+        }
+        if self._sizes:
+            sizes = np.array(self._sizes, dtype=np.float32)
+            latencies = np.array(self._latencies, dtype=np.float32)
+            stats.update({
+                "avg_batch_size": float(sizes.mean()),
+                "avg_occupancy": float(sizes.mean() / self.max_batch_size),
+                "latency_p50": float(np.percentile(latencies, 50)),
+                "latency_p95": float(np.percentile(latencies, 95)),
+                "latency_max": float(latencies.max()),
+                "queue_wait_p95": float(np.percentile(np.array(self._wait_times), 95)),
+            })
+        return stats
+
+    async def shutdown(self) -> None:
+        """Stop the batching loop and fail frames that are still queued"""
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+        if self._queue is not None:
+            while not self._queue.empty():
+                item = self._queue.get_nowait()
+                if not item.future.done():
+                    item.future.cancel()
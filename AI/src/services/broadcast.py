@@ -0,0 +1,72 @@
+# src/services/broadcast.py
+import asyncio
+from typing import Any, AsyncGenerator, Dict, Optional, Tuple
+
+
+class FrameHub:
+    """Latest JPEG of one stream, shared by all of its MJPEG viewers.
+
+    Every published frame gets a new version. Viewers wait on a condition for a version
+    newer than the one they sent last, so an unchanged frame is never sent twice and a
+    frame is encoded once however many viewers there are. A slow viewer only ever gets
+    the newest frame: the versions it missed are counted as skipped, nothing is queued.
+    """
+
+    def __init__(self):
+        self._condition = asyncio.Condition()
+        self.frame: Optional[bytes] = None
+        self.version = 0
+        self.closed = False
+
+        self.viewers = 0
+        self.frames_published = 0
+        self.frames_sent = 0
+        self.frames_skipped = 0  # versions a viewer never saw because it was busy sending
+
+    async def publish(self, frame: bytes) -> int:
+        """Replace the current frame and wake up the viewers, return the new version"""
+        async with self._condition:
+            self.frame = frame
+            self.version += 1
+            self.frames_published += 1
+            self._condition.notify_all()
+            return self.version
+
+    async def wait_next(self, after_version: int) -> Tuple[int, Optional[bytes]]:
+        """Wait for a version newer than ``after_version``, the frame is None once the hub is closed"""
+        async with self._condition:
+            await self._condition.wait_for(lambda: self.version > after_version or self.closed)
+            if self.closed:
+                return after_version, None
+            if after_version:
+                self.frames_skipped += self.version - after_version - 1
+            self.frames_sent += 1
+            return self.version, self.frame
+
+    async def subscribe(self) -> AsyncGenerator[bytes, None]:
+        """Frames of the stream as they are published, starting with the current one"""
+        version = 0
+        self.viewers += 1
+        try:
+            while True:
+                version, frame = await self.wait_next(version)
+                if frame is None:
+                    return
+                yield frame
+        finally:
+            self.viewers -= 1
+
+    async def close(self) -> None:
+        """End every subscription, used when the stream is removed"""
+        async with self._condition:
+            self.closed = True
+            self._condition.notify_all()
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "version": self.version,
+            "viewers": self.viewers,
+            "frames_published": self.frames_published,
+            "frames_sent": self.frames_sent,
+            "frames_skipped": self.frames_skipped,
+        }
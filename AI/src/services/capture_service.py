@@ -0,0 +1,111 @@
+# src/services/capture_service.py
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, Optional
+import cv2
+import numpy as np
+from loguru import logger
+from src.config import AppConfig_2 as AppConfig
+
+
+@dataclass(frozen=True)
+class CapturedFrame:
+    """A decoded frame with the time it was read from the stream"""
+    frame: np.ndarray
+    timestamp: float
+    seq: int
+
+
+class CaptureWorker(threading.Thread):
+    """Dedicated reader thread for one ``cv2.VideoCapture``.
+
+    The thread keeps draining the stream so the RTSP buffer never fills up and
+    publishes only the newest frame into a single slot. The slot is replaced by
+    plain reference assignment, so neither the reader nor the consumer takes a lock.
+    """
+
+    def __init__(
+        self,
+        url: str,
+        capture: cv2.VideoCapture,
+        max_read_failures: int = AppConfig.CAPTURE_MAX_READ_FAILURES,
+        retry_delay: float = AppConfig.CAPTURE_RETRY_DELAY,
+    ):
+        super().__init__(name=f"capture-{url}", daemon=True)
+        self.url = url
+        self.capture = capture
+        self.max_read_failures = max_read_failures
+        self.retry_delay = retry_delay
+        self._slot: Optional[CapturedFrame] = None
+        self._stop_event = threading.Event()
+        self._seq = 0
+        self._taken_seq = 0
+
+        # Counters, each written by a single thread
+        self.frames_read = 0
+        self.frames_dropped = 0  # replaced in the slot before being taken (reader thread)
+        self.frames_stale = 0  # taken but too old to be analysed (consumer)
+        self.read_failures = 0  # consecutive failed reads (reader thread)
+        self.last_error: Optional[str] = None
+        self.capture_fps = 0.0
+
+    def run(self) -> None:
+        """Read frames until stopped or until the stream keeps failing"""
+        last_read = None
+        try:
+            while not self._stop_event.is_set():
+                ret, frame = self.capture.read()
+                if not ret or frame is None:
+                    self.read_failures += 1
+                    self.last_error = "Failed to read frame"
+                    if self.read_failures >= self.max_read_failures:
+                        logger.warning(f"Capture thread for {self.url} stopped after {self.read_failures} failed reads")
+                        break
+                    self._stop_event.wait(self.retry_delay)
+                    continue
+
+                now = time.time()
+                self.read_failures = 0
+                self._seq += 1
+                previous = self._slot
+                self._slot = CapturedFrame(frame=frame, timestamp=now, seq=self._seq)
+                if previous is not None and previous.seq > self._taken_seq:
+                    self.frames_dropped += 1
+                self.frames_read += 1
+
+                # Exponential moving average of the capture rate
+                if last_read is not None and now > last_read:
+                    self.capture_fps = 0.9 * self.capture_fps + 0.1 / (now - last_read)
+                last_read = now
+        except Exception as e:
+            self.last_error = str(e)
+            logger.error(f"Capture thread error for {self.url}: {str(e)}")
+        finally:
+            self.capture.release()
+
+    def take(self) -> Optional[CapturedFrame]:
+        """Return the newest frame if it has not been taken yet, without blocking"""
+        slot = self._slot
+        if slot is None or slot.seq <= self._taken_seq:
+            return None
+        self._taken_seq = slot.seq
+        return slot
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        """Ask the reader thread to stop; the capture is released by the thread itself"""
+        self._stop_event.set()
+        if timeout is not None and self.is_alive() and threading.current_thread() is not self:
+            self.join(timeout)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Capture counters for this camera"""
+        return {
+            "alive": self.is_alive(),
+            "frames_read": self.frames_read,
+            "frames_dropped": self.frames_dropped,
+            "frames_stale": self.frames_stale,
+            "read_failures": self.read_failures,
+            "capture_fps": round(self.capture_fps, 2),
+            "last_error": self.last_error,
+        }
@@ -0,0 +1,187 @@
+# src/services/metrics.py
+import bisect
+import math
+import threading
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+from urllib.parse import urlsplit, urlunsplit
+from loguru import logger
+
+# Upper bounds of the latency histograms, in seconds
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+BATCH_SIZE_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200)
+STAGES = ("detect", "track", "mapping", "plate", "visualize", "json")
+
+# (name, type, help, [(labels, value)]) returned by collectors at scrape time
+MetricFamily = Tuple[str, str, str, List[Tuple[Dict[str, str], float]]]
+
+
+def camera_label(url: str) -> str:
+    """Camera URL without its credentials, usable as a metric label"""
+    parts = urlsplit(url)
+    if parts.username is None and parts.password is None:
+        return url
+    host = parts.hostname or ""
+    if parts.port:
+        host = f"{host}:{parts.port}"
+    return urlunsplit((parts.scheme, host, parts.path, parts.query, parts.fragment))
+
+
+def _escape(value: Any) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels: Dict[str, Any]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in labels.items()) + "}"
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class Counter:
+    """Monotonic counter with optional labels"""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0, *labels: str) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def remove(self, *labels: str) -> None:
+        with self._lock:
+            self._values.pop(labels, None)
+
+    def total(self) -> float:
+        """Sum over all label values"""
+        with self._lock:
+            return sum(self._values.values())
+
+    def render(self) -> List[str]:
+        with self._lock:
+            values = list(self._values.items())
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        for labels, value in values:
+            lines.append(f"{self.name}{_format_labels(dict(zip(self.labelnames, labels)))} {_format_value(value)}")
+        return lines
+
+
+class Histogram:
+    """Histogram with fixed buckets; an observation is one bisect and two additions"""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series: Dict[Tuple[str, ...], List[float]] = {}  # per bucket counts, +Inf count, sum
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labels: str) -> None:
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[index] += 1
+            series[-1] += value
+
+    def remove(self, *labels: str) -> None:
+        with self._lock:
+            self._series.pop(labels, None)
+
+    def render(self) -> List[str]:
+        with self._lock:
+            series = [(labels, list(values)) for labels, values in self._series.items()]
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        for labels, values in series:
+            label_dict = dict(zip(self.labelnames, labels))
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), values[:-1]):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{_format_labels({**label_dict, 'le': _format_value(bound)})} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(label_dict)} {_format_value(values[-1])}")
+            lines.append(f"{self.name}_count{_format_labels(label_dict)} {cumulative}")
+        return lines
+
+
+class MetricsRegistry:
+    """Process-wide metrics in the Prometheus text format.
+
+    Hot-path metrics (stage latencies, OCR calls, upload batch sizes) are recorded as
+    they happen. Gauges such as capture FPS or queue depths are read from the existing
+    ``get_stats`` counters by collectors when ``/metrics`` is scraped, so they cost
+    nothing between scrapes.
+    """
+
+    def __init__(self):
+        self.stage_latency = Histogram(
+            "ai_stage_latency_seconds", "Processing time of one frame per pipeline stage", ("camera", "stage"))
+        self.frames = Counter(
+            "ai_frames_total", "Frames analysed, by result (detected, skipped by the motion gate or predicted between keyframes)", ("camera", "result"))
+        self.ocr_calls = Counter("ai_ocr_calls_total", "Batched OCR calls")
+        self.ocr_plates = Counter("ai_ocr_plates_total", "Plate crops sent to OCR")
+        self.upload_batch_size = Histogram(
+            "ai_upload_batch_size", "Violations per upload request", buckets=BATCH_SIZE_BUCKETS)
+        self._collectors: List[Callable[[], Iterable[MetricFamily]]] = []
+
+    def observe_frame(self, camera: str, timings: Dict[str, float], skipped: bool = False, predicted: bool = False) -> None:
+        """Record the stage timings of one finished frame"""
+        self.frames.inc(1, camera, "skipped" if skipped else "predicted" if predicted else "detected")
+        if skipped or predicted:
+            return
+        for stage in STAGES:
+            if stage in timings:
+                self.stage_latency.observe(timings[stage], camera, stage)
+
+    def forget_camera(self, camera: str) -> None:
+        """Drop the series of a removed camera"""
+        for stage in STAGES:
+            self.stage_latency.remove(camera, stage)
+        for result in ("detected", "skipped", "predicted"):
+            self.frames.remove(camera, result)
+
+    def register_collector(self, collector: Callable[[], Iterable[MetricFamily]]) -> None:
+        self._collectors.append(collector)
+
+    def unregister_collector(self, collector: Callable[[], Iterable[MetricFamily]]) -> None:
+        if collector in self._collectors:
+            self._collectors.remove(collector)
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in (self.stage_latency, self.frames, self.ocr_calls, self.ocr_plates, self.upload_batch_size):
+            lines.extend(metric.render())
+        for collector in list(self._collectors):
+            try:
+                families = list(collector())
+            except Exception as e:
+                logger.error(f"Metrics collector failed: {str(e)}")
+                continue
+            for name, kind, documentation, samples in families:
+                lines.append(f"# HELP {name} {documentation}")
+                lines.append(f"# TYPE {name} {kind}")
+                lines.extend(f"{name}{_format_labels(labels)} {_format_value(value)}" for labels, value in samples)
+        return "\n".join(lines) + "\n"
+
+
+_metrics: Optional[MetricsRegistry] = None
+_metrics_lock = threading.Lock()
+
+
+def get_metrics() -> MetricsRegistry:
+    """Process-wide metrics registry"""
+    global _metrics
+    if _metrics is None:
+        with _metrics_lock:
+            if _metrics is None:
+                _metrics = MetricsRegistry()
+    return _metrics
@@ -0,0 +1,148 @@
+# src/services/outbox.py
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Tuple
+from loguru import logger
+from src.config import AppConfig_2 as AppConfig
+
+
+class ViolationOutbox:
+    """Append-only SQLite outbox of violations that could not be delivered to the backend.
+
+    Each row holds one violation payload. Rows are appended when an upload fails or
+    while the backend is known to be down, read back oldest first by the drainer and
+    deleted once the backend accepted them. The outbox is capped in rows and payload
+    bytes; beyond the caps the oldest violations are evicted, and free pages are
+    returned to the file system with incremental vacuum.
+    """
+
+    def __init__(
+        self,
+        path: str = AppConfig.OUTBOX_PATH,
+        max_rows: int = AppConfig.OUTBOX_MAX_ROWS,
+        max_bytes: int = AppConfig.OUTBOX_MAX_BYTES,
+    ):
+        self.path = path
+        self.max_rows = max(1, max_rows)
+        self.max_bytes = max(1, max_bytes)
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        # auto_vacuum only applies to a new database, it must be set before any table
+        self._conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS violations ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, "
+            "created_at REAL NOT NULL, "
+            "size INTEGER NOT NULL, "
+            "payload TEXT NOT NULL)"
+        )
+        self._rows, self._bytes = self._conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM violations"
+        ).fetchone()
+
+        self.appended = 0
+        self.acked = 0
+        self.evicted = 0
+        self.compactions = 0
+        if self._rows:
+            logger.info(f"Violation outbox {path} holds {self._rows} violations to replay")
+
+    def __len__(self) -> int:
+        return self._rows
+
+    def append(self, items: List[Dict[str, Any]]) -> None:
+        """Store violation payloads, evicting the oldest ones beyond the caps"""
+        if not items:
+            return
+        rows = []
+        now = time.time()
+        for item in items:
+            payload = json.dumps(item)
+            rows.append((now, len(payload), payload))
+        with self._lock:
+            with self._conn:
+                self._conn.executemany("INSERT INTO violations (created_at, size, payload) VALUES (?, ?, ?)", rows)
+            self._rows += len(rows)
+            self._bytes += sum(row[1] for row in rows)
+            self.appended += len(rows)
+            self._enforce_caps()
+
+    def peek(self, limit: int) -> List[Tuple[int, Dict[str, Any]]]:
+        """Return up to ``limit`` of the oldest violations as (row id, payload)"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, payload FROM violations ORDER BY id LIMIT ?", (limit,)
+            ).fetchall()
+        return [(row_id, json.loads(payload)) for row_id, payload in rows]
+
+    def ack(self, row_ids: List[int]) -> None:
+        """Delete violations that were delivered (or rejected for good) by the backend"""
+        if not row_ids:
+            return
+        with self._lock:
+            self._delete("WHERE id IN ({})".format(",".join("?" * len(row_ids))), row_ids)
+            self.acked += len(row_ids)
+            self._compact()
+
+    def _delete(self, where: str, params: List[Any]) -> int:
+        with self._conn:
+            size = self._conn.execute(f"SELECT COUNT(*), COALESCE(SUM(size), 0) FROM violations {where}", params).fetchone()
+            self._conn.execute(f"DELETE FROM violations {where}", params)
+        self._rows -= size[0]
+        self._bytes -= size[1]
+        return size[0]
+
+    def _enforce_caps(self) -> None:
+        evicted = 0
+        if self._rows > self.max_rows:
+            excess = self._rows - self.max_rows
+            evicted += self._delete(
+                "WHERE id IN (SELECT id FROM violations ORDER BY id LIMIT ?)", [excess]
+            )
+        while self._bytes > self.max_bytes and self._rows:
+            # Drop roughly the share of rows above the byte cap, at least one
+            share = (self._bytes - self.max_bytes) / max(self._bytes, 1)
+            excess = max(1, int(self._rows * share))
+            evicted += self._delete(
+                "WHERE id IN (SELECT id FROM violations ORDER BY id LIMIT ?)", [excess]
+            )
+        if evicted:
+            self.evicted += evicted
+            logger.warning(f"Violation outbox full, evicted {evicted} oldest violations")
+            self._compact()
+
+    def _compact(self) -> None:
+        """Give free pages back to the file system once they make up a large part of the file"""
+        page_count = self._conn.execute("PRAGMA page_count").fetchone()[0]
+        freelist = self._conn.execute("PRAGMA freelist_count").fetchone()[0]
+        if freelist and freelist * 4 >= page_count:
+            self._conn.execute("PRAGMA incremental_vacuum")
+            self._conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+            self.compactions += 1
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Size and throughput counters of the outbox"""
+        with self._lock:
+            page_size = self._conn.execute("PRAGMA page_size").fetchone()[0]
+            page_count = self._conn.execute("PRAGMA page_count").fetchone()[0]
+        return {
+            "rows": self._rows,
+            "payload_bytes": self._bytes,
+            "file_bytes": page_size * page_count,
+            "appended": self.appended,
+            "acked": self.acked,
+            "evicted": self.evicted,
+            "compactions": self.compactions,
+        }
@@ -0,0 +1,163 @@
+# src/services/result_store.py
+import base64
+import json
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, AsyncGenerator, Deque, Dict, Optional, Tuple
+from src.config import AppConfig_2 as AppConfig
+from src.services.broadcast import FrameHub
+
+try:
+    import orjson
+except ImportError:  # optional, the standard library encoder is used without it
+    orjson = None
+
+
+def dumps(obj: Any) -> bytes:
+    """Compact JSON, encoded with orjson when it is installed"""
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, separators=(",", ":")).encode()
+
+
+def lean_violation(result, include_frames: bool = False) -> Dict[str, Any]:
+    """A DetectedResult as plain JSON, without its base64 evidence crop unless frames are requested"""
+    data = result.to_dict()
+    data["violation"] = getattr(data["violation"], "value", data["violation"])
+    if not include_frames:
+        data.pop("image", None)
+    return data
+
+
+@dataclass
+class CameraResults:
+    """Violations of one camera with the version they were published at"""
+    camera_id: str  # URL
+    history: int
+    version: int = 0  # version of the latest violations, 0 before the first one
+    time: Optional[float] = None
+    post_frame: Optional[bytes] = None  # latest preview, only served with include_frames
+    evicted_version: int = 0  # versions up to this one may have dropped out of the history
+    violations: Deque[Tuple[int, Any]] = field(default_factory=deque)
+
+    def add(self, version: int, result) -> None:
+        if len(self.violations) >= self.history:
+            self.evicted_version = self.violations.popleft()[0]
+        self.violations.append((version, result))
+
+
+class ResultStore:
+    """Versioned results of every stream for ``/result`` polls and the results WebSocket.
+
+    Every frame that finalizes violations publishes them under a new version taken from a
+    single counter, so the version of each camera only grows and a client can ask for
+    everything newer than the last version it saw. Responses carry no frame bytes or crops
+    unless asked for, and lean responses are serialized once per version and ``since``.
+    """
+
+    def __init__(self, history: int = AppConfig.RESULT_HISTORY, cache_size: int = 64):
+        self.history = history
+        self.cache_size = cache_size
+        self.version = 0
+        self.time = time.time()
+        self.cameras: Dict[str, CameraResults] = {}  # stream_id -> results
+        self.hub = FrameHub()  # its version follows self.version, the payload is the delta of that version
+        self._cache: Dict[Tuple[Optional[int], Optional[str]], bytes] = {}
+
+    async def update(self, stream_id: str, detection, now: float) -> None:
+        """Record the output of one frame, publish a new version when it has violations"""
+        camera = self.cameras.get(stream_id)
+        if camera is None:
+            camera = self.cameras[stream_id] = CameraResults(detection.camera_id, self.history)
+        if detection.post_frame is not None:
+            camera.post_frame = detection.post_frame
+        if not detection.detected_result:
+            return
+
+        self.version += 1
+        self.time = now
+        camera.version = self.version
+        camera.time = now
+        for result in detection.detected_result:
+            camera.add(self.version, result)
+        self._cache.clear()
+        await self.hub.publish(self.delta_json(self.version - 1))
+
+    def remove(self, stream_id: str) -> None:
+        if self.cameras.pop(stream_id, None) is not None:
+            self._cache.clear()
+
+    def delta(self, since: Optional[int] = None, include_frames: bool = False, stream_id: Optional[str] = None) -> Dict[str, Any]:
+        """Results newer than ``since``, or the latest violations of every camera when it is None.
+
+        ``truncated`` is set on a camera whose history no longer reaches back to ``since``.
+        """
+        device_list = []
+        for sid, camera in self.cameras.items():
+            if stream_id is not None and sid != stream_id:
+                continue
+            if since is None:
+                violations = [result for version, result in camera.violations if version == camera.version]
+            elif camera.version > since:
+                violations = [result for version, result in camera.violations if version > since]
+            else:
+                continue
+            entry = {
+                "stream_id": sid,
+                "camera_id": camera.camera_id,
+                "version": camera.version,
+                "time": camera.time,
+                "truncated": since is not None and camera.evicted_version > since,
+                "detected_result": [lean_violation(result, include_frames) for result in violations],
+            }
+            if include_frames:
+                entry["post_frame"] = base64.b64encode(camera.post_frame).decode() if camera.post_frame else None
+            device_list.append(entry)
+        return {"version": self.version, "time": self.time, "device_list": device_list}
+
+    def delta_json(self, since: Optional[int] = None, stream_id: Optional[str] = None) -> bytes:
+        """Serialized lean delta, shared by all clients asking for the same version.
+        A ``cache_size`` of 0 serializes on every call."""
+        if self.cache_size <= 0:
+            return dumps(self.delta(since, stream_id=stream_id))
+        key = (since, stream_id)
+        payload = self._cache.get(key)
+        if payload is None:
+            if len(self._cache) >= self.cache_size:
+                self._cache.clear()
+            payload = self._cache[key] = dumps(self.delta(since, stream_id=stream_id))
+        return payload
+
+    async def changes(self, since: int = 0) -> AsyncGenerator[bytes, None]:
+        """Lean deltas for a push client, starting after version ``since``.
+
+        A client that kept up is sent the delta published with each version. One that fell
+        behind gets a single delta covering every version it missed.
+        """
+        if since > self.version:
+            since = 0  # version of a previous run of the service
+        sent = since
+        self.hub.viewers += 1
+        try:
+            if self.version > sent:
+                sent = self.version
+                yield self.delta_json(since)
+            while True:
+                version, payload = await self.hub.wait_next(sent)
+                if payload is None:
+                    return
+                yield payload if version == sent + 1 else self.delta_json(sent)
+                sent = version
+        finally:
+            self.hub.viewers -= 1
+
+    async def close(self) -> None:
+        await self.hub.close()
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "version": self.version,
+            "push_clients": self.hub.viewers,
+            "violations": {sid: len(camera.violations) for sid, camera in self.cameras.items()},
+        }
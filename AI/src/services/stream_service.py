@@ -7,9 +7,17 @@ import cv2
 import numpy as np
 from loguru import logger
 from src.modules.ai_service import AI_Service, DeviceDetection, AIService
-from src.models.schema import FrameData, AIResult
+from src.models.base_model import FrameData
+from src.services.batch_service import DynamicBatcher
+from src.services.broadcast import FrameHub
+from src.services.capture_service import CaptureWorker, CapturedFrame
+from src.services.upload_service import get_violation_uploader
+from src.services.metrics import MetricFamily, get_metrics
+from src.services.result_store import ResultStore, dumps
+from src.services.worker_pool import ProcessWorkerPool
+from src.modules.api_process import build_violation_payload
 from src.config import AppConfig_2 as AppConfig
-from src.utils import compress_frame_to_jpeg
+from src.utils import encode_preview
 
 class StreamError(Exception):
     """Base exception for stream-related errors"""
@@ -29,22 +37,30 @@ class StreamService:
         self.streams = {}  # url -> stream_id mapping
         self.stream_ids = {}  # stream_id -> url mapping
         self.capture_dict = {}  # url -> cv2.VideoCapture
-        self.frames = {}  # stream_id -> latest jpeg frame
-        self.latest_result = None
-        self.latest_results = {}  # stream_id -> latest AI result
+        self.capture_workers: Dict[str, CaptureWorker] = {}  # url -> reader thread
+        self.hubs: Dict[str, FrameHub] = {}  # stream_id -> latest jpeg frame and its MJPEG viewers
+        self.overlay_hubs: Dict[str, FrameHub] = {}  # stream_id -> latest overlay JSON and its WebSocket clients
+        self.annotated_streams = set()  # stream IDs with an annotated frame published
+        self.results = ResultStore()  # versioned violations served by /result and /ws/results
+        self.preview_requests: Dict[str, float] = {}  # stream_id -> time until which /result callers get frames
         self.active = True
         self.processing_interval = AppConfig.PROCESSING_INTERVAL
         self.health_check_interval = AppConfig.HEALTH_CHECK_INTERVAL
         self.max_retry_attempts = AppConfig.MAX_RETRY_ATTEMPTS
         self.retry_cooldown = AppConfig.RETRY_COOLDOWN
         self.rate_limiter = asyncio.Semaphore(AppConfig.MAX_CONCURRENT_PROCESSING)
-        self.frame_capture_timeout = 99999  # seconds
-        self.stream_errors = {}  # url -> {count, last_error, last_time}
+        self.max_frame_age = AppConfig.MAX_FRAME_AGE  # seconds
+        self.stream_errors = {}  # url -> {count, total, last_error, last_time}
+        self.batcher = DynamicBatcher()  # shared across all streams
+        # In process mode camera pipelines run in worker processes instead of self.ai_services
+        self.worker_pool = ProcessWorkerPool() if AppConfig.EXECUTION_MODE == "process" else None
+        self.uploader = get_violation_uploader()  # shared with app.py
+        self.metrics = get_metrics()
+        self.metrics.register_collector(self._collect_metrics)
         
         # Locks for thread safety
         self._streams_lock = asyncio.Lock()
         self._results_lock = asyncio.Lock()
-        self._frames_lock = asyncio.Lock()
         self._errors_lock = asyncio.Lock()
     
     async def add_stream(self, url: str) -> Tuple[str, str]:
@@ -59,7 +75,20 @@ class StreamService:
             
             # Initialize AI service for this stream
             try:
+                if self.worker_pool is not None:
+                    await self.worker_pool.add_camera(url, stream_id)
+                    self.streams[url] = stream_id
+                    self.stream_ids[stream_id] = url
+                    self.stream_errors[url] = {"count": 0, "total": 0, "last_error": None, "last_time": None}
+                    self.hubs[stream_id] = FrameHub()
+                    self.overlay_hubs[stream_id] = FrameHub()
+                    logger.info(f"Added camera stream: {url} with ID: {stream_id} on worker {self.worker_pool.assignments[url]}")
+                    return stream_id, f"{AppConfig.HOST_STREAM}{stream_id}"
                 self.ai_services[url] = AIService(url)
+                self.ai_services[url].camera_label = stream_id
+                if self.batcher.detector is None:
+                    self.batcher.detector = self.ai_services[url].vehicle_detector
+                    self.batcher.plate_recognizer = self.ai_services[url].plate_recognizer
             except Exception as e:
                 logger.error(f"Failed to initialize AI service for {url}: {str(e)}")
                 raise StreamError(f"AI service initialization failed: {str(e)}")
@@ -67,7 +96,9 @@ class StreamService:
             # Store mappings
             self.streams[url] = stream_id
             self.stream_ids[stream_id] = url
-            self.stream_errors[url] = {"count": 0, "last_error": None, "last_time": None}
+            self.stream_errors[url] = {"count": 0, "total": 0, "last_error": None, "last_time": None}
+            self.hubs[stream_id] = FrameHub()
+            self.overlay_hubs[stream_id] = FrameHub()
             
             rtsp_stream = f"{AppConfig.HOST_STREAM}{stream_id}"
             logger.info(f"Added camera stream: {url} with ID: {stream_id}")
@@ -75,32 +106,47 @@ class StreamService:
             return stream_id, rtsp_stream
     
     async def initialize_stream(self, url: str) -> bool:
-        """Initialize video capture for the given URL"""
+        """Initialize video capture and its reader thread for the given URL"""
         try:
-            # Release existing capture if any
-            if url in self.capture_dict:
-                self.capture_dict[url].release()
+            # Stop existing reader thread (it releases its capture) if any
+            await self._stop_capture(url)
             
-            capture = cv2.VideoCapture(url)
+            capture = await asyncio.to_thread(cv2.VideoCapture, url)
             if not capture.isOpened():
                 logger.error(f"Failed to open video stream: {url}")
                 return False
             
             # Try to read first frame to confirm connection
-            ret, _ = capture.read()
+            ret, _ = await asyncio.to_thread(capture.read)
             if not ret:
                 capture.release()
                 logger.error(f"Could read first frame from: {url}")
                 return False
                 
             async with self._streams_lock:
+                if url not in self.streams:
+                    # Stream was removed while connecting
+                    capture.release()
+                    return False
+                worker = CaptureWorker(url, capture)
                 self.capture_dict[url] = capture
+                self.capture_workers[url] = worker
+                worker.start()
                 
             logger.info(f"Successfully initialized stream: {url}")
             return True
         except Exception as e:
             logger.error(f"Error initializing stream {url}: {str(e)}")
             return False
+    
+    async def _stop_capture(self, url: str) -> None:
+        """Stop the reader thread of a stream and release its capture"""
+        worker = self.capture_workers.pop(url, None)
+        capture = self.capture_dict.pop(url, None)
+        if worker is not None:
+            await asyncio.to_thread(worker.stop, 2.0)
+        elif capture is not None:
+            capture.release()
             
     async def remove_stream(self, url: str) -> None:
         """Remove a camera stream and release associated resources"""
@@ -111,28 +157,31 @@ class StreamService:
             
             stream_id = self.streams[url]
             
-            # Release video capture if it exists
-            if url in self.capture_dict:
-                self.capture_dict[url].release()
-                del self.capture_dict[url]
+            # Stop reader thread and release video capture if they exist
+            await self._stop_capture(url)
             
-            # Remove AI_Service instance
+            # Upload violations still pending for this camera, then remove AI_Service instance
             if url in self.ai_services:
+                self._upload_violations(url, self.ai_services[url].violation_aggregator.flush())
                 del self.ai_services[url]
+            elif self.worker_pool is not None:
+                self._upload_violations(url, await self.worker_pool.remove_camera(url))
+            self.metrics.forget_camera(stream_id)
             
             # Remove from error tracking
             if url in self.stream_errors:
                 del self.stream_errors[url]
             
-            # Remove frames if they exist
-            async with self._frames_lock:
-                if stream_id in self.frames:
-                    del self.frames[stream_id]
+            # End the MJPEG responses of the stream
+            self.preview_requests.pop(stream_id, None)
+            for hub in (self.hubs.pop(stream_id, None), self.overlay_hubs.pop(stream_id, None)):
+                if hub is not None:
+                    await hub.close()
             
             # Remove results if they exist
             async with self._results_lock:
-                if stream_id in self.latest_results:
-                    del self.latest_results[stream_id]
+                self.annotated_streams.discard(stream_id)
+                self.results.remove(stream_id)
             
             # Remove mappings
             del self.streams[url]
@@ -149,45 +198,36 @@ class StreamService:
         """Check if a stream ID is valid"""
         return stream_id in self.stream_ids
     
-    async def _capture_frame(self, url: str) -> Optional[np.ndarray]:
-        """Capture a single frame from the given URL with timeout"""
-        if url not in self.capture_dict:
+    async def _capture_frame(self, url: str) -> Optional[CapturedFrame]:
+        """Take the newest frame published by the reader thread of the given URL without blocking"""
+        worker = self.capture_workers.get(url)
+        if worker is None:
             logger.warning(f"No capture object for URL: {url}")
             return None
-            
-        capture = self.capture_dict[url]
-        if not capture.isOpened():
-            logger.warning(f"Capture not opened for URL: {url}")
+        
+        if not worker.is_alive():
+            await self._record_stream_error(url, worker.last_error or "Capture thread stopped")
             return None
         
-        try:
-            # Create a task for frame capture with timeout
-            loop = asyncio.get_event_loop()
-            frame_task = loop.run_in_executor(None, lambda: capture.read())
-            ret, frame = await asyncio.wait_for(frame_task, timeout=self.frame_capture_timeout)
-            
-            if not ret or frame is None:
-                await self._record_stream_error(url, "Failed to read frame")
-                return None
-                
-            # Reset error count on successful frame capture
-            await self._reset_stream_error(url)
-            return frame
-            
-        except asyncio.TimeoutError:
-            await self._record_stream_error(url, "Frame capture timeout")
-            logger.warning(f"Timeout while capturing frame from URL: {url}")
+        captured = worker.take()
+        if captured is None:
+            # No new frame since the last tick
             return None
-        except Exception as e:
-            await self._record_stream_error(url, str(e))
-            logger.error(f"Error capturing frame from {url}: {str(e)}")
+        
+        if time.time() - captured.timestamp > self.max_frame_age:
+            worker.frames_stale += 1
             return None
+            
+        # Reset error count on successful frame capture
+        await self._reset_stream_error(url)
+        return captured
     
     async def _record_stream_error(self, url: str, error_msg: str) -> None:
         """Record a stream error for circuit breaker pattern"""
         async with self._errors_lock:
             if url in self.stream_errors:
                 self.stream_errors[url]["count"] += 1
+                self.stream_errors[url]["total"] += 1
                 self.stream_errors[url]["last_error"] = error_msg
                 self.stream_errors[url]["last_time"] = time.time()
     
@@ -209,28 +249,27 @@ class StreamService:
                         # Skip processing this stream temporarily
                         return None
             
-            frame = await self._capture_frame(url)
-            if frame is None:
+            captured = await self._capture_frame(url)
+            if captured is None:
                 return None
+            frame = captured.frame
                 
             # Get stream ID
             stream_id = self.streams.get(url)
             if not stream_id:
                 return None
                 
-            # Compress frame for streaming
-            jpeg_frame = compress_frame_to_jpeg(frame)
-            
-            # Store frame safely
-            async with self._frames_lock:
-                self.frames[stream_id] = jpeg_frame
+            # Viewers get the raw frame until the first annotated frame of the stream is published
+            hub = self.hubs.get(stream_id)
+            if hub is not None and hub.viewers and stream_id not in self.annotated_streams:
+                await hub.publish(encode_preview(frame))
             
             # Create frame data object for AI processing
-            frame_count = int(self.capture_dict[url].get(cv2.CAP_PROP_POS_FRAMES))
             frame_data = FrameData(
                 url=url,
                 frame=frame,
-                frame_count=frame_count
+                frame_count=captured.seq,
+                timestamp=captured.timestamp
             )
             
             return frame_data
@@ -259,14 +298,42 @@ class StreamService:
         # Filter out None results
         return [r for r in results if r is not None]
     
+    async def _detect(self, frame_data: FrameData) -> Optional[DeviceDetection]:
+        """Send a frame to the shared batcher and return the result for its camera.
+        Static frames rejected by the motion gate of the camera skip detection."""
+        url = frame_data.url
+        preview = self.wants_preview(self.streams.get(url))
+        if self.worker_pool is not None:
+            try:
+                return await self.worker_pool.process(frame_data, preview=preview)
+            except Exception as e:
+                logger.error(f"AI processing error for {url}: {str(e)}")
+                return None
+        ai_service = self.ai_services.get(url)
+        if ai_service is None:
+            return None
+        ai_service.preview_enabled = preview
+        try:
+            # The thread hop is only worth it when a gate may skip the frame
+            if ai_service.motion_gate.enabled or ai_service.keyframes.enabled:
+                skipped = await asyncio.to_thread(ai_service.skip_static_frame, frame_data["frame"])
+                if skipped is not None:
+                    return skipped
+            return await self.batcher.submit(ai_service, frame_data)
+        except Exception as e:
+            logger.error(f"AI processing error for {url}: {str(e)}")
+            return None
+    
     async def _check_stream_health(self) -> None:
         """Check the health of all streams and attempt to reconnect failed ones"""
+        reconnect_urls = []
         async with self._streams_lock:
             for url in list(self.streams.keys()):
                 needs_reconnect = False
                 
-                # Check if capture exists and is open
-                if url not in self.capture_dict or not self.capture_dict[url].isOpened():
+                # Check if the reader thread exists and is still running
+                worker = self.capture_workers.get(url)
+                if worker is None or not worker.is_alive():
                     needs_reconnect = True
                 
                 # Check error count (part of circuit breaker)
@@ -277,20 +344,18 @@ class StreamService:
                         self.stream_errors[url]["count"] = 0  # Reset counter to try again
                 
                 if needs_reconnect:
-                    logger.warning(f"Stream {url} is down, attempting to reconnect")
-                    
-                    # Release existing capture if any
-                    if url in self.capture_dict:
-                        self.capture_dict[url].release()
-                    
-                    # Try to reconnect
-                    for attempt in range(self.max_retry_attempts):
-                        if await self.initialize_stream(url):
-                            logger.info(f"Successfully reconnected to {url}")
-                            break
-                        else:
-                            logger.warning(f"Reconnect attempt {attempt+1}/{self.max_retry_attempts} failed for {url}")
-                            await asyncio.sleep(self.retry_cooldown)
+                    reconnect_urls.append(url)
+        
+        # Reconnect outside the streams lock, initialize_stream takes it
+        for url in reconnect_urls:
+            logger.warning(f"Stream {url} is down, attempting to reconnect")
+            for attempt in range(self.max_retry_attempts):
+                if await self.initialize_stream(url):
+                    logger.info(f"Successfully reconnected to {url}")
+                    break
+                else:
+                    logger.warning(f"Reconnect attempt {attempt+1}/{self.max_retry_attempts} failed for {url}")
+                    await asyncio.sleep(self.retry_cooldown)
     
     async def process_streams(self) -> None:
         """Main processing loop for all camera streams"""
@@ -315,19 +380,15 @@ class StreamService:
                     await asyncio.sleep(self.processing_interval)
                     continue
                 
-                device_detections = []
-                # Process frames with AI service
-                for frame_data in frame_data_list:
-                    url = frame_data.get("url")
-                    if url in self.ai_services:
-                        try:
-                            detections: List[DeviceDetection] = await self.ai_services[url].process_frames([frame_data])
-                            if detections:
-                                device_detections.extend(detections)
-                        except Exception as e:
-                            logger.error(f"AI processing error for {url}: {str(e)}")
+                # Process frames from all streams together through the batcher
+                results = await asyncio.gather(*[self._detect(frame_data) for frame_data in frame_data_list])
+                device_detections: List[DeviceDetection] = [r for r in results if r is not None]
                 
-                # Update latest result
+                # Queue finalized violations, uploads never block the processing loop
+                for detection in device_detections:
+                    self._upload_violations(detection.camera_id, detection.detected_result)
+                
+                # Update results
                 if device_detections:
                     current_time = time.time()
                     async with self._results_lock:
@@ -335,15 +396,18 @@ class StreamService:
                             camera_id = detection.camera_id
                             if camera_id in self.streams:
                                 stream_id = self.streams[camera_id]
-                                self.latest_results[stream_id] = {
-                                "time": current_time,
-                                "device_list": [detection]  # Store detection specific to this stream
-                                }
-                        
-                        self.latest_result = {
-                            "time": current_time,
-                            "device_list": device_detections
-                        }
+                                self.annotated_streams.add(stream_id)
+                                await self.results.update(stream_id, detection, current_time)
+                                hub = self.hubs.get(stream_id)
+                                if hub is not None and detection.post_frame is not None:
+                                    version = await hub.publish(detection.post_frame)
+                                    # Serialized once for all the overlay clients of the stream
+                                    overlay_hub = self.overlay_hubs.get(stream_id)
+                                    if overlay_hub is not None and detection.overlay is not None:
+                                        await overlay_hub.publish(dumps({
+                                            "stream_id": stream_id, "version": version,
+                                            "time": current_time, **detection.overlay,
+                                        }))
                 
             except Exception as e:
                 import traceback
@@ -353,73 +417,143 @@ class StreamService:
             # Sleep to control processing rate
             await asyncio.sleep(self.processing_interval)
     
-    def get_latest_result(self) -> Optional[AIResult]:
-        """Get the latest AI processing result"""
-        return self.latest_result
+    def _upload_violations(self, camera_id: str, detected_result) -> None:
+        """Hand violations to the shared uploader"""
+        if detected_result:
+            self.uploader.submit(build_violation_payload(detected_result, camera_id))
     
-    def get_latest_result_camera_id(self, camera_id: str) -> Optional[Dict]:
-        """Get the latest AI processing result for a specific camera_id"""
-        if not self.is_valid_stream_id(camera_id):
-            logger.warning(f"Invalid camera_id: {camera_id}")
-            return None
-        return self.latest_results.get(camera_id)
+    def wants_preview(self, stream_id: Optional[str]) -> bool:
+        """Whether the annotated frame of a stream has to be drawn and encoded"""
+        for hubs in (self.hubs, self.overlay_hubs):
+            hub = hubs.get(stream_id)
+            if hub is not None and hub.viewers:
+                return True
+        return self.preview_requests.get(stream_id, 0.0) > time.time()
+    
+    def request_preview(self, stream_id: Optional[str] = None) -> None:
+        """Keep encoding previews of one stream, or of all streams, for PREVIEW_REQUEST_TTL seconds"""
+        until = time.time() + AppConfig.PREVIEW_REQUEST_TTL
+        for sid in ([stream_id] if stream_id is not None else list(self.stream_ids)):
+            self.preview_requests[sid] = until
+    
+    async def update_ai_config(self, config: Dict, stream_id: Optional[str] = None) -> None:
+        """Update the AI config of one camera, or of every camera when no stream ID is given"""
+        if self.worker_pool is not None:
+            urls = [self.stream_ids[stream_id]] if stream_id is not None else list(self.streams)
+            for url in urls:
+                await self.worker_pool.update_config(url, config)
+            return
+        if stream_id is not None:
+            services = [self.ai_services[self.stream_ids[stream_id]]]
+        else:
+            services = list(self.ai_services.values())
+        for ai_service in services:
+            await ai_service.update_config(config)
+    
+    def get_ai_config(self) -> Dict[str, Dict]:
+        """AI config of every camera by stream ID"""
+        if self.worker_pool is not None:
+            return {stream_id: self.worker_pool.get_config(url) for url, stream_id in self.streams.items()}
+        return {
+            stream_id: self.ai_services[url].camera_config
+            for url, stream_id in self.streams.items() if url in self.ai_services
+        }
+    
+    def get_stats(self) -> Dict[str, Dict]:
+        """Get processing statistics of the service"""
+        if self.worker_pool is not None:
+            cameras = {url: self.worker_pool.get_camera_stats(url) for url in self.streams}
+            return {
+                "workers": self.worker_pool.get_stats(),
+                "capture": {url: worker.get_stats() for url, worker in self.capture_workers.items()},
+                **{key: {url: stats.get(key) for url, stats in cameras.items()}
+                   for key in ("plate_cache", "best_shot", "violations", "motion", "keyframes", "roi")},
+                "upload": self.uploader.get_stats(),
+                "broadcast": {stream_id: hub.get_stats() for stream_id, hub in self.hubs.items()},
+                "results": self.results.get_stats(),
+            }
+        return {
+            "batching": self.batcher.get_stats(),
+            "capture": {url: worker.get_stats() for url, worker in self.capture_workers.items()},
+            "plate_cache": {url: service.plate_cache.get_stats() for url, service in self.ai_services.items()},
+            "best_shot": {url: service.best_shot.get_stats() for url, service in self.ai_services.items() if service.best_shot is not None},
+            "violations": {url: service.violation_aggregator.get_stats() for url, service in self.ai_services.items()},
+            "motion": {url: service.motion_gate.get_stats() for url, service in self.ai_services.items()},
+            "keyframes": {url: service.keyframes.get_stats() for url, service in self.ai_services.items()},
+            "roi": {url: service.roi.get_stats() for url, service in self.ai_services.items()},
+            "upload": self.uploader.get_stats(),
+            "broadcast": {stream_id: hub.get_stats() for stream_id, hub in self.hubs.items()},
+            "results": self.results.get_stats(),
+        }
+    
+    def _collect_metrics(self) -> List[MetricFamily]:
+        """Per-camera and queue gauges read at scrape time from the existing counters"""
+        capture_fps, processing_fps, dropped, stale, errors, errors_total, viewers = [], [], [], [], [], [], []
+        for url, stream_id in list(self.streams.items()):
+            labels = {"camera": stream_id}
+            worker = self.capture_workers.get(url)
+            if worker is not None:
+                capture_fps.append((labels, worker.capture_fps))
+                dropped.append((labels, worker.frames_dropped))
+                stale.append((labels, worker.frames_stale))
+            ai_service = self.ai_services.get(url)
+            if ai_service is not None:
+                processing_fps.append((labels, ai_service.processing_fps))
+            elif self.worker_pool is not None and url in self.worker_pool.assignments:
+                processing_fps.append((labels, self.worker_pool.get_processing_fps(url)))
+            hub, overlay_hub = self.hubs.get(stream_id), self.overlay_hubs.get(stream_id)
+            if hub is not None:
+                viewers.append(({**labels, "kind": "mjpeg"}, hub.viewers))
+            if overlay_hub is not None:
+                viewers.append(({**labels, "kind": "overlay"}, overlay_hub.viewers))
+            error = self.stream_errors.get(url)
+            if error is not None:
+                errors.append((labels, error["count"]))
+                errors_total.append((labels, error["total"]))
+        upload = self.uploader.get_stats()
+        return [
+            ("ai_capture_fps", "gauge", "Frames read per second from the camera", capture_fps),
+            ("ai_processing_fps", "gauge", "Frames analysed per second", processing_fps),
+            ("ai_capture_frames_dropped_total", "counter", "Frames replaced by a newer one before being analysed", dropped),
+            ("ai_capture_frames_stale_total", "counter", "Frames too old to be analysed", stale),
+            ("ai_stream_errors", "gauge", "Consecutive stream errors, reset on the next good frame", errors),
+            ("ai_stream_errors_total", "counter", "Stream errors since the camera was added", errors_total),
+            ("ai_stream_viewers", "gauge", "Open MJPEG responses and overlay WebSockets of the stream", viewers),
+            ("ai_semaphore_waiters", "gauge", "Tasks waiting on a concurrency limit", [
+                ({"semaphore": "capture"}, _semaphore_waiters(self.rate_limiter)),
+            ]),
+            ("ai_batch_queue_depth", "gauge", "Frames waiting for the shared detector batch",
+             [({}, self.batcher.get_stats()["queue_depth"])]),
+            ("ai_upload_pending", "gauge", "Violations waiting to be uploaded", [({}, upload["pending"])]),
+            ("ai_upload_circuit_open", "gauge", "1 while uploads are diverted to the outbox", [({}, int(upload["circuit_open"]))]),
+        ]
     
     def is_valid_camera_id(self, camera_id: str) -> bool:
         """Check if a camera ID is valid"""
         return camera_id in self.stream_ids
     
     async def generate_frames(self, stream_id: str) -> AsyncGenerator[bytes, None]:
-        """Generate frames for video streaming"""
-        if not self.is_valid_stream_id(stream_id):
+        """Generate frames for video streaming, each new frame of the stream is sent once"""
+        hub = self.hubs.get(stream_id)
+        if hub is None:
             logger.error(f"Invalid stream_id in generate_frames: {stream_id}")
             return
-            
-        while self.active:
-            try:
-                jpeg_frame = None
-                
-                # Safely access frames
-                async with self._frames_lock:
-                    if stream_id in self.frames:
-                        jpeg_frame = self.frames[stream_id]
-                
-                if not jpeg_frame:
-                    # If no frame available, wait a bit and try again
-                    await asyncio.sleep(0.1)
-                    continue
-                
-                # Check if we need to overlay AI detections
-                url = self.stream_ids.get(stream_id)
-                if url:
-                    process_result = False
-                    post_frame = None
-                    
-                    async with self._results_lock:
-                        if stream_id in self.latest_results:
-                            result = self.latest_results[stream_id]
-                            if result and "device_list" in result:
-                                device_list = result.get("device_list", [])
-                                if device_list and len(device_list) > 0:
-                                    # Try to get post-processed frame if available
-                                    detection = device_list[0]
-                                    if hasattr(detection, 'post_frame') and detection.post_frame is not None:
-                                        post_frame = detection.post_frame
-                                        process_result = True
-                
-                # Use post-processed frame if available, otherwise use the regular frame
-                output_frame = post_frame if process_result else jpeg_frame
-                
-                yield (b'--frame\r\n'
-                        b'Content-Type: image/jpeg\r\n\r\n' + 
-                        output_frame + 
-                        b'\r\n')
-                        
-                # Small delay to control frame rate
-                await asyncio.sleep(0.033)  # ~30 FPS
-                
-            except Exception as e:
-                logger.error(f"Error in generate_frames for {stream_id}: {str(e)}")
-                await asyncio.sleep(0.5)  # Longer delay on error
+        
+        async for jpeg_frame in hub.subscribe():
+            yield (b'--frame\r\n'
+                    b'Content-Type: image/jpeg\r\n\r\n' + 
+                    jpeg_frame + 
+                    b'\r\n')
+    
+    async def generate_overlays(self, stream_id: str) -> AsyncGenerator[str, None]:
+        """Overlay JSON messages of a stream, each new message is sent once"""
+        hub = self.overlay_hubs.get(stream_id)
+        if hub is None:
+            logger.error(f"Invalid stream_id in generate_overlays: {stream_id}")
+            return
+        
+        async for message in hub.subscribe():
+            yield message.decode()
     
     async def shutdown(self) -> None:
         """Clean shutdown of the service"""
@@ -428,22 +562,43 @@ class StreamService:
         
         # Allow ongoing tasks to complete
         await asyncio.sleep(1)
+        for hub in [*self.hubs.values(), *self.overlay_hubs.values()]:
+            await hub.close()
+        await self.results.close()
+        await self.batcher.shutdown()
         
-        # Release all video captures
+        # Stop reader threads and release all video captures
         async with self._streams_lock:
-            for url, capture in self.capture_dict.items():
+            for url in set(self.capture_workers) | set(self.capture_dict):
                 try:
-                    capture.release()
+                    await self._stop_capture(url)
                     logger.info(f"Released capture for {url}")
                 except Exception as e:
                     logger.error(f"Error releasing capture for {url}: {str(e)}")
+            
+            # Upload violations of tracks still in progress, then drain the uploader
+            for url, ai_service in self.ai_services.items():
+                self._upload_violations(url, ai_service.violation_aggregator.flush())
+            if self.worker_pool is not None:
+                for url in list(self.worker_pool.assignments):
+                    self._upload_violations(url, await self.worker_pool.remove_camera(url))
+                await self.worker_pool.shutdown()
+        await asyncio.to_thread(self.uploader.close)
+        self.metrics.unregister_collector(self._collect_metrics)
         
         # Clear all data structures
         self.capture_dict.clear()
-        self.frames.clear()
+        self.capture_workers.clear()
+        self.hubs.clear()
+        self.overlay_hubs.clear()
         self.streams.clear()
         self.stream_ids.clear()
-        self.latest_results.clear()
+        self.annotated_streams.clear()
         self.stream_errors.clear()
         
         logger.info("Stream service shut down successfully")
+
+
+def _semaphore_waiters(semaphore: asyncio.Semaphore) -> int:
+    """Number of tasks blocked on an asyncio semaphore"""
+    return len(getattr(semaphore, "_waiters", None) or ())
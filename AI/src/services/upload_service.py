@@ -0,0 +1,339 @@
+# src/services/upload_service.py
+import asyncio
+import random
+import threading
+import time
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional
+import aiohttp
+import numpy as np
+from loguru import logger
+from src.config import API, AppConfig_2 as AppConfig
+from src.services.metrics import get_metrics
+from src.services.outbox import ViolationOutbox
+
+SENT, REJECTED, FAILED = "sent", "rejected", "failed"
+
+
+class ViolationUploader:
+    """Long-lived asynchronous uploader of violations to the backend.
+
+    The uploader owns an event loop in a background thread, so it can be fed from the
+    threads of ``app.py`` as well as from the event loop of ``app_v2.py``. Violations
+    are batched by size and time, sent over one pooled keep-alive ``aiohttp`` session
+    with bounded concurrency, and retried with exponential backoff and jitter. When
+    the backend falls behind, the pending queue is capped and the oldest items are dropped.
+
+    With an ``outbox``, nothing is dropped while the backend is unreachable: failed
+    batches and queue overflow are written to disk instead. After ``circuit_threshold``
+    failed batches in a row the backend is considered down and new batches go straight
+    to the outbox without touching the network. A drainer replays the outbox in bulk
+    every ``drain_interval`` seconds and closes the circuit on the first success.
+    """
+
+    def __init__(
+        self,
+        url: str = API.CREATE_VIOLATION,
+        batch_size: int = AppConfig.UPLOAD_BATCH_SIZE,
+        flush_interval: float = AppConfig.UPLOAD_FLUSH_INTERVAL,
+        max_concurrency: int = AppConfig.UPLOAD_MAX_CONCURRENCY,
+        max_pending: int = AppConfig.UPLOAD_MAX_PENDING,
+        max_retries: int = AppConfig.UPLOAD_MAX_RETRIES,
+        retry_backoff: float = AppConfig.UPLOAD_RETRY_BACKOFF,
+        timeout: float = AppConfig.UPLOAD_TIMEOUT,
+        outbox: Optional[ViolationOutbox] = None,
+        circuit_threshold: int = AppConfig.UPLOAD_CIRCUIT_THRESHOLD,
+        drain_interval: float = AppConfig.OUTBOX_DRAIN_INTERVAL,
+        drain_batch_size: int = AppConfig.OUTBOX_DRAIN_BATCH_SIZE,
+    ):
+        self.url = url
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = flush_interval
+        self.max_concurrency = max(1, max_concurrency)
+        self.max_pending = max(self.batch_size, max_pending)
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.timeout = timeout
+        self.outbox = outbox
+        self.circuit_threshold = max(1, circuit_threshold)
+        self.drain_interval = drain_interval
+        self.drain_batch_size = max(1, drain_batch_size)
+        self.circuit_open = False
+        self.consecutive_failures = 0
+
+        self._pending: Deque[Dict[str, Any]] = deque()
+        self._first_pending_at = 0.0
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._started = threading.Event()
+        self._start_lock = threading.Lock()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._stopping: Optional[asyncio.Event] = None
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._spills = set()
+
+        # Metrics
+        self._batch_sizes: Deque[int] = deque(maxlen=AppConfig.BATCH_STATS_WINDOW)
+        self._latencies: Deque[float] = deque(maxlen=AppConfig.BATCH_STATS_WINDOW)
+        self.in_flight = 0
+        self.items_submitted = 0
+        self.items_sent = 0
+        self.items_dropped = 0
+        self.items_rejected = 0
+        self.items_spilled = 0  # written to the outbox
+        self.items_replayed = 0  # delivered from the outbox
+        self.batches_sent = 0
+        self.batches_failed = 0
+        self.retries_total = 0
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self) -> None:
+        """Start the background loop if it is not running yet"""
+        with self._start_lock:
+            if self.running:
+                return
+            self._started.clear()
+            self._loop = asyncio.new_event_loop()
+            self._thread = threading.Thread(target=self._run_loop, name="violation-uploader", daemon=True)
+            self._thread.start()
+        self._started.wait()
+
+    def submit(self, items: List[Dict[str, Any]]) -> None:
+        """Queue violation payloads for upload. Thread-safe and never blocks on the network"""
+        if not items:
+            return
+        self.start()
+        self._loop.call_soon_threadsafe(self._enqueue, list(items))
+
+    def close(self, timeout: float = 10.0) -> None:
+        """Send what is still pending and stop the background loop"""
+        if not self.running:
+            return
+        self._loop.call_soon_threadsafe(self._request_stop)
+        self._thread.join(timeout)
+        if self._thread.is_alive():
+            logger.warning(f"Violation uploader did not stop within {timeout}s, {len(self._pending)} items pending")
+
+    def _run_loop(self) -> None:
+        asyncio.set_event_loop(self._loop)
+        try:
+            self._loop.run_until_complete(self._main())
+        except Exception as e:
+            logger.error(f"Violation uploader stopped: {str(e)}")
+        finally:
+            self._started.set()
+            self._loop.close()
+
+    def _enqueue(self, items: List[Dict[str, Any]]) -> None:
+        if not self._pending:
+            self._first_pending_at = self._loop.time()
+        overflow = []
+        for item in items:
+            if len(self._pending) >= self.max_pending:
+                # Backpressure: keep the newest violations in memory
+                overflow.append(self._pending.popleft())
+            self._pending.append(item)
+        self.items_submitted += len(items)
+        if overflow:
+            if self.outbox is not None:
+                task = asyncio.ensure_future(self._spill(overflow))
+                self._spills.add(task)
+                task.add_done_callback(self._spills.discard)
+            else:
+                self.items_dropped += len(overflow)
+        self._wakeup.set()
+
+    async def _spill(self, items: List[Dict[str, Any]]) -> None:
+        """Write violations to the outbox without blocking the loop"""
+        try:
+            await asyncio.to_thread(self.outbox.append, items)
+            self.items_spilled += len(items)
+        except Exception as e:
+            self.items_dropped += len(items)
+            logger.error(f"Failed to write {len(items)} violations to the outbox: {str(e)}")
+
+    def _request_stop(self) -> None:
+        self._stopping.set()
+        self._wakeup.set()
+
+    async def _wait_for_batch(self) -> None:
+        """Wait until a full batch is pending, the oldest pending item is due, or the uploader stops"""
+        while not self._stopping.is_set():
+            timeout = None
+            if self._pending:
+                if len(self._pending) >= self.batch_size:
+                    return
+                timeout = self._first_pending_at + self.flush_interval - self._loop.time()
+                if timeout <= 0:
+                    return
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    def _take_batch(self) -> List[Dict[str, Any]]:
+        batch = [self._pending.popleft() for _ in range(min(self.batch_size, len(self._pending)))]
+        # Items left over by a full batch keep the current deadline, _enqueue starts a new one once empty
+        return batch
+
+    async def _main(self) -> None:
+        self._wakeup = asyncio.Event()
+        self._stopping = asyncio.Event()
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        connector = aiohttp.TCPConnector(limit=self.max_concurrency, keepalive_timeout=30)
+        tasks = set()
+        async with aiohttp.ClientSession(connector=connector, timeout=aiohttp.ClientTimeout(total=self.timeout)) as session:
+            self._session = session
+            self._started.set()
+            drainer = asyncio.create_task(self._drain_outbox()) if self.outbox is not None else None
+            while True:
+                await self._wait_for_batch()
+                if not self._pending:
+                    if self._stopping.is_set():
+                        break
+                    continue
+                # Bounded concurrency, batches keep filling while all slots are busy
+                await semaphore.acquire()
+                task = asyncio.create_task(self._send(self._take_batch(), semaphore))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+            if tasks or self._spills:
+                await asyncio.gather(*tasks, *self._spills, return_exceptions=True)
+            if drainer is not None:
+                drainer.cancel()
+                await asyncio.gather(drainer, return_exceptions=True)
+        self._session = None
+
+    async def _post(self, batch: List[Dict[str, Any]], max_retries: Optional[int] = None) -> str:
+        """Post one batch with retries. Returns SENT, REJECTED (4xx, not retried) or FAILED"""
+        max_retries = self.max_retries if max_retries is None else max_retries
+        error = None
+        for attempt in range(max_retries + 1):
+            time_start = time.time()
+            try:
+                async with self._session.post(self.url, json=batch) as response:
+                    if response.status < 400:
+                        self._latencies.append(time.time() - time_start)
+                        logger.info({"data": [x.get("status") for x in batch], "status_code": response.status})
+                        return SENT
+                    error = f"HTTP {response.status}: {(await response.text())[:200]}"
+                    if response.status < 500 and response.status != 429:
+                        # The backend rejected the data, retrying will not help
+                        logger.error({"data": [x.get("tracking_id") for x in batch], "error": error})
+                        return REJECTED
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                error = str(e) or type(e).__name__
+            if attempt < max_retries:
+                self.retries_total += 1
+                # Exponential backoff with full jitter
+                await asyncio.sleep(random.uniform(0, self.retry_backoff * 2 ** attempt))
+        logger.error({"data": [x.get("tracking_id") for x in batch], "error": error})
+        return FAILED
+
+    def _record_result(self, status: str) -> None:
+        """Update the circuit breaker with the outcome of a request"""
+        if status == FAILED:
+            self.consecutive_failures += 1
+            if self.outbox is not None and not self.circuit_open and self.consecutive_failures >= self.circuit_threshold:
+                self.circuit_open = True
+                logger.warning(f"Backend unreachable after {self.consecutive_failures} failed batches, "
+                               f"writing violations to the outbox")
+        else:
+            self.consecutive_failures = 0
+            if self.circuit_open:
+                self.circuit_open = False
+                logger.info("Backend reachable again, resuming direct uploads")
+
+    async def _send(self, batch: List[Dict[str, Any]], semaphore: asyncio.Semaphore) -> None:
+        self.in_flight += 1
+        try:
+            if self.circuit_open:
+                # The backend is down, do not wait for timeouts
+                await self._spill(batch)
+                return
+            status = await self._post(batch)
+            self._record_result(status)
+            if status == SENT:
+                self.batches_sent += 1
+                self.items_sent += len(batch)
+                self._batch_sizes.append(len(batch))
+                get_metrics().upload_batch_size.observe(len(batch))
+                return
+            self.batches_failed += 1
+            if status == REJECTED:
+                self.items_rejected += len(batch)
+            elif self.outbox is not None:
+                await self._spill(batch)
+            else:
+                self.items_dropped += len(batch)
+        finally:
+            self.in_flight -= 1
+            semaphore.release()
+
+    async def _drain_outbox(self) -> None:
+        """Replay the outbox in bulk, oldest first, while the backend accepts it"""
+        while not self._stopping.is_set():
+            try:
+                await asyncio.wait_for(self._stopping.wait(), timeout=self.drain_interval)
+                return
+            except asyncio.TimeoutError:
+                pass
+            try:
+                while len(self.outbox) and not self._stopping.is_set():
+                    rows = await asyncio.to_thread(self.outbox.peek, self.drain_batch_size)
+                    # A single attempt, the next drain interval acts as the backoff
+                    status = await self._post([payload for _, payload in rows], max_retries=0)
+                    self._record_result(status)
+                    if status == FAILED:
+                        break
+                    await asyncio.to_thread(self.outbox.ack, [row_id for row_id, _ in rows])
+                    if status == SENT:
+                        self.items_replayed += len(rows)
+                    else:
+                        self.items_rejected += len(rows)
+            except Exception as e:
+                logger.error(f"Error draining the violation outbox: {str(e)}")
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Upload and backpressure metrics"""
+        stats = {
+            "running": self.running,
+            "pending": len(self._pending),
+            "in_flight": self.in_flight,
+            "items_submitted": self.items_submitted,
+            "items_sent": self.items_sent,
+            "items_dropped": self.items_dropped,
+            "batches_sent": self.batches_sent,
+            "batches_failed": self.batches_failed,
+            "retries_total": self.retries_total,
+            "items_rejected": self.items_rejected,
+            "items_spilled": self.items_spilled,
+            "items_replayed": self.items_replayed,
+            "circuit_open": self.circuit_open,
+            "consecutive_failures": self.consecutive_failures,
+        }
+        if self.outbox is not None:
+            stats["outbox"] = self.outbox.get_stats()
+        if self._batch_sizes:
+            stats["avg_batch_size"] = float(np.mean(self._batch_sizes))
+        if self._latencies:
+            stats["latency_p95"] = float(np.percentile(np.array(self._latencies), 95))
+        return stats
+
+
+_uploader: Optional[ViolationUploader] = None
+_uploader_lock = threading.Lock()
+
+
+def get_violation_uploader() -> ViolationUploader:
+    """Return the uploader shared by the whole process"""
+    global _uploader
+    with _uploader_lock:
+        if _uploader is None:
+            outbox = ViolationOutbox() if AppConfig.OUTBOX_PATH else None
+            _uploader = ViolationUploader(outbox=outbox)
+    return _uploader
@@ -0,0 +1,485 @@
+# src/services/worker_pool.py
+import asyncio
+import itertools
+import multiprocessing as mp
+import queue
+import threading
+import time
+from collections import deque
+from multiprocessing import shared_memory
+from typing import Any, Deque, Dict, List, Optional, Tuple
+import numpy as np
+from loguru import logger
+from src.config import AppConfig_2 as AppConfig
+from src.models.base_model import DetectedResult, DeviceDetection, FrameData
+from src.services.metrics import get_metrics
+
+
+class FrameRing:
+    """Shared-memory slots holding the frames of one camera while a worker analyses them.
+
+    Owned by the API process: a frame is copied once into a free slot and the worker
+    reads it in place, so no pixel data goes through a pipe. The slot is freed when
+    the result of the frame comes back. Only used from the event loop thread.
+    """
+
+    def __init__(self, shape: Tuple[int, ...], dtype: np.dtype, slots: int):
+        self.shape = tuple(shape)
+        self.dtype = np.dtype(dtype)
+        self.slots = slots
+        self.slot_size = int(np.prod(self.shape)) * self.dtype.itemsize
+        self.shm = shared_memory.SharedMemory(create=True, size=self.slot_size * slots)
+        self._free: Deque[int] = deque(range(slots))
+
+    @property
+    def name(self) -> str:
+        return self.shm.name
+
+    @property
+    def in_flight(self) -> int:
+        return self.slots - len(self._free)
+
+    def fits(self, frame: np.ndarray) -> bool:
+        return frame.shape == self.shape and frame.dtype == self.dtype
+
+    def write(self, frame: np.ndarray) -> Optional[int]:
+        """Copy a frame into a free slot and return the slot, or None when all slots are busy"""
+        if not self._free:
+            return None
+        slot = self._free.popleft()
+        view = np.ndarray(self.shape, self.dtype, buffer=self.shm.buf, offset=slot * self.slot_size)
+        view[...] = frame
+        del view
+        return slot
+
+    def release(self, slot: int) -> None:
+        self._free.append(slot)
+
+    def close(self) -> None:
+        self.shm.close()
+        try:
+            self.shm.unlink()
+        except FileNotFoundError:
+            pass
+
+
+def _compact_output(output: Optional[DeviceDetection]) -> Optional[Dict[str, Any]]:
+    """Plain dict of a frame output, sent back to the API process through the result queue"""
+    if output is None:
+        return None
+    return output.to_dict()
+
+
+def _worker_main(index: int, tasks, results, stats_interval: float) -> None:
+    """Entry point of a worker process: runs the full pipeline of the cameras assigned to it"""
+    from src.modules.ai_service import AIService
+
+    services: Dict[str, AIService] = {}
+    rings: Dict[str, shared_memory.SharedMemory] = {}  # camera -> attached ring
+    frames = 0
+    last_stats = time.time()
+    logger.info(f"Worker {index} started")
+
+    def reply(request_id: int, error: Optional[str] = None, payload: Any = None) -> None:
+        results.put(("reply", request_id, error, payload))
+
+    def detach(camera: str) -> None:
+        shm = rings.pop(camera, None)
+        if shm is not None:
+            shm.close()
+
+    while True:
+        try:
+            message = tasks.get(timeout=stats_interval)
+        except queue.Empty:
+            message = None
+
+        if message is not None:
+            kind = message[0]
+            if kind == "stop":
+                break
+
+            if kind == "frame":
+                _, request_id, camera, shm_name, slot, shape, dtype, frame_count, preview = message
+                service = services.get(camera)
+                output, info = None, {}
+                if service is not None:
+                    service.preview_enabled = preview
+                    try:
+                        shm = rings.get(camera)
+                        if shm is None or shm.name != shm_name:
+                            detach(camera)
+                            shm = rings[camera] = shared_memory.SharedMemory(name=shm_name)
+                        dtype = np.dtype(dtype)
+                        frame = np.ndarray(shape, dtype, buffer=shm.buf, offset=slot * int(np.prod(shape)) * dtype.itemsize)
+                        predicted_frames = service.keyframes.predicted_frames
+                        output = service.skip_static_frame(frame)
+                        predicted = service.keyframes.predicted_frames > predicted_frames
+                        skipped = output is not None and not predicted
+                        if output is None:
+                            output = service._process_frame_sync(frame, frame_count)
+                        del frame
+                        frames += 1
+                        info = {"timings": dict(service.last_timings), "skipped": skipped, "predicted": predicted,
+                                "processing_fps": service.processing_fps}
+                    except Exception as e:
+                        logger.error(f"Worker {index} failed on a frame of {camera}: {str(e)}", exc_info=True)
+                results.put(("frame", request_id, _compact_output(output), info))
+
+            elif kind == "add":
+                _, request_id, camera, label, config = message
+                try:
+                    service = AIService(camera)
+                    service.camera_label = label
+                    if config:
+                        asyncio.run(service.update_config(config))
+                    services[camera] = service
+                    reply(request_id, payload=service.camera_config)
+                except Exception as e:
+                    logger.error(f"Worker {index} could not add {camera}: {str(e)}", exc_info=True)
+                    reply(request_id, error=str(e))
+
+            elif kind == "config":
+                _, request_id, camera, config = message
+                service = services.get(camera)
+                try:
+                    if service is None:
+                        raise ValueError(f"Camera not assigned to worker {index}: {camera}")
+                    asyncio.run(service.update_config(config))
+                    reply(request_id, payload=service.camera_config)
+                except Exception as e:
+                    # A failed request must not end the loop, the restart would drop the state of every camera
+                    if not isinstance(e, ValueError):
+                        logger.error(f"Worker {index} could not update {camera}: {str(e)}", exc_info=True)
+                    reply(request_id, error=str(e))
+
+            elif kind == "remove":
+                _, request_id, camera = message
+                try:
+                    service = services.pop(camera, None)
+                    detach(camera)
+                    flushed = service.violation_aggregator.flush() if service is not None else []
+                    reply(request_id, payload=[result.to_dict() for result in flushed])
+                except Exception as e:
+                    logger.error(f"Worker {index} could not remove {camera}: {str(e)}", exc_info=True)
+                    reply(request_id, error=str(e))
+
+        if time.time() - last_stats >= stats_interval:
+            last_stats = time.time()
+            metrics = get_metrics()
+            results.put(("stats", index, {
+                "frames": frames,
+                "ocr_calls": metrics.ocr_calls.total(),
+                "ocr_plates": metrics.ocr_plates.total(),
+                "cameras": {
+                    camera: {
+                        "plate_cache": service.plate_cache.get_stats(),
+                        "best_shot": service.best_shot.get_stats() if service.best_shot is not None else None,
+                        "keyframes": service.keyframes.get_stats(),
+                        "violations": service.violation_aggregator.get_stats(),
+                        "motion": service.motion_gate.get_stats(),
+                        "roi": service.roi.get_stats(),
+                    }
+                    for camera, service in services.items()
+                },
+            }))
+
+    for camera in list(rings):
+        detach(camera)
+    logger.info(f"Worker {index} stopped")
+
+
+class ProcessWorkerPool:
+    """Runs camera pipelines in worker processes instead of threads of the API process.
+
+    Each camera is pinned to one worker, chosen as the least loaded when the camera is
+    added, so its tracker, plate cache and violation aggregator stay in that process.
+    Frames go through a per-camera ``FrameRing`` and only the JPEG preview, the
+    violations and a few timings come back. A camera whose slots are all busy drops
+    frames, like the capture thread does. A worker that dies is restarted and its
+    cameras are added again, with fresh tracker state.
+    """
+
+    def __init__(
+        self,
+        workers: int = AppConfig.WORKER_PROCESSES,
+        ring_slots: int = AppConfig.FRAME_RING_SLOTS,
+        stats_interval: float = AppConfig.WORKER_STATS_INTERVAL,
+        request_timeout: float = AppConfig.WORKER_REQUEST_TIMEOUT,
+    ):
+        self.workers = max(1, workers)
+        self.ring_slots = max(1, ring_slots)
+        self.stats_interval = stats_interval
+        self.request_timeout = request_timeout
+        self._context = mp.get_context("spawn")  # CUDA and threads do not survive fork
+        self._processes: List[Optional[mp.process.BaseProcess]] = [None] * self.workers
+        self._tasks: List[Any] = [None] * self.workers
+        self._results = None
+        self._reader: Optional[threading.Thread] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._closing = False
+        self._request_ids = itertools.count(1)
+        self._pending: Dict[int, Tuple[asyncio.Future, int]] = {}  # request ID -> (future, worker)
+        self._frames_in_flight: Dict[int, Tuple[str, FrameRing, int]] = {}  # request ID -> (camera, ring, slot)
+
+        self.assignments: Dict[str, int] = {}  # camera -> worker
+        self._labels: Dict[str, str] = {}
+        self._configs: Dict[str, Dict[str, Any]] = {}
+        self._rings: Dict[str, FrameRing] = {}
+        self._processing_fps: Dict[str, float] = {}
+        self._camera_stats: Dict[str, Dict[str, Any]] = {}
+        self._worker_stats: Dict[int, Dict[str, Any]] = {}
+        self._ocr_seen: Dict[int, Tuple[float, float]] = {}
+
+        self.frames_submitted = 0
+        self.frames_dropped = 0  # no free slot for the camera
+        self.frames_failed = 0
+        self.worker_restarts = 0
+
+    # Lifecycle
+
+    def _start_worker(self, index: int) -> None:
+        self._tasks[index] = self._context.Queue()
+        process = self._context.Process(
+            target=_worker_main,
+            args=(index, self._tasks[index], self._results, self.stats_interval),
+            name=f"ai-worker-{index}",
+            daemon=True,
+        )
+        process.start()
+        self._processes[index] = process
+        self._ocr_seen[index] = (0.0, 0.0)
+
+    def _ensure_started(self) -> None:
+        if self._results is not None:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._results = self._context.Queue()
+        for index in range(self.workers):
+            self._start_worker(index)
+        self._reader = threading.Thread(target=self._read_results, name="ai-worker-results", daemon=True)
+        self._reader.start()
+        logger.info(f"Started {self.workers} AI worker processes")
+
+    def _read_results(self) -> None:
+        """Forward worker messages to the event loop and watch for dead workers"""
+        while not self._closing:
+            try:
+                message = self._results.get(timeout=1.0)
+            except queue.Empty:
+                for index, process in enumerate(self._processes):
+                    if process is not None and not process.is_alive() and not self._closing:
+                        self._processes[index] = None
+                        self._loop.call_soon_threadsafe(self._restart_worker, index)
+                continue
+            except (EOFError, OSError):
+                break
+            self._loop.call_soon_threadsafe(self._dispatch, message)
+
+    def _restart_worker(self, index: int) -> None:
+        if self._closing:
+            return
+        logger.error(f"AI worker {index} died, restarting it")
+        self.worker_restarts += 1
+        error = RuntimeError(f"AI worker {index} died")
+        for request_id, (future, worker) in list(self._pending.items()):
+            if worker == index:
+                self._pending.pop(request_id)
+                self._release_frame(request_id)
+                if not future.done():
+                    future.set_exception(error)
+        self._start_worker(index)
+        for camera, worker in self.assignments.items():
+            if worker == index:
+                # Re-add the camera with its last config, its tracker state is lost
+                self._send(index, ("add", next(self._request_ids), camera, self._labels[camera], self._configs.get(camera)))
+
+    async def shutdown(self, timeout: float = 5.0) -> None:
+        """Stop the workers and free the shared memory"""
+        if self._results is None:
+            return
+        self._closing = True
+        for index in range(self.workers):
+            self._send(index, ("stop",))
+        for process in self._processes:
+            if process is not None:
+                await asyncio.to_thread(process.join, timeout)
+                if process.is_alive():
+                    process.terminate()
+        for future, _ in self._pending.values():
+            if not future.done():
+                future.cancel()
+        self._pending.clear()
+        self._frames_in_flight.clear()
+        for ring in self._rings.values():
+            ring.close()
+        self._rings.clear()
+        logger.info("AI worker processes stopped")
+
+    # Requests
+
+    def _send(self, index: int, message: tuple) -> None:
+        if self._tasks[index] is not None:
+            self._tasks[index].put(message)
+
+    async def _request(self, index: int, message: tuple) -> Any:
+        """Send a control message to a worker and wait for its reply"""
+        request_id = message[1]
+        future = self._loop.create_future()
+        self._pending[request_id] = (future, index)
+        self._send(index, message)
+        try:
+            return await asyncio.wait_for(future, self.request_timeout)
+        finally:
+            self._pending.pop(request_id, None)
+
+    def _dispatch(self, message: tuple) -> None:
+        kind = message[0]
+        if kind == "stats":
+            _, index, stats = message
+            self._worker_stats[index] = {k: v for k, v in stats.items() if k != "cameras"}
+            self._camera_stats.update(stats["cameras"])
+            # OCR counters of the worker are added to the metrics of the API process
+            calls, plates = self._ocr_seen.get(index, (0.0, 0.0))
+            metrics = get_metrics()
+            metrics.ocr_calls.inc(max(0.0, stats["ocr_calls"] - calls))
+            metrics.ocr_plates.inc(max(0.0, stats["ocr_plates"] - plates))
+            self._ocr_seen[index] = (stats["ocr_calls"], stats["ocr_plates"])
+            return
+
+        request_id = message[1]
+        entry = self._pending.pop(request_id, None)
+        if kind == "frame":
+            camera = self._release_frame(request_id)
+            output, info = message[2], message[3]
+            if camera is not None and info:
+                self._processing_fps[camera] = info["processing_fps"]
+                get_metrics().observe_frame(self._labels.get(camera, camera), info["timings"],
+                                            skipped=info["skipped"], predicted=info.get("predicted", False))
+            if output is None:
+                self.frames_failed += 1
+            result = None if output is None else DeviceDetection(
+                camera_id=output["camera_id"],
+                post_frame=output["post_frame"],
+                detected_result=[DetectedResult(**item) for item in output["detected_result"]],
+                overlay=output["overlay"],
+            )
+        else:
+            _, _, error, payload = message
+            result = ValueError(error) if error is not None else payload
+
+        if entry is None or entry[0].done():
+            return
+        if isinstance(result, Exception):
+            entry[0].set_exception(result)
+        else:
+            entry[0].set_result(result)
+
+    def _release_frame(self, request_id: int) -> Optional[str]:
+        in_flight = self._frames_in_flight.pop(request_id, None)
+        if in_flight is None:
+            return None
+        camera, ring, slot = in_flight
+        if self._rings.get(camera) is ring:
+            ring.release(slot)
+        elif ring.in_flight <= 1:
+            ring.close()  # replaced after a resolution change, last frame done
+        else:
+            ring.release(slot)
+        return camera
+
+    # Cameras
+
+    async def add_camera(self, camera: str, label: str, config: Optional[Dict[str, Any]] = None) -> None:
+        """Pin a camera to the least loaded worker and create its pipeline there"""
+        self._ensure_started()
+        loads = [0] * self.workers
+        for worker in self.assignments.values():
+            loads[worker] += 1
+        index = loads.index(min(loads))
+        self.assignments[camera] = index
+        self._labels[camera] = label
+        try:
+            self._configs[camera] = await self._request(index, ("add", next(self._request_ids), camera, label, config))
+        except Exception:
+            self.assignments.pop(camera, None)
+            self._labels.pop(camera, None)
+            raise
+
+    async def update_config(self, camera: str, config: Dict[str, Any]) -> None:
+        """Apply an AI config change to a camera, raises ValueError when the worker rejects it"""
+        index = self.assignments[camera]
+        self._configs[camera] = await self._request(index, ("config", next(self._request_ids), camera, config))
+
+    async def remove_camera(self, camera: str) -> List[DetectedResult]:
+        """Drop the pipeline of a camera and return the violations its aggregator still held"""
+        index = self.assignments.pop(camera, None)
+        flushed = []
+        if index is not None:
+            try:
+                flushed = await self._request(index, ("remove", next(self._request_ids), camera))
+            except Exception as e:
+                logger.error(f"Could not flush violations of {camera}: {str(e)}")
+        ring = self._rings.pop(camera, None)
+        if ring is not None and ring.in_flight == 0:
+            ring.close()
+        self._labels.pop(camera, None)
+        self._configs.pop(camera, None)
+        self._camera_stats.pop(camera, None)
+        self._processing_fps.pop(camera, None)
+        return [DetectedResult(**item) for item in flushed]
+
+    async def process(self, frame_data: FrameData, preview: bool = True) -> Optional[DeviceDetection]:
+        """Analyse one frame in the worker of its camera, ``preview`` asks for the annotated JPEG"""
+        camera = frame_data["url"]
+        index = self.assignments.get(camera)
+        if index is None:
+            return None
+        frame = frame_data["frame"]
+        ring = self._rings.get(camera)
+        if ring is None or not ring.fits(frame):
+            if ring is not None and ring.in_flight == 0:
+                ring.close()
+            # A ring still in use is closed by _release_frame once its last frame is back
+            ring = self._rings[camera] = FrameRing(frame.shape, frame.dtype, self.ring_slots)
+        slot = ring.write(frame)
+        if slot is None:
+            self.frames_dropped += 1
+            return None
+
+        request_id = next(self._request_ids)
+        future = self._loop.create_future()
+        self._pending[request_id] = (future, index)
+        self._frames_in_flight[request_id] = (camera, ring, slot)
+        self.frames_submitted += 1
+        self._send(index, ("frame", request_id, camera, ring.name, slot, ring.shape, ring.dtype.str, frame_data["frame_count"], preview))
+        try:
+            return await future
+        except RuntimeError as e:
+            logger.error(f"Frame of {camera} lost: {str(e)}")
+            return None
+
+    # Introspection
+
+    def get_config(self, camera: str) -> Optional[Dict[str, Any]]:
+        return self._configs.get(camera)
+
+    def get_processing_fps(self, camera: str) -> float:
+        return self._processing_fps.get(camera, 0.0)
+
+    def get_camera_stats(self, camera: str) -> Dict[str, Any]:
+        """Latest per-camera stats reported by its worker"""
+        return self._camera_stats.get(camera, {})
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "workers": self.workers,
+            "alive": sum(1 for p in self._processes if p is not None and p.is_alive()),
+            "assignments": {camera: index for camera, index in self.assignments.items()},
+            "frames_submitted": self.frames_submitted,
+            "frames_dropped": self.frames_dropped,
+            "frames_failed": self.frames_failed,
+            "frames_in_flight": len(self._frames_in_flight),
+            "worker_restarts": self.worker_restarts,
+            "per_worker": self._worker_stats,
+        }
@@ -1,7 +1,6 @@
-from typing import List, Optional
+from typing import Any, Dict, List, Optional
 import cv2
 import base64
-import torch
 import requests
 import numpy as np
 from loguru import logger
@@ -11,114 +10,108 @@ from concurrent.futures import ThreadPoolExecutor
 from src.config.globalVariables import capture_dict, THRESHOLD_PLATE, THRESHOLD_PLATE_CERTAIN, THRESHOLD_NOHELMET_CERTAIN
 from datetime import datetime
 from src.models.schema import ViolationStatus
-def mapping_tracked_vehicles(vehicle_track_dets, vehicle_track_ids, detection_results, device="cuda:0"):
-
+def extract_violations(association) -> List[Dict[str, Any]]:
     """
-    Group objects of class 1 (helmet), 2 (no-helmet), 3 (license plate) with class 0 (vehicle)
-    if they are inside the vehicle bounding box.
+    Find the vehicles of a frame with a no-helmet rider and a readable license plate.
 
     Args:
-        detections (torch.Tensor): Tensor of shape (N, 6) with [x_min, y_min, x_max, y_max, conf, class_id]
-        device (str): Device to run the computation on (default: "cuda:0")
+        association (AssociationResult): Vehicles of the frame and their associated objects.
 
     Returns:
-        list: List of dictionaries, each containing a vehicle and its associated objects.
+        list: One dictionary per violating vehicle with its track ID, bbox, plate and status.
     """
-    # vehicles = detection_results[detection_results[:, 5] == 0]  # Get all vehicles (class 0)
-    other_objects = detection_results[detection_results[:, 5] != 0]  # Get non-vehicle objects
-
-    grouped = []
-    
-    for id, vehicle in zip(vehicle_track_ids, vehicle_track_dets):
-        v_id = id  # Assign an ID for the vehicle group
-
-        # Find objects inside this vehicle's bounding box
-        inside_objects = []
-        for obj in other_objects:
-            o_xmin, o_ymin, o_xmax, o_ymax, _, obj_class = obj
-            class_id = obj_class.item()
-            obj_bbox = [o_xmin, o_ymin, o_xmax, o_ymax]
+    violations = []
+    plate_vehicles, plate_objects = association.violation_plates()
+    # Check for violation (class 2: no helmet)
+    for v in association.violating_vehicles():
+        plate_number = None
+        plate_conf = None
+        plate_quality = 0.0
+        nohelmet_conf = float(association.max_nohelmet_conf[v])
+        for o in plate_objects[plate_vehicles == v]:
+            if association.plate_texts[o] is not None:
+                plate_number = association.plate_texts[o]
+                plate_conf = float(association.plate_confs[o])
+                if not np.isnan(association.plate_qualities[o]):
+                    plate_quality = float(association.plate_qualities[o])
             
-            is_valid = False
-            cip = calculate_cip(vehicle, obj_bbox)
-            hhb = calculate_hhb(vehicle, obj_bbox)
-            is_valid = validate_object(class_id, cip, hhb)
-
-            if is_valid:
-                inside_objects.append({
-                    "class": int(obj_class.item()),
-                    "bbox": obj[:4].tolist(),  # Convert to list for easier usage
-                    "confidence": float(obj[4].item())
-                })
-
-        grouped.append({
-            "vehicle_id": v_id,
-            "vehicle_bbox": vehicle[:4].tolist(),
-            # "confidence": float(vehicle[4].item()),
-            "objects": inside_objects
+        if plate_conf is None or plate_conf < THRESHOLD_PLATE:
+            continue
+        
+        line1, line2, status = parse_and_validate_plate(plate_number)
+        if status == "certain" and plate_conf > THRESHOLD_PLATE_CERTAIN and nohelmet_conf > THRESHOLD_NOHELMET_CERTAIN:
+            plate_number = line1 + " " + line2
+            status = ViolationStatus.AI_RELIABEL.value
+        else:
+            status = ViolationStatus.AI_DETECT.value
+            status = "AI detected"
+            plate_number = plate_number.replace("\n"," ")
+            logger.debug(f"Status: {status}, plate number: {plate_number}")
+        violations.append({
+            "vehicle_id": int(association.vehicle_ids[v]),
+            "vehicle_bbox": association.vehicle_boxes[v].tolist(),
+            "violation": ViolationType.NO_HELMET,
+            "plate_number": plate_number,
+            "plate_conf": plate_conf,
+            "nohelmet_conf": nohelmet_conf,
+            "plate_quality": plate_quality,
+            "status": status,
         })
+    return violations
+
+def crop_vehicle(frame, vehicle_bbox):
+    """Crop a vehicle bounding box from a frame"""
+    x1, y1, x2, y2 = map(int, vehicle_bbox)  # Convert to integers
+    return frame[max(0, y1):y2, max(0, x1):x2]
+
+def build_detected_result(violation, image: str, camera_id: str = "", detected_at: Optional[datetime] = None) -> DetectedResult:
+    """Build the DetectedResult of a violation found by extract_violations with its encoded evidence image"""
+    detected_at = detected_at or datetime.now()
+    return DetectedResult(
+        vehicle_id=f"{detected_at.strftime('%Y-%m-%d')}_id_{violation['vehicle_id']}",
+        image=image,
+        violation=violation["violation"],
+        plate_numbers=violation["plate_number"],
+        time=detected_at.isoformat(),
+        plate_conf=violation["plate_conf"],
+        camera_id=camera_id,
+        status=violation["status"]
+    )
 
-    return grouped
-
-def process_to_output_json(grouped_json, frame, post_frame, camera_id: str="") -> DeviceDetection:
+def process_to_output_json(association, frame, post_frame, camera_id: str="", violation_aggregator=None, alive_track_ids=None, observe: bool = True) -> DeviceDetection:
     """
     Convert the grouped vehicle and object information into a format suitable for outputting.
 
     Args:
-        grouped_json (list): List of dictionaries, each containing a vehicle and its associated objects.
+        association (AssociationResult): Vehicles of the frame and their associated objects.
         frame (numpy array): Original video frame.
+        violation_aggregator (ViolationAggregator, optional): When given, violations are aggregated per
+            track and only finalized violations are output instead of one result per frame.
+        alive_track_ids (set, optional): Track IDs still kept by the tracker, used to finalize ended tracks.
+        observe (bool): Look for violations on this frame, False for frames whose boxes were predicted.
 
     Returns:
         dict: JSON output with detected vehicles and violations.
     """
     output_json = DeviceDetection(
         camera_id= camera_id,
-        post_frame= encode_image_to_bytes(post_frame),
+        post_frame= encode_preview(post_frame) if post_frame is not None else None,
         detected_result= []
     )
 
-    for group in grouped_json:
-        vehicle_id = int(group["vehicle_id"])
-        x1, y1, x2, y2 = map(int, group["vehicle_bbox"])  # Convert to integers
+    violations = extract_violations(association) if observe else []
+    if violation_aggregator is not None:
+        violation_aggregator.observe(frame, violations)
+        output_json["detected_result"].extend(violation_aggregator.collect(alive_track_ids))
+        return output_json
 
+    for violation in violations:
         # Crop vehicle image from the frame
-        vehicle_img = frame[y1:y2, x1:x2]
-
-        # Check for violation (class 2: no helmet)
-        if any(obj["class"] == 2 for obj in group["objects"]):
-            violation = None
-            plate_number = None
-            plate_conf = None
-            max_nohelmet_conf = group.get("max_nohelmet_conf", -1)
-            violation = ViolationType.NO_HELMET
-            for obj in group["objects"]:
-                if obj["class"] == 3 and "plate_number" in obj:
-                    plate_number = obj["plate_number"]
-                    plate_conf = obj.get("plate_conf", -1)
-                if obj["class"] == 2:
-                    nohelmet_conf = obj.get("nohelmet_conf", -1)
-                
-            if plate_conf is None or plate_conf < THRESHOLD_PLATE:
-                continue
-            
-            line1, line2, status = parse_and_validate_plate(plate_number)
-            if status == "certain" and plate_conf > THRESHOLD_PLATE_CERTAIN and max_nohelmet_conf > THRESHOLD_NOHELMET_CERTAIN:
-                plate_number = line1 + " " + line2
-                status = ViolationStatus.AI_RELIABEL.value
-            else:
-                status = ViolationStatus.AI_DETECT.value
-                status = "AI detected"
-                plate_number = plate_number.replace("\n"," ")
-                logger.debug(f"Status: {status}, plate number: {plate_number}")
-            output_json["detected_result"].append(DetectedResult(
-            vehicle_id=f"{datetime.now().strftime('%Y-%m-%d')}_id_{vehicle_id}",
-            image=encode_image_to_string(vehicle_img),
-            violation=violation,
-            plate_numbers=plate_number,
-            time=datetime.now().isoformat(),
-            plate_conf=float(plate_conf) if plate_conf is not None else 0.0,
+        vehicle_img = crop_vehicle(frame, violation["vehicle_bbox"])
+        output_json["detected_result"].append(build_detected_result(
+            violation,
+            encode_image_to_string(vehicle_img),
             camera_id=camera_id,
-            status = status
         ))
 
     return output_json
@@ -210,152 +203,16 @@ def validate_object(class_id, cip, hhb):
         return cip > 0.947 and 0.64 <= hhb <= 1  # Phần dưới
     return False
 
-def fully_optimized_mapping_tracked_vehicles(vehicle_track_dets, vehicle_track_ids, detection_results, device):
-    """
-    Optimized version of mapping_tracked_vehicles function.
-
-    Args:
-        vehicle_track_dets (torch.Tensor): Tensor of vehicle bounding boxes
-        vehicle_track_ids (list): List of vehicle track IDs
-        detection_results (torch.Tensor): All detections
-        device (str): Device to run computations on
-
-    Returns:
-        list: List of dictionaries with vehicles and their associated objects
-    """
-    # Ensure inputs are on the right device
-    if not isinstance(vehicle_track_dets, torch.Tensor):
-        vehicle_track_dets = torch.tensor(vehicle_track_dets, device=device)
-    if not isinstance(detection_results, torch.Tensor):
-        detection_results = torch.tensor(detection_results, device=device)
-
-    # Separate vehicle and non-vehicle objects
-    other_objects = detection_results[detection_results[:, 5] != 0]
-
-    # If no vehicles or no other objects, return empty results
-    if len(vehicle_track_dets) == 0 or len(other_objects) == 0:
-        return [{"vehicle_id": id, "vehicle_bbox": vehicle[:4].tolist(), "objects": []} 
-                for id, vehicle in zip(vehicle_track_ids, vehicle_track_dets)]
-
-    # Pre-filtering: create a spatial index for quick overlap checks
-    # Use a simple grid-based approach for demonstration
-    # In a production system, consider using libraries like PyTorch3D or custom CUDA kernels
-
-    grouped = []
-
-    # Process in batches to avoid memory issues with large datasets
-    batch_size = min(100, len(vehicle_track_dets))  # Adjust based on available memory
-
-    for batch_start in range(0, len(vehicle_track_dets), batch_size):
-        batch_end = min(batch_start + batch_size, len(vehicle_track_dets))
-        batch_vehicles = vehicle_track_dets[batch_start:batch_end]
-        batch_ids = vehicle_track_ids[batch_start:batch_end]
-
-        # Quick filtering using vectorized operations
-        v_min_xy = batch_vehicles[:, :2].unsqueeze(1)  # [batch, 1, 2]
-        v_max_xy = batch_vehicles[:, 2:4].unsqueeze(1)  # [batch, 1, 2]
-
-        o_min_xy = other_objects[:, :2].unsqueeze(0)  # [1, num_objects, 2]
-        o_max_xy = other_objects[:, 2:4].unsqueeze(0)  # [1, num_objects, 2]
-
-        # Check for potential overlaps (vectorized)
-        overlap_check = (
-            (v_max_xy[:, :, 0] >= o_min_xy[:, :, 0]) &  # vehicle_xmax >= object_xmin
-            (v_min_xy[:, :, 0] <= o_max_xy[:, :, 0]) &  # vehicle_xmin <= object_xmax
-            (v_max_xy[:, :, 1] >= o_min_xy[:, :, 1]) &  # vehicle_ymax >= object_ymin
-            (v_min_xy[:, :, 1] <= o_max_xy[:, :, 1])    # vehicle_ymin <= object_ymax
-        )  # [batch, num_objects]
-
-        # Now compute CIP and HHB only for potentially overlapping pairs
-        for i, (v_id, vehicle) in enumerate(zip(batch_ids, batch_vehicles)):
-            potential_obj_indices = torch.where(overlap_check[i])[0]
-
-            if len(potential_obj_indices) == 0:
-                # No potentially overlapping objects for this vehicle
-                grouped.append({
-                    "vehicle_id": v_id,
-                    "vehicle_bbox": vehicle[:4].tolist(),
-                    "objects": []
-                })
-                continue
-
-            # Get potential objects
-            pot_objects = other_objects[potential_obj_indices]
-
-            # Calculate CIP for potential objects (vectorized)
-            v_bbox = vehicle[:4].unsqueeze(0)  # [1, 4]
-            o_bboxes = pot_objects[:, :4]      # [n_pot, 4]
-
-            # Intersection calculation
-            inter_xmin = torch.maximum(v_bbox[:, 0].unsqueeze(1), o_bboxes[:, 0].unsqueeze(0))
-            inter_ymin = torch.maximum(v_bbox[:, 1].unsqueeze(1), o_bboxes[:, 1].unsqueeze(0))
-            inter_xmax = torch.minimum(v_bbox[:, 2].unsqueeze(1), o_bboxes[:, 2].unsqueeze(0))
-            inter_ymax = torch.minimum(v_bbox[:, 3].unsqueeze(1), o_bboxes[:, 3].unsqueeze(0))
-
-            inter_width = torch.clamp(inter_xmax - inter_xmin, min=0)
-            inter_height = torch.clamp(inter_ymax - inter_ymin, min=0)
-            inter_area = (inter_width * inter_height).squeeze(0)  # [n_pot]
-
-            # Object areas
-            obj_area = (o_bboxes[:, 2] - o_bboxes[:, 0]) * (o_bboxes[:, 3] - o_bboxes[:, 1])  # [n_pot]
-
-            # CIP calculation
-            cip = inter_area / obj_area  # [n_pot]
-
-            # HHB calculation
-            v_height = vehicle[3] - vehicle[1]  # scalar
-            obj_center_y = (o_bboxes[:, 1] + o_bboxes[:, 3]) / 2  # [n_pot]
-            hhb = (obj_center_y - vehicle[1]) / v_height  # [n_pot]
-
-            # Get object classes
-            o_classes = pot_objects[:, 5]  # [n_pot]
-
-            # Apply filtering conditions
-            valid_helmet = ((o_classes == 1) | (o_classes == 2)) & (cip > 0.947) & (hhb >= 0) & (hhb <= 0.29)
-            valid_license = (o_classes == 3) & (cip > 0.947) & (hhb >= 0.64) & (hhb <= 1)
-            valid_mask = valid_helmet | valid_license  # [n_pot]
-
-            # Get final valid objects
-            valid_indices = torch.where(valid_mask)[0]
-            
-            inside_objects = []
-            conf_nohelmet = None
-            for idx in valid_indices:
-                obj_idx = potential_obj_indices[idx]
-                obj = other_objects[obj_idx]
-                obj_class = int(obj[5].item())
-                obj_confidence = float(obj[4].item())
-                
-                # Check if this is a nohelmet object and update conf_nohelmet
-                if obj_class == 2:  # nohelmet class
-                    if conf_nohelmet is None or obj_confidence > conf_nohelmet:
-                        conf_nohelmet = obj_confidence
-                
-                inside_objects.append({
-                    "class": obj_class,
-                    "bbox": obj[:4].tolist(),
-                    "confidence": obj_confidence
-                })
-
-            grouped.append({
-                "vehicle_id": v_id,
-                "vehicle_bbox": vehicle[:4].tolist(),
-                "objects": inside_objects,
-                "max_nohelmet_conf": conf_nohelmet
-            })
-
-    return grouped
-
 
 # src/utils/video.py
 from src.config import AppConfig_2
 
-def compress_frame_to_jpeg(frame: np.ndarray) -> bytes:
+def compress_frame_to_jpeg(frame: np.ndarray, quality: Optional[int] = None) -> bytes:
     """Compress a frame to JPEG format"""
     success, encoded_frame = cv2.imencode(
         '.jpg', 
         frame, 
-        [cv2.IMWRITE_JPEG_QUALITY, AppConfig_2.JPEG_QUALITY]
+        [cv2.IMWRITE_JPEG_QUALITY, AppConfig_2.JPEG_QUALITY if quality is None else quality]
     )
     
     if not success:
@@ -364,6 +221,15 @@ def compress_frame_to_jpeg(frame: np.ndarray) -> bytes:
     return encoded_frame.tobytes()
 
 
+def encode_preview(frame: np.ndarray, width: Optional[int] = None, quality: Optional[int] = None) -> bytes:
+    """Encode a preview JPEG, downscaled to the preview width independently of the analysis resolution"""
+    width = AppConfig_2.PREVIEW_WIDTH if width is None else width
+    if width and frame.shape[1] > width:
+        height = max(1, round(frame.shape[0] * width / frame.shape[1]))
+        frame = cv2.resize(frame, (width, height), interpolation=cv2.INTER_AREA)
+    return compress_frame_to_jpeg(frame, AppConfig_2.PREVIEW_JPEG_QUALITY if quality is None else quality)
+
+
 def parse_and_validate_plate(plate_result):
     """
     Parse license plate from frame, post-process and validate against Vietnamese license plate rules.